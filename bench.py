@@ -0,0 +1,600 @@
+"""
+Бенчмарки производительности бота.
+
+Запуск:
+    python bench.py rollups    # отчёт активности за 90 дней по суточным сводкам
+    python bench.py keywords   # классификация кадровых сообщений
+    python bench.py scan       # память при потоковом просмотре периода
+    python bench.py commands   # команды бота на синтетической истории: время, сообщ./сек, пиковый RSS
+    python bench.py commands --messages 200000 --image-share 0.5 --command images
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import gc
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import discord
+
+from message_store import MessageStore, DAY_SECONDS
+from staff_keywords import KeywordClassifier, DEFAULT_STAFF_KEYWORDS
+from reports import ActivityStats, ImageStats, StaffStats, ReportPipeline
+from tests.staff_fixtures import LEGACY_STAFF_KEYWORDS, STAFF_REGRESSION_CASES, classify_per_keyword
+
+
+# === БЕНЧМАРК: ОТЧЁТ АКТИВНОСТИ ПО СУТОЧНЫМ СВОДКАМ ===
+def bench_rollups(messages=500_000, days=90, users=300, runs=20, flushes=20, flush_size=500):
+    """
+    Строит индекс на messages сообщений за days дней и замеряет отчёт за весь период,
+    а также сброс flushes пачек живых событий по flush_size сообщений (плюс правки)
+    """
+    random.seed(42)
+    channel_id = 1
+    start_day = 20_000
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MessageStore(os.path.join(tmp, "bench.db"))
+
+        print(f"🗄️ Заполняю индекс: {messages} сообщений, {days} дней, {users} авторов...")
+        started = time.perf_counter()
+        step = days * DAY_SECONDS / messages
+        batch = []
+        for i in range(messages):
+            author_id = random.randrange(users)
+            created_at = start_day * DAY_SECONDS + i * step
+            content = "https://example.com" if i % 7 == 0 else "сообщение"
+            row = (channel_id, i, 1, author_id, f"user{author_id}", 1 if author_id == 0 else 0, created_at, content)
+            attachments = [(channel_id, i, 0, f"https://cdn/{i}.png", "image/png")] if i % 5 == 0 else []
+            batch.append((row, attachments))
+            if len(batch) >= 10_000:
+                store.save_messages(batch)
+                batch = []
+        store.save_messages(batch)
+        print(f"   готово за {time.perf_counter() - started:.1f} сек")
+
+        # Сброс живых событий в последний (самый загруженный) день: сводки меняются на вклад сообщений
+        flush_timings = []
+        last_day_ts = (start_day + days - 1) * DAY_SECONDS
+        for flush in range(flushes):
+            rows = []
+            for j in range(flush_size):
+                message_id = messages + flush * flush_size + j
+                author_id = random.randrange(1, users)
+                row = (channel_id, message_id, 1, author_id, f"user{author_id}", 0, last_day_ts + random.uniform(0, DAY_SECONDS), "сообщение")
+                rows.append((row, []))
+            edits = [(channel_id, random.randrange(message_id), "https://example.com", None) for _ in range(flush_size // 10)]
+            started = time.perf_counter()
+            store.apply_live_batch(rows, edits, [])
+            flush_timings.append((time.perf_counter() - started) * 1000)
+
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            (message_count, images, links), per_user = store.activity_summary(1, channel_id, start_day, start_day + days)
+            top = sorted(per_user, key=lambda user: user[2], reverse=True)[:10]
+            timings.append((time.perf_counter() - started) * 1000)
+        store.close()
+
+    print(f"📊 Отчёт за {days} дней: {message_count} сообщений, {images} изображений, {links} ссылок, {len(per_user)} авторов, ТОП-1: {top[0][1]}")
+    print(f"⏱️ медиана {statistics.median(timings):.1f} мс, максимум {max(timings):.1f} мс ({runs} запусков)")
+    print(f"⏱️ сброс живых событий ({flush_size} сообщ. + {flush_size // 10} правок): медиана {statistics.median(flush_timings):.1f} мс, максимум {max(flush_timings):.1f} мс")
+    return statistics.median(timings)
+
+
+# === БЕНЧМАРК: КЛАССИФИКАЦИЯ КАДРОВЫХ СООБЩЕНИЙ ===
+FILLER_WORDS = ["сегодня", "на", "складе", "смена", "рапорт", "отдел", "сотрудник", "приказ", "по", "личному", "составу", "дежурство", "патруль", "в", "связи", "с", "проверкой"]
+
+
+def make_corpus(messages, keyword_density, keywords, words_per_message=20):
+    """Синтетические сообщения: доля keyword_density содержит одно из ключевых слов"""
+    corpus = []
+    for _ in range(messages):
+        words = random.choices(FILLER_WORDS, k=words_per_message)
+        if random.random() < keyword_density:
+            words.insert(random.randrange(len(words)), random.choice(keywords))
+        corpus.append(" ".join(words).capitalize())
+    return corpus
+
+
+def bench_keywords(messages=100_000, keyword_density=0.1):
+    """Сравнивает поиск по каждому слову с однопроходным классификатором и проверяет рост словарей"""
+    random.seed(42)
+    categories = LEGACY_STAFF_KEYWORDS
+    all_keywords = [keyword for keywords in categories.values() for keyword in keywords]
+    corpus = make_corpus(messages, keyword_density, all_keywords)
+    print(f"📝 Корпус: {messages} сообщений, {len(all_keywords)} ключевых слов, плотность {keyword_density:.0%}")
+
+    started = time.perf_counter()
+    expected = [classify_per_keyword(text, categories) for text in corpus]
+    old_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    classifier = KeywordClassifier(categories)
+    actual = [classifier.classify(text) for text in corpus]
+    new_seconds = time.perf_counter() - started
+
+    mismatches = sum(1 for old, new in zip(expected, actual) if old != new)
+    print(f"⏱️ re.search по каждому слову: {old_seconds:.2f} сек ({messages / old_seconds:,.0f} сообщ./сек)")
+    print(f"⏱️ однопроходный классификатор: {new_seconds:.2f} сек ({messages / new_seconds:,.0f} сообщ./сек)")
+    print(f"🚀 ускорение: x{old_seconds / new_seconds:.1f}, расхождений: {mismatches}")
+
+    # Словари по умолчанию (основы вместо перечисленных форм) находят то же, что прежние списки, и не шире
+    default_classifier = KeywordClassifier({name: category["terms"] for name, category in DEFAULT_STAFF_KEYWORDS.items()})
+    default_mismatches = sum(1 for old, text in zip(expected, corpus) if default_classifier.classify(text) != old)
+    regressions = [(text, categories) for text, categories in STAFF_REGRESSION_CASES if default_classifier.classify(text) != categories]
+    print(f"📚 словари по умолчанию против прежних списков: расхождений {default_mismatches}, ошибок на контрольных фразах {len(regressions)}")
+    for text, categories in regressions:
+        print(f"   ❗ «{text}»: ожидалось {', '.join(sorted(categories)) or 'без категории'}")
+
+    # Рост словарей: добавляем синтетические основы и смотрим, что время разбора не растёт
+    default_terms = {name: category["terms"] for name, category in DEFAULT_STAFF_KEYWORDS.items()}
+    for extra_terms in (0, 300, 3000):
+        grown = {name: list(terms) for name, terms in default_terms.items()}
+        for i in range(extra_terms):
+            words = ["".join(random.choices("абвгдежзиклмнопрстуфхцчшщэюя", k=random.randint(4, 9))) for _ in range(1 if i % 3 else 2)]
+            grown[random.choice(list(grown))].append(" ".join(f"{word}*" for word in words))
+        started = time.perf_counter()
+        classifier = KeywordClassifier(grown)
+        for text in corpus:
+            classifier.classify(text)
+        seconds = time.perf_counter() - started
+        terms = sum(len(terms) for terms in grown.values())
+        print(f"📚 {terms:>5} терминов: {seconds:.2f} сек ({messages / seconds:,.0f} сообщ./сек)")
+    return new_seconds
+
+
+# === БЕНЧМАРК: ПАМЯТЬ ПРИ ПОТОКОВОМ ПРОСМОТРЕ ===
+class FakeChannel:
+    """Минимальный канал для накопителей отчётов"""
+    id = 1
+    name = "bench"
+    guild = type("FakeGuild", (), {"id": 1})()
+
+
+def fill_store(store, messages, keyword_density=0.1, users=300, image_share=0.0):
+    """Заполняет индекс синтетическими сообщениями (часть — кадровые, доля image_share — с изображениями)"""
+    all_keywords = [keyword for keywords in LEGACY_STAFF_KEYWORDS.values() for keyword in keywords]
+    corpus = make_corpus(1000, keyword_density, all_keywords)
+    batch = []
+    for i in range(messages):
+        author_id = random.randrange(users)
+        row = (1, i, 1, author_id, f"user{author_id}", 0, 1_700_000_000 + i, corpus[i % len(corpus)])
+        attachments = []
+        if random.random() < image_share:
+            attachments = [(1, i, position, f"https://cdn/{i}/{position}.png", "image/png") for position in range(random.randint(1, 3))]
+        batch.append((row, attachments))
+        if len(batch) >= 10_000:
+            store.save_messages(batch)
+            batch = []
+    store.save_messages(batch)
+
+
+async def scan_store(store, categories, classifier):
+    activity = ActivityStats()
+    staff = StaffStats(categories, classifier)
+    pipeline = ReportPipeline([activity, staff])
+    async for message in store.iter_messages(1, 0, 2_000_000_000):
+        pipeline.add(message, FakeChannel)
+    return activity, staff
+
+
+def bench_scan(sizes=(10_000, 100_000, 1_000_000)):
+    """Пиковая память при просмотре периода не должна зависеть от числа сообщений"""
+    random.seed(42)
+    categories = DEFAULT_STAFF_KEYWORDS
+    classifier = KeywordClassifier({name: category["terms"] for name, category in categories.items()})
+    peaks = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MessageStore(os.path.join(tmp, "bench.db"))
+            fill_store(store, size)
+            tracemalloc.start()
+            started = time.perf_counter()
+            activity, staff = asyncio.run(scan_store(store, categories, classifier))
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            store.close()
+        peaks.append(peak)
+        staff_total = sum(staff.category_counts.values())
+        print(f"📨 {size:>9} сообщений: пик памяти {peak / 1024 / 1024:.1f} МБ, {seconds:.1f} сек, кадровых {staff_total}, авторов {len(activity.user_names)}")
+    return max(peaks)
+
+
+# === БЕНЧМАРК: ПРОСМОТР ИНДЕКСА НАКОПИТЕЛЯМИ ОТЧЁТОВ ===
+def bench_pipeline(messages=100_000, image_share=0.2, runs=5):
+    """
+    Время просмотра индекса на 10 000 сообщений: только чтение и каждый накопитель отдельно
+    (путь, на котором важны лишние объекты на сообщение и принудительная сборка мусора).
+    Печатается лучшее из runs и число полных сборок мусора (поколение 2) за проход.
+    """
+    random.seed(42)
+    categories = DEFAULT_STAFF_KEYWORDS
+    classifier = KeywordClassifier({name: category["terms"] for name, category in categories.items()})
+    variants = {
+        "чтение": lambda: [],
+        "activity": lambda: [ActivityStats()],
+        "images": lambda: [ImageStats()],
+        "staff": lambda: [StaffStats(categories, classifier)],
+        "все три": lambda: [ActivityStats(), ImageStats(), StaffStats(categories, classifier)],
+    }
+
+    async def scan(store, pipeline):
+        async for message in store.iter_messages(1, 0, 2_000_000_000):
+            pipeline.add(message, FakeChannel)
+
+    per_10k = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MessageStore(os.path.join(tmp, "bench.db"))
+        fill_store(store, messages, image_share=image_share)
+        print(f"📨 {messages} сообщений, с изображениями {image_share:.0%}")
+        for name, make in variants.items():
+            timings = []
+            for _ in range(runs):
+                pipeline = ReportPipeline(make())
+                collections = gc.get_stats()[2]["collections"]
+                started = time.perf_counter()
+                asyncio.run(scan(store, pipeline))
+                timings.append(time.perf_counter() - started)
+                full_collections = gc.get_stats()[2]["collections"] - collections
+            per_10k[name] = min(timings) / messages * 10_000
+            print(f"   {name:<9} {per_10k[name] * 1000:7.1f} мс на 10k сообщений, полных сборок мусора: {full_collections}")
+        store.close()
+    return per_10k
+
+
+# === БЕНЧМАРК: КОМАНДЫ БОТА НА СИНТЕТИЧЕСКОЙ ИСТОРИИ ===
+# Команды и их аргументы после канала и дат
+BENCH_COMMANDS = {
+    "activity": (),
+    "images": (),
+    "export_images": ("csv",),
+    "staff_analysis": (),
+}
+# Типы вложений: изображения считаются отчётами, остальное должно игнорироваться
+IMAGE_TYPES = ["image/png", "image/jpeg", "image/webp", "application/octet-stream"]
+OTHER_TYPES = ["application/pdf", "video/mp4", "audio/mpeg", None]
+BENCH_START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeMember:
+    def __init__(self, member_id, name, bot=False):
+        self.id = member_id
+        self.display_name = name
+        self.bot = bot
+        self.roles = []
+
+
+class FakeAttachment:
+    __slots__ = ("url", "content_type")
+
+    def __init__(self, url, content_type):
+        self.url = url
+        self.content_type = content_type
+
+
+class FakeMessage:
+    """Поля discord.Message, которые читает message_to_row"""
+    __slots__ = ("id", "channel", "guild", "author", "created_at", "content", "attachments")
+
+    def __init__(self, message_id, channel, author, created_at, content, attachments):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.created_at = created_at
+        self.content = content
+        self.attachments = attachments
+
+
+class FakePermissions:
+    read_messages = True
+    read_message_history = True
+
+
+class FakeGuild:
+    def __init__(self):
+        self.id = 1
+        self.name = "Bench Guild"
+        self.filesize_limit = 25 * 1024 * 1024
+        self.me = FakeMember(0, "bot", bot=True)
+        self.roles = []
+        self.text_channels = []
+
+
+class FakeTextChannel(discord.TextChannel):
+    """
+    Канал с синтетической историей: сообщения генерируются по номеру при чтении,
+    поэтому память бенчмарка не зависит от их числа. Наследует discord.TextChannel,
+    чтобы команды принимали его как настоящий канал.
+    """
+
+    def __init__(self, guild, messages, days, image_share, other_share, keyword_density, users=300, page_delay=0.0):
+        self.id = 1000
+        self.name = "bench"
+        self.guild = guild
+        self.messages = messages
+        self.step = days * DAY_SECONDS / messages
+        self.image_share = image_share
+        self.other_share = other_share
+        self.page_delay = page_delay
+        self.authors = [FakeMember(100 + i, f"user{i}", bot=(i == 0)) for i in range(users)]
+        all_keywords = [keyword for keywords in LEGACY_STAFF_KEYWORDS.values() for keyword in keywords]
+        self.corpus = make_corpus(1000, keyword_density, all_keywords)
+        self.pages_served = 0
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    def make_message(self, index):
+        rng = random.Random(index)
+        attachments = []
+        roll = rng.random()
+        if roll < self.image_share:
+            attachments = [
+                FakeAttachment(f"https://cdn.example.com/{index}/{n}.png", rng.choice(IMAGE_TYPES))
+                for n in range(rng.randint(1, 4))
+            ]
+        elif roll < self.image_share + self.other_share:
+            attachments = [FakeAttachment(f"https://cdn.example.com/{index}/file", rng.choice(OTHER_TYPES))]
+        content = self.corpus[index % len(self.corpus)]
+        if index % 7 == 0:
+            content += " https://example.com"
+        created_at = BENCH_START + datetime.timedelta(seconds=index * self.step)
+        return FakeMessage(index + 1, self, self.authors[index % len(self.authors)], created_at, content, attachments)
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        """Как TextChannel.history: сообщения строго между after и before, страницами по 100"""
+        start = 0
+        end = self.messages
+        if after is not None:
+            start = max(0, int((after - BENCH_START).total_seconds() // self.step) + 1)
+        if before is not None:
+            end = min(end, math.ceil((before - BENCH_START).total_seconds() / self.step))
+        indexes = range(start, end) if oldest_first else range(end - 1, start - 1, -1)
+        for served, index in enumerate(indexes):
+            if limit is not None and served >= limit:
+                return
+            if served % 100 == 0:
+                self.pages_served += 1
+                await asyncio.sleep(self.page_delay)
+            message = self.make_message(index)
+            if after is not None and message.created_at <= after:
+                continue
+            if before is not None and message.created_at >= before:
+                continue
+            yield message
+
+
+class FakeSentMessage:
+    """Отправленное сообщение: правки (ход задачи отчёта) считаются отдельно"""
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def edit(self, content=None, **kwargs):
+        self.ctx.edits += 1
+
+
+class FakeContext:
+    """ctx команды: запоминает отправленные сообщения и файлы"""
+
+    def __init__(self, guild, text=""):
+        self.guild = guild
+        self.author = FakeMember(1, "bench")
+        self.message = types.SimpleNamespace(content=text, clean_content=text)
+        self.sent = []
+        self.edits = 0
+        self.files_bytes = 0
+
+    async def send(self, content=None, file=None, **kwargs):
+        if file is not None:
+            self.files_bytes += len(file.fp.read())
+            file.close()
+        embeds = kwargs.get("embeds") or ()
+        self.sent.append(content or "\n".join(embed.description or "" for embed in embeds))
+        return FakeSentMessage(self)
+
+
+class FakeSheetsRequest:
+    def __init__(self, body):
+        # googleapiclient сериализует тело при создании запроса
+        self.body = json.dumps(body) if body is not None else None
+        self.rows = len(body["values"]) if body and "values" in body else 0
+
+
+class FakeSheetsService:
+    """spreadsheets() и spreadsheets().values() Sheets API без сети"""
+
+    def values(self):
+        return self
+
+    def append(self, spreadsheetId, range, valueInputOption, body):
+        return FakeSheetsRequest(body)
+
+    def get(self, **kwargs):
+        return FakeSheetsRequest(None)
+
+
+class FakeSheetsTransport:
+    """Транспорт без сети для SheetsWriter: считает запросы, строки и байты"""
+
+    def __init__(self):
+        self.service = FakeSheetsService()
+        self.requests = 0
+        self.rows = 0
+        self.bytes_sent = 0
+
+    def spreadsheets(self):
+        return self.service
+
+    def execute(self, request, operation="request", idempotent=True):
+        self.requests += 1
+        self.rows += request.rows
+        self.bytes_sent += len(request.body or "")
+        return {"values": [[]]}
+
+    def metrics(self):
+        return {"requests": self.requests, "retries": 0, "failures": 0, "throttle_wait_seconds": 0.0,
+                "backoff_wait_seconds": 0.0, "bytes_sent": self.bytes_sent, "latency": {}}
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса (МБ) или None, если платформа его не сообщает"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает килобайты, macOS — байты
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_command(command, options):
+    """Запускает одну команду в текущем процессе дважды: с пустым индексом и повторно"""
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    os.environ.update({
+        "MESSAGE_STORE_PATH": os.path.join(tmp, "messages.db"),
+        "SHEETS_SPOOL_PATH": os.path.join(tmp, "spool.db"),
+        "CONFIG_PATH": os.path.join(tmp, "config.json"),
+        "SHEETS_FLUSH_INTERVAL": "0",
+        # Повторный запуск должен просматривать индекс, а не брать готовый результат
+        "REPORT_CACHE_SIZE": "0",
+    })
+    os.environ.pop("METRICS_PORT", None)
+    # Журнал бота в дочернем процессе не нужен: ошибки команд видны по ответам в ctx
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    import bot
+    import perf
+
+    async def scenario():
+        transport = FakeSheetsTransport()
+        bot.sheets_writer.attach(transport)
+        bot.sheets_writer.start()
+        guild = FakeGuild()
+        channel = FakeTextChannel(guild, **options)
+        guild.text_channels.append(channel)
+        end_date = (BENCH_START + datetime.timedelta(days=options["days"] - 1)).strftime("%d-%m-%Y")
+        start_date = BENCH_START.strftime("%d-%m-%Y")
+        bot_command = bot.bot.get_command(command)
+        baseline = peak_rss_mb()
+        runs = []
+        for phase in ("cold", "warm"):
+            ctx = FakeContext(guild, f"!{command} #{channel.name} {start_date} {end_date}")
+            handle = perf.metrics.begin_command(command)
+            started = time.perf_counter()
+            await bot_command(ctx, channel, start_date, end_date, *BENCH_COMMANDS[command])
+            command_seconds = time.perf_counter() - started
+            await bot.sheets_writer.join()
+            perf.metrics.end_command(handle)
+            errors = [text for text in ctx.sent if text.startswith(("⚠️ Критическая", "⚠️ Ошибка", "❌"))]
+            runs.append({
+                "phase": phase,
+                "seconds": command_seconds,
+                "sheets_seconds": time.perf_counter() - started - command_seconds,
+                "discord_messages": len(ctx.sent),
+                "discord_bytes": sum(len(text.encode("utf-8")) for text in ctx.sent) + ctx.files_bytes,
+                "errors": errors,
+            })
+        return {
+            "runs": runs,
+            "pages": channel.pages_served,
+            "sheets_requests": transport.requests,
+            "sheets_rows": transport.rows,
+            "sheets_bytes": transport.bytes_sent,
+            "baseline_rss_mb": baseline,
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": perf.metrics.snapshot().get(command, {}).get("phases", {}),
+        }
+
+    try:
+        return asyncio.run(scenario())
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_commands(messages=50_000, days=30, image_share=0.2, other_share=0.05, keyword_density=0.1,
+                   commands=None, page_delay=0.0):
+    """
+    Запускает настоящие команды бота на синтетической истории канала и Google Sheets без сети.
+    Каждая команда выполняется в отдельном процессе, чтобы пиковый RSS относился только к ней.
+    """
+    options = {"messages": messages, "days": days, "image_share": image_share, "other_share": other_share,
+               "keyword_density": keyword_density, "page_delay": page_delay}
+    print(f"📨 {messages} сообщений за {days} дней: изображения в {image_share:.0%}, другие вложения в {other_share:.0%}, "
+          f"кадровые {keyword_density:.0%}")
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for command in commands or BENCH_COMMANDS:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_command, command, options).result()
+        results[command] = result
+        cold, warm = result["runs"]
+        print(f"\n⌨️ !{command}")
+        for run in result["runs"]:
+            label = "пустой индекс" if run["phase"] == "cold" else "из индекса  "
+            print(f"   {label}: {run['seconds']:.2f} сек ({messages / run['seconds']:,.0f} сообщ./сек), "
+                  f"запись в Sheets ещё {run['sheets_seconds']:.2f} сек, в Discord {run['discord_messages']} сообщ. / {run['discord_bytes'] / 1024:.0f} КБ")
+            for error in run["errors"]:
+                print(f"   ❗ {error}")
+        phases = ", ".join(
+            f"{phase} {stats['total']:.2f}с"
+            for phase, stats in result["phases"].items() if phase not in ("total", "history_page")
+        )
+        print(f"   этапы (оба запуска): {phases}")
+        print(f"   страниц истории: {result['pages']}, Sheets: {result['sheets_requests']} запросов, "
+              f"{result['sheets_rows']} строк, {result['sheets_bytes'] / 1024:.0f} КБ")
+        if result["peak_rss_mb"] is not None:
+            print(f"   пиковый RSS: {result['peak_rss_mb']:.0f} МБ (после импорта бота {result['baseline_rss_mb']:.0f} МБ)")
+    return results
+
+
+BENCHMARKS = {
+    "rollups": bench_rollups,
+    "keywords": bench_keywords,
+    "scan": bench_scan,
+    "pipeline": bench_pipeline,
+    "commands": bench_commands,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарки Discord-бота")
+    parser.add_argument("name", nargs="*", help=f"какие бенчмарки запустить: {', '.join(sorted(BENCHMARKS))} (по умолчанию все)")
+    commands_options = parser.add_argument_group("commands")
+    commands_options.add_argument("--messages", type=int, default=50_000, help="сообщений в синтетическом канале")
+    commands_options.add_argument("--days", type=int, default=30, help="за сколько дней")
+    commands_options.add_argument("--image-share", type=float, default=0.2, help="доля сообщений с изображениями")
+    commands_options.add_argument("--other-share", type=float, default=0.05, help="доля сообщений с другими вложениями")
+    commands_options.add_argument("--keyword-density", type=float, default=0.1, help="доля кадровых сообщений")
+    commands_options.add_argument("--page-delay", type=float, default=0.0, help="задержка Discord на страницу истории (сек)")
+    commands_options.add_argument("--command", action="append", choices=sorted(BENCH_COMMANDS), help="какие команды запускать (по умолчанию все)")
+    args = parser.parse_args()
+    unknown = [name for name in args.name if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"неизвестные бенчмарки: {', '.join(unknown)}")
+    options = {
+        "commands": {
+            "messages": args.messages,
+            "days": args.days,
+            "image_share": args.image_share,
+            "other_share": args.other_share,
+            "keyword_density": args.keyword_density,
+            "page_delay": args.page_delay,
+            "commands": args.command,
+        },
+    }
+    for name in args.name or sorted(BENCHMARKS):
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name](**options.get(name, {}))
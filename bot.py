@@ -1,16 +1,33 @@
+import time
+# Отсчёт времени запуска (до готовности к работе в Discord)
+STARTED_AT = time.perf_counter()
+
 import os
 import json
+import asyncio
+import typing
 import sys
 import discord
 from discord.ext import commands
 import datetime
-import csv
+import zoneinfo
 import io
-import re
-import gc
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import functools
+import itertools
+from sheets_writer import SheetsWriter
+from sheets_spool import SheetsSpool
+from sheets_client import SheetsTransport, SheetRegistry
+from staff_keywords import StaffKeywordDictionary, DEFAULT_STAFF_KEYWORDS_PATH
+from reports import IMAGES_SHOWN, REPORT_TYPES, ReportPipeline, scan_status_line
+from message_store import MessageStore, LiveIngestor, to_timestamp, day_of, DAY_SECONDS
+from history import HistoryFetcher
+from exporters import FileExport, ImageExport, ActivityExport
+from role_access import RoleAccess
+from report_render import pack_lines, pack_embeds, build_embeds, can_embed, PageView, MESSAGE_LIMIT, INLINE_MESSAGES
+from report_cache import ReportCache, cache_key, CACHE_MAX_ENTRIES, CACHE_MAX_WEIGHT, CACHE_TTL_CLOSED, CACHE_TTL_OPEN
+from scheduler import ReportScheduler, ScheduledReport, CronSchedule, DEFAULT_SCHEDULE_PATH, PERIODS, period_dates
+import perf
+import jobs
 
 # === ВЕРСИЯ БОТА ===
 BOT_VERSION = "1.2.2"
@@ -24,11 +41,14 @@ def sanitize_value(value):
 
 # === ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: ПАРСИНГ ДАТЫ В ФОРМАТЕ ДД-ММ-ГГГГ ===
 def parse_date(date_str):
-    """Парсит дату в формате ДД-ММ-ГГГГ"""
+    """
+    Парсит дату в формате ДД-ММ-ГГГГ: начало суток в часовом поясе TIMEZONE (как и «сегодня»).
+    Сутки прибавляются к результату по местному времени, в том числе при переходе на летнее время.
+    """
     if not date_str or not date_str.strip():
         raise ValueError("Дата не может быть пустой")
     try:
-        return datetime.datetime.strptime(date_str.strip(), "%d-%m-%Y").replace(tzinfo=datetime.timezone.utc)
+        return datetime.datetime.strptime(date_str.strip(), "%d-%m-%Y").replace(tzinfo=TIMEZONE)
     except ValueError as e:
         raise ValueError(f"Неверный формат даты '{date_str}'. Используйте формат ДД-ММ-ГГГГ (например: 01-01-2026)")
 
@@ -41,15 +61,17 @@ def check_env_vars():
     missing = []
     diagnostics = []
     
-    # Проверяем каждую переменную
-    for var in ["DISCORD_BOT_TOKEN", "GOOGLE_SHEET_ID", "GOOGLE_CREDENTIALS_JSON"]:
+    # Проверяем каждую переменную (без Google бот работает только с Discord)
+    for var, required in [("DISCORD_BOT_TOKEN", True), ("GOOGLE_SHEET_ID", False), ("GOOGLE_CREDENTIALS_JSON", False)]:
         value = os.getenv(var)
         if value and value.strip():
             preview = value[:8] + "..." if len(value) > 8 else value
             diagnostics.append(f"✅ {var}: {preview}")
-        else:
+        elif required:
             diagnostics.append(f"❌ {var}: НЕ ЗАДАН")
             missing.append(var)
+        else:
+            diagnostics.append(f"⚠️ {var}: НЕ ЗАДАН (сохранение в Google Sheets отключено)")
     
     # Выводим диагностику
     for line in diagnostics:
@@ -62,31 +84,66 @@ def check_env_vars():
             print(f"   → {var}")
         print("\n🔧 ИНСТРУКЦИЯ ПО ИСПРАВЛЕНИЮ:")
         print("1. Перейдите в Railway → Settings → Variables (Production)")
-        print("2. Убедитесь, что созданы ВСЕ три переменные:")
+        print("2. Убедитесь, что созданы переменные:")
         print("   - DISCORD_BOT_TOKEN")
-        print("   - GOOGLE_SHEET_ID")
-        print("   - GOOGLE_CREDENTIALS_JSON (минифицированный JSON)")
+        print("   - GOOGLE_SHEET_ID (для сохранения отчётов в таблицу)")
+        print("   - GOOGLE_CREDENTIALS_JSON (минифицированный JSON, для сохранения отчётов в таблицу)")
         print("3. Нажмите Actions → Restart после сохранения")
         print("!"*60)
         sys.exit(1)
     
-    print("✅ Все переменные окружения успешно загружены")
+    print("✅ Переменные окружения загружены")
     return True
 
-# Запускаем диагностику ДО инициализации бота
-check_env_vars()
-
 # === ИНИЦИАЛИЗАЦИЯ ПЕРЕМЕННЫХ ===
 DISCORD_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "!")
+MESSAGE_STORE_PATH = os.getenv("MESSAGE_STORE_PATH", "messages.db")
+SHEETS_SPOOL_PATH = os.getenv("SHEETS_SPOOL_PATH", "sheets_spool.db")
+STAFF_KEYWORDS_PATH = os.getenv("STAFF_KEYWORDS_PATH", DEFAULT_STAFF_KEYWORDS_PATH)
+CONFIG_PATH = os.getenv("CONFIG_PATH", "config.json")
+CHANNEL_SCAN_CONCURRENCY = int(os.getenv("CHANNEL_SCAN_CONCURRENCY", "5"))
+HISTORY_FETCH_CONCURRENCY = int(os.getenv("HISTORY_FETCH_CONCURRENCY", "4"))
+# Лимит размера вложения (Discord принимает от ботов файлы до 10 МБ, на бустнутых серверах больше)
+EXPORT_MAX_FILE_SIZE = int(float(os.getenv("EXPORT_MAX_FILE_SIZE_MB", "10")) * 1024 * 1024)
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "auto").lower()
 SENIOR_ROLE_NAME = os.getenv("SENIOR_ROLE_NAME", "Старший состав ФСВНГ")
+# Необязательный HTTP-эндпоинт /metrics в формате Prometheus (не задан — выключен)
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+SCHEDULE_PATH = os.getenv("SCHEDULE_PATH", DEFAULT_SCHEDULE_PATH)
+# Кэш готовых отчётов: сколько результатов хранить и сколько секунд (за прошедший период / с сегодняшним днём)
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", str(CACHE_MAX_ENTRIES)))
+REPORT_CACHE_TTL_CLOSED = float(os.getenv("REPORT_CACHE_TTL_CLOSED", str(CACHE_TTL_CLOSED)))
+REPORT_CACHE_TTL_OPEN = float(os.getenv("REPORT_CACHE_TTL_OPEN", str(CACHE_TTL_OPEN)))
+REPORT_CACHE_WEIGHT = int(os.getenv("REPORT_CACHE_WEIGHT", str(CACHE_MAX_WEIGHT)))
+# Сколько отчётов одного сервера выполняется одновременно и как часто обновляется их ход (секунды)
+JOBS_PER_GUILD = int(os.getenv("JOBS_PER_GUILD", str(jobs.JOBS_PER_GUILD)))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", str(jobs.PROGRESS_INTERVAL)))
+
+# === НАСТРОЙКА GOOGLE SHEETS (В ФОНЕ, ПОСЛЕ ПОДКЛЮЧЕНИЯ К DISCORD) ===
+# Подключение к Google не задерживает запуск: пока оно не завершено (или если Google
+# недоступен), бот работает только с Discord, а отчёты не сохраняются в таблицу
+SHEETS_CONNECT_RETRY = 5
+SHEETS_CONNECT_RETRY_MAX = 300
+
+# Необходимые листы и их заголовки (последний столбец — ключ записи, по нему повторы не дублируют строки)
+REQUIRED_SHEETS = {
+    "Activity": ["Сервер", "Канал", "Дата начала", "Дата окончания", "Сообщений", "Уникальных пользователей", "Изображений", "Ссылок", "Время", "Ключ записи"],
+    "Images": ["Сервер", "Канал", "Дата начала", "Дата окончания", "Ссылка на сообщение", "Ссылки на изображения", "№ изображений", "Автор", "Время экспорта", "Ключ записи"],
+    "StaffAnalysis": ["Сервер", "Канал", "Дата начала", "Дата окончания", "Тип", "Сообщений", "Уникальных авторов", "ТОП авторы", "Время", "Ключ записи"]
+}
+
+# Общий для всех команд кэш листов (создаётся после подключения к таблице)
+sheet_registry = None
+sheets_init_task = None
+
+def load_google_credentials():
+    """Разбирает GOOGLE_CREDENTIALS_JSON и создаёт учётные данные сервисного аккаунта"""
+    from google.oauth2.service_account import Credentials
 
-# === НАСТРОЙКА GOOGLE SHEETS ===
-try:
-    print("\n⚙️ ИНИЦИАЛИЗАЦИЯ GOOGLE SHEETS API...")
-    
     # Автоматическое исправление форматирования JSON
     raw_json = GOOGLE_CREDENTIALS_JSON.strip()
     
@@ -97,123 +154,141 @@ try:
         # Убираем лишние пробелы в конце URL
         raw_json = raw_json.replace("  ", " ")
     
-    # Загружаем данные
     creds_data = json.loads(raw_json)
-    
-    # Создаем учетные данные
-    creds = Credentials.from_service_account_info(
+    return Credentials.from_service_account_info(
         creds_data,
         scopes=['https://www.googleapis.com/auth/spreadsheets']
     )
+
+def connect_google_sheets(creds):
+    """Создаёт транспорт, проверяет доступ к таблице и создаёт недостающие листы (блокирующий вызов)"""
+    global sheet_registry
+    print("\n⚙️ ИНИЦИАЛИЗАЦИЯ GOOGLE SHEETS API...")
     
-    # Подключаемся к Sheets API
-    sheets_service = build('sheets', 'v4', credentials=creds)
+    # Подключаемся к Sheets API (соединение на поток, квота запросов, повторы при 429/5xx)
+    transport = SheetsTransport(
+        creds,
+        requests_per_minute=int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+    )
     
     # Тестовый запрос для проверки подключения
-    spreadsheet = sheets_service.spreadsheets().get(
-        spreadsheetId=SHEET_ID
-    ).execute()
-    
+    spreadsheet = transport.execute(
+        transport.spreadsheets().get(spreadsheetId=SHEET_ID, fields="properties.title"),
+        "spreadsheets.get"
+    )
     print(f"✅ УСПЕШНОЕ ПОДКЛЮЧЕНИЕ К ТАБЛИЦЕ: {spreadsheet['properties']['title']}")
     print(f"📊 ID таблицы: {SHEET_ID[:10]}...")
+    
+    # === НАСТРОЙКА ЛИСТОВ ===
+    sheet_registry = SheetRegistry(transport, SHEET_ID, REQUIRED_SHEETS)
+    print("\n🔧 ПРОВЕРКА ЛИСТОВ В GOOGLE ТАБЛИЦЕ...")
+    ensure_sheets_exist()
+    fill_sheet_headers()
+    return transport
 
-except json.JSONDecodeError as e:
-    print("\n" + "!"*60)
-    print(f"❌ ОШИБКА ПАРСИНГА JSON: {str(e)}")
-    print("\n🔧 РЕКОМЕНДАЦИИ:")
-    print("1. Используйте ТОЛЬКО минифицированный JSON для GOOGLE_CREDENTIALS_JSON")
-    print("2. Убедитесь, что все переносы строк заменены на \\n (одинарные слеши)")
-    print("3. Проверьте JSON на валидность здесь: https://jsonlint.com/")
-    print("!"*60)
-    sys.exit(1)
-
-except Exception as e:
-    print("\n" + "!"*60)
-    print(f"❌ ОШИБКА GOOGLE SHEETS API: {str(e)}")
-    print("\n🔧 ПРОВЕРЬТЕ:")
-    print(f"- Правильность SHEET_ID: {SHEET_ID[:10]}...")
-    print("- Доступ таблицы для сервисного аккаунта:")
-    print("  • Email: " + creds_data.get('client_email', 'неизвестно'))
-    print("- Разрешения таблицы: Права 'Редактор' для email выше")
-    print("- Включение Google Sheets API в Google Cloud Console")
-    print("!"*60)
-    sys.exit(1)
-
-# === ФУНКЦИЯ: ПРОВЕРКА И СОЗДАНИЕ ЛИСТОВ ===
-def ensure_sheets_exist(spreadsheet_id):
-    """Проверяет наличие необходимых листов и создаёт их при отсутствии"""
+def ensure_sheets_exist(repair=False):
+    """Проверяет наличие необходимых листов и создаёт их (одним запросом) при отсутствии"""
     try:
-        # Получаем список существующих листов
-        spreadsheet = sheets_service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id
-        ).execute()
-        
-        existing_sheets = [sheet['properties']['title'] for sheet in spreadsheet['sheets']]
-        sheets_to_create = []
-        
-        # Проверяем необходимые листы
-        required_sheets = {
-            "Activity": [
-                ["Сервер", "Канал", "Дата начала", "Дата окончания", "Сообщений", "Уникальных пользователей", "Изображений", "Ссылок", "Время"]
-            ],
-            "Images": [
-                ["Сервер", "Канал", "Дата начала", "Дата окончания", "Ссылка на сообщение", "Ссылки на изображения", "№ изображений", "Автор", "Время экспорта"]
-            ],
-            "StaffAnalysis": [
-                ["Сервер", "Канал", "Дата начала", "Дата окончания", "Тип", "Сообщений", "Уникальных авторов", "ТОП авторы", "Время"]
-            ]
-        }
-        
-        for sheet_name, headers in required_sheets.items():
-            if sheet_name not in existing_sheets:
-                sheets_to_create.append(sheet_name)
-                print(f"📋 Создаю лист: {sheet_name}")
-                
-                # Создаём лист
-                batch_update_request = {
-                    "requests": [{
-                        "addSheet": {
-                            "properties": {
-                                "title": sheet_name,
-                                "gridProperties": {
-                                    "rowCount": 1000,
-                                    "columnCount": 10
-                                }
-                            }
-                        }
-                    }]
-                }
-                
-                sheets_service.spreadsheets().batchUpdate(
-                    spreadsheetId=spreadsheet_id,
-                    body=batch_update_request
-                ).execute()
-                
-                # Заполняем заголовки
-                sheets_service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=f"{sheet_name}!A1:I1",
-                    valueInputOption="USER_ENTERED",
-                    body={"values": headers}
-                ).execute()
-                
-                print(f"✅ Лист '{sheet_name}' создан и настроен")
-        
-        if not sheets_to_create:
+        created = sheet_registry.repair() if repair else sheet_registry.ensure()
+        if not created:
             print("✅ Все необходимые листы уже существуют")
         else:
-            print(f"✅ Создано листов: {len(sheets_to_create)}")
-            
+            print(f"✅ Создано листов: {len(created)} ({', '.join(created)})")
+        return created
     except Exception as e:
         print(f"⚠️ Ошибка при настройке листов: {str(e)}")
         print("💡 Совет: Создайте листы вручную в Google Таблице:")
-        print("   - Лист 'Activity' с заголовками: Сервер, Канал, Дата начала, Дата окончания, Сообщений, Уникальных пользователей, Изображений, Ссылок, Время")
-        print("   - Лист 'Images' с заголовками: Сервер, Канал, Дата начала, Дата окончания, Ссылка на сообщение, Ссылки на изображения, № изображений, Автор, Время экспорта")
-        print("   - Лист 'StaffAnalysis' с заголовками: Сервер, Канал, Дата начала, Дата окончания, Тип, Сообщений, Уникальных авторов, ТОП авторы, Время")
+        for sheet_name, headers in REQUIRED_SHEETS.items():
+            print(f"   - Лист '{sheet_name}' с заголовками: {', '.join(headers)}")
+        if repair:
+            raise
+        return []
+
+def fill_sheet_headers():
+    """Дописывает заголовок «Ключ записи» (столбец J) в листы, созданные до его появления"""
+    try:
+        updated = sheet_registry.fill_headers()
+        if updated:
+            print(f"✅ Добавлены недостающие заголовки в листы: {', '.join(updated)}")
+        return updated
+    except Exception as e:
+        print(f"⚠️ Не удалось дописать заголовки листов: {str(e)}")
+        return []
+
+async def init_google_sheets():
+    """Подключается к Google Sheets в фоне, повторяя попытки, пока таблица недоступна"""
+    if not SHEET_ID or not GOOGLE_CREDENTIALS_JSON:
+        sheets_writer.disable("не заданы GOOGLE_SHEET_ID и GOOGLE_CREDENTIALS_JSON")
+        print("ℹ️ Google Sheets не настроен: бот работает только с Discord")
+        return
+    
+    started = time.perf_counter()
+    try:
+        creds = await asyncio.to_thread(load_google_credentials)
+    except ValueError as e:
+        # Ошибка в самих учётных данных: повтор не поможет до исправления переменной,
+        # поэтому строки не копятся в спуле, а команды сразу сообщают причину
+        sheets_writer.disable("ошибка в GOOGLE_CREDENTIALS_JSON")
+        print("\n" + "!"*60)
+        print(f"❌ ОШИБКА В GOOGLE_CREDENTIALS_JSON: {str(e)}")
+        print("\n🔧 РЕКОМЕНДАЦИИ:")
+        print("1. Используйте ТОЛЬКО минифицированный JSON для GOOGLE_CREDENTIALS_JSON")
+        print("2. Убедитесь, что все переносы строк заменены на \\n (одинарные слеши)")
+        print("3. Проверьте JSON на валидность здесь: https://jsonlint.com/")
+        print("ℹ️ Бот продолжает работу только с Discord")
+        print("!"*60)
+        return
+    
+    delay = SHEETS_CONNECT_RETRY
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            transport = await asyncio.to_thread(connect_google_sheets, creds)
+            break
+        except Exception as e:
+            sheets_writer.unavailable_reason = "нет подключения к таблице"
+            if attempt == 1:
+                print("\n" + "!"*60)
+                print(f"❌ ОШИБКА GOOGLE SHEETS API: {str(e)}")
+                print("\n🔧 ПРОВЕРЬТЕ:")
+                print(f"- Правильность SHEET_ID: {SHEET_ID[:10]}...")
+                print("- Доступ таблицы для сервисного аккаунта:")
+                print("  • Email: " + (getattr(creds, "service_account_email", None) or "неизвестно"))
+                print("- Разрешения таблицы: Права 'Редактор' для email выше")
+                print("- Включение Google Sheets API в Google Cloud Console")
+                print("!"*60)
+            else:
+                print(f"⚠️ Google Sheets: попытка {attempt} не удалась: {str(e)}")
+            print(f"ℹ️ Бот работает только с Discord, повтор подключения через {delay} сек")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHEETS_CONNECT_RETRY_MAX)
+    
+    sheets_writer.attach(transport, ensure_sheets=lambda: ensure_sheets_exist(repair=True))
+    print(f"⏱️ Google Sheets подключён за {time.perf_counter() - started:.2f} сек "
+          f"({time.perf_counter() - STARTED_AT:.2f} сек с момента запуска)")
+
+# === ОЧЕРЕДЬ ЗАПИСИ В GOOGLE SHEETS ===
+# Все записи выполняются в фоне, чтобы не блокировать цикл событий Discord,
+# а записи нескольких команд объединяются в общие запросы.
+# Строки сначала сохраняются в локальный спул и удаляются из него только после записи,
+# поэтому ошибки API и перезапуски бота их не теряют.
+# Транспорт подключается в init_google_sheets, до этого строки копятся в спуле
+sheets_spool = SheetsSpool(SHEETS_SPOOL_PATH)
+sheets_writer = SheetsWriter(
+    None,
+    SHEET_ID,
+    sheets_spool,
+    flush_interval=float(os.getenv("SHEETS_FLUSH_INTERVAL", "2"))
+)
 
-# === НАСТРОЙКА ЛИСТОВ ПРИ ЗАПУСКЕ ===
-print("\n🔧 ПРОВЕРКА ЛИСТОВ В GOOGLE ТАБЛИЦЕ...")
-ensure_sheets_exist(SHEET_ID)
+# === ЛОКАЛЬНЫЙ ИНДЕКС СООБЩЕНИЙ ===
+# Повторные отчёты за те же даты читаются из базы, а не из истории Discord
+message_store = MessageStore(MESSAGE_STORE_PATH)
+print(f"🗄️ Локальный индекс сообщений: {MESSAGE_STORE_PATH}")
+
+# Новые сообщения, правки и удаления записываются в индекс пачками по мере поступления
+live_ingestor = LiveIngestor(message_store)
 
 # === НАСТРОЙКА DISCORD БОТА ===
 intents = discord.Intents.default()
@@ -228,48 +303,382 @@ bot = commands.Bot(
     help_command=None  # Отключаем встроенную команду help
 )
 
-# === ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: ПРОВЕРКА ИЗОБРАЖЕНИЯ ===
-def is_image(attachment):
-    """Проверяет, является ли вложение изображением"""
-    if not attachment.content_type:
-        return False
-    content_type = attachment.content_type.lower()
-    return content_type.startswith('image/') or content_type == 'application/octet-stream'
+# === ЗАГРУЗКА ИСТОРИИ КАНАЛА ЧЕРЕЗ ЛОКАЛЬНЫЙ ИНДЕКС ===
+# Недостающие интервалы делятся на части по времени и загружаются параллельно
+history_fetcher = HistoryFetcher(message_store, concurrency=HISTORY_FETCH_CONCURRENCY)
+
+async def sync_channel_history(channel, start_dt, end_dt):
+    """
+    Догружает из Discord только те интервалы периода, которых ещё нет в локальном индексе.
+    Возвращает True, если после загрузки весь период есть в индексе.
+    """
+    with perf.span("history"):
+        return await history_fetcher.sync(channel, start_dt, end_dt)
+
+def iter_channel_messages(channel, start_dt, end_dt):
+    """
+    Перебирает сообщения канала за период (от старых к новым) из локального индекса.
+    Сообщения читаются страницами, поэтому память не зависит от длины периода.
+    """
+    return message_store.iter_messages(channel.id, to_timestamp(start_dt), to_timestamp(end_dt))
+
+# === СЛОВАРИ КАДРОВЫХ СООБЩЕНИЙ ===
+# Загружаются из файла и пересобираются автоматически, когда файл меняется
+staff_dictionary = StaffKeywordDictionary(STAFF_KEYWORDS_PATH)
+
+# === ГРУППЫ КАНАЛОВ (PREDEFINED_GROUPS ИЗ config.json) ===
+def load_config(path):
+    """Читает необязательный файл config.json"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось прочитать {path}: {e}")
+        return {}
+
+bot_config = load_config(CONFIG_PATH)
+# {имя группы: [имена каналов]} или {имя группы: None} — все текстовые каналы сервера
+PREDEFINED_GROUPS = bot_config.get("PREDEFINED_GROUPS") or {}
+if PREDEFINED_GROUPS:
+    print(f"📁 Группы каналов: {', '.join(PREDEFINED_GROUPS)}")
+
+# Роли с доступом к командам (ALLOWED_ROLES из config.json, иначе SENIOR_ROLE_NAME)
+role_access = RoleAccess.from_config(bot_config, SENIOR_ROLE_NAME)
+
+# Часовой пояс плановых отчётов и «сегодня» по умолчанию (TIMEZONE из окружения или config.json)
+def load_timezone(name):
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError) as e:
+        print(f"⚠️ Неизвестный часовой пояс '{name}' ({e}), используется UTC")
+        return datetime.timezone.utc
+
+TIMEZONE_NAME = os.getenv("TIMEZONE") or bot_config.get("TIMEZONE") or "UTC"
+TIMEZONE = load_timezone(TIMEZONE_NAME)
+
+def local_today():
+    """Сегодняшняя дата в часовом поясе TIMEZONE (ДД-ММ-ГГГГ)"""
+    return datetime.datetime.now(TIMEZONE).strftime("%d-%m-%Y")
+
+def role_names_text(guild_id=None):
+    """Разрешённые роли сервера для сообщений: `Роль 1`, `Роль 2`"""
+    return ", ".join(f"`{name}`" for name in role_access.names_for(guild_id))
+
+def resolve_channels(guild, target):
+    """
+    Возвращает (список каналов, подпись для отчёта) для канала или имени группы.
+    Если группа не найдена, выбрасывает LookupError.
+    """
+    if isinstance(target, discord.TextChannel):
+        return [target], target.name
+    
+    name = target.strip().lstrip("#").lower()
+    groups = {group.lower(): group for group in PREDEFINED_GROUPS}
+    if name not in groups:
+        available = ", ".join(f"`{group}`" for group in PREDEFINED_GROUPS) or "нет (см. PREDEFINED_GROUPS в config.json)"
+        raise LookupError(f"Канал или группа `{target}` не найдены. Доступные группы: {available}")
+    
+    group = groups[name]
+    members = PREDEFINED_GROUPS[group]
+    if members is None:
+        # Все текстовые каналы, историю которых бот может читать
+        me = guild.me
+        channels = [c for c in guild.text_channels if c.permissions_for(me).read_message_history]
+    else:
+        by_name = {c.name.lower(): c for c in guild.text_channels}
+        channels = [by_name[member.lstrip("#").lower()] for member in members if member.lstrip("#").lower() in by_name]
+    
+    if not channels:
+        raise LookupError(f"В группе `{group}` нет доступных каналов на этом сервере")
+    return channels, f"{group} ({len(channels)} каналов)"
+
+def describe_target(channels, channel_label):
+    """Текст «канале #x» или «группе каналов ...» для сообщений бота"""
+    if len(channels) == 1:
+        return f"канале {channels[0].mention}"
+    return f"группе каналов `{channel_label}`"
+
+async def scan_channels(channels, collect):
+    """
+    Запускает collect(channel) для всех каналов параллельно, не более CHANNEL_SCAN_CONCURRENCY одновременно.
+    Возвращает (результаты в порядке каналов, каналы без прав на чтение).
+    """
+    semaphore = asyncio.Semaphore(CHANNEL_SCAN_CONCURRENCY)
+    
+    async def run(channel):
+        async with semaphore:
+            return await collect(channel)
+    
+    outcomes = await asyncio.gather(*(run(channel) for channel in channels), return_exceptions=True)
+    results = []
+    skipped = []
+    forbidden = None
+    for channel, outcome in zip(channels, outcomes):
+        if isinstance(outcome, discord.Forbidden):
+            skipped.append(channel)
+            forbidden = outcome
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results.append(outcome)
+    if not results and forbidden is not None:
+        raise forbidden
+    return results, skipped
+
+def merge_reports(results, skipped=()):
+    """Объединяет накопители нескольких каналов: {имя отчёта: накопитель}"""
+    merged = results[0]
+    for other in results[1:]:
+        for name, accumulator in merged.items():
+            accumulator.merge(other[name])
+    if skipped:
+        # Пропущенные каналы не попали в отчёт
+        for accumulator in merged.values():
+            accumulator.complete = False
+    return merged
+
+async def report_skipped_channels(ctx, skipped):
+    if skipped:
+        await ctx.send(f"⚠️ Нет прав на чтение каналов: {', '.join(c.mention for c in skipped)}. Они пропущены.")
+
+def report_options():
+    """Общие настройки накопителей (словари перечитываются, если файл изменился)"""
+    return {"staff_keywords": staff_dictionary.get(), "bot_version": BOT_VERSION}
+
+# Через сколько просмотренных сообщений обновлять ход задачи
+JOB_PROGRESS_BATCH = 1000
+
+def create_reports(names, options):
+    """Новые накопители для отчётов names: {имя отчёта: накопитель}"""
+    return {name: REPORT_TYPES[name].create(options) for name in names}
+
+async def collect_reports(channel, start_dt, end_dt, reports):
+    """
+    Заполняет накопители reports по одному каналу за один проход по его истории.
+    Отчёты, которые можно посчитать по суточным сводкам, считаются без просмотра сообщений.
+    """
+    # Ход просмотра канала для сообщения о задаче (будущее время не просматривается)
+    scan_key = ("scan", channel.id)
+    jobs.track(scan_key, to_timestamp(start_dt), min(to_timestamp(end_dt), time.time()))
+    complete = await sync_channel_history(channel, start_dt, end_dt)
+    messages_scanned = 0
+    with perf.span("aggregate"):
+        scanned = []
+        # Суточные сводки считаются по суткам UTC: по ним можно ответить, только если период из целых суток UTC
+        utc_days = to_timestamp(start_dt) % DAY_SECONDS == 0 and to_timestamp(end_dt) % DAY_SECONDS == 0
+        for accumulator in reports.values():
+            accumulator.complete = complete
+            if complete and utc_days and accumulator.uses_rollups:
+                # Весь период есть в индексе: считаем по суточным сводкам (O(дней), а не O(сообщений))
+                totals, users = await asyncio.to_thread(
+                    message_store.activity_summary, channel.guild.id, channel.id, day_of(start_dt), day_of(end_dt)
+                )
+                accumulator.add_summary(totals, users)
+            else:
+                scanned.append(accumulator)
+        
+        if scanned:
+            pipeline = ReportPipeline(scanned)
+            async for message in iter_channel_messages(channel, start_dt, end_dt):
+                pipeline.add(message, channel)
+                messages_scanned += 1
+                if messages_scanned % JOB_PROGRESS_BATCH == 0:
+                    jobs.advance(scan_key, message.created_ts, scanned=JOB_PROGRESS_BATCH)
+            perf.count("messages_scanned", messages_scanned)
+    jobs.done(scan_key, scanned=messages_scanned % JOB_PROGRESS_BATCH)
+    return reports
+
+# Готовые результаты отчётов: повторный запрос за тот же период не просматривает историю заново
+report_cache = ReportCache(REPORT_CACHE_SIZE, REPORT_CACHE_TTL_CLOSED, REPORT_CACHE_TTL_OPEN, REPORT_CACHE_WEIGHT)
+# Флаг команд отчётов: посчитать заново, не используя кэш
+FRESH_FLAG = "--fresh"
+
+def wants_fresh(ctx):
+    """Есть ли в команде флаг --fresh"""
+    return FRESH_FLAG in ctx.message.content.lower().split()
+
+def without_fresh(value):
+    """Необязательный аргумент, на месте которого может стоять --fresh"""
+    return None if value is not None and value.lower() == FRESH_FLAG else value
+
+def report_cache_key(name, channels, start_dt, end_dt, options):
+    return cache_key(
+        name, channels[0].guild.id, channels, to_timestamp(start_dt), to_timestamp(end_dt),
+        REPORT_TYPES[name].cache_key(options)
+    )
+
+async def scan_reports(ctx, channels, start_dt, end_dt, names, fresh=False):
+    """
+    Собирает отчёты names по всем каналам параллельно и объединяет их.
+    Результаты за тот же период берутся из report_cache (если такой отчёт как раз считается —
+    дожидаемся его), полные результаты сохраняются в кэш. fresh=True — считать заново.
+    """
+    options = report_options()
+    keys = {name: report_cache_key(name, channels, start_dt, end_dt, options) for name in names}
+    reports = {}
+    cached_at = []
+    if not fresh:
+        for name in names:
+            entry = report_cache.get(keys[name])
+            if entry is not None:
+                reports[name] = entry.accumulator
+                cached_at.append(entry.stored_at)
+        for name in names:
+            future = None if name in reports else report_cache.in_flight(keys[name])
+            if future is not None:
+                # Такой же отчёт уже считает другая команда: ждём его результат (отмена нас его не прервёт)
+                accumulator = await asyncio.shield(future)
+                if accumulator is not None:
+                    reports[name] = accumulator
+                    report_cache.shared += 1
+    if cached_at:
+        minutes = int((time.time() - min(cached_at)) // 60)
+        await ctx.send(f"⚡ Результат взят из кэша (посчитан {minutes} мин назад). Пересчитать: добавьте `{FRESH_FLAG}` к команде")
+    
+    missing = [name for name in names if name not in reports]
+    if not missing:
+        return reports
+    futures = {name: report_cache.begin(keys[name]) for name in missing}
+    merged = {}
+    try:
+        results, skipped = await scan_channels(
+            channels, lambda c: collect_reports(c, start_dt, end_dt, create_reports(missing, options))
+        )
+        await report_skipped_channels(ctx, skipped)
+        merged = merge_reports(results, skipped)
+        # Период с сегодняшним днём ещё пополняется: такой результат хранится недолго
+        open_range = end_dt > datetime.datetime.now(datetime.timezone.utc)
+        for name, accumulator in merged.items():
+            if accumulator.complete:
+                report_cache.put(keys[name], accumulator, open_range)
+    finally:
+        for name, future in futures.items():
+            accumulator = merged.get(name)
+            report_cache.finish(keys[name], future, accumulator if accumulator is not None and accumulator.complete else None)
+    reports.update(merged)
+    return reports
+
+async def enqueue_report_rows(stats, chunks, destination=None, success_message=None):
+    """
+    Ставит строки отчёта в очередь Google Sheets: одно задание на порцию из chunks
+    (success_message — с последней). Результат из кэша, который уже был сохранён в таблицу,
+    повторно не записывается (иначе в таблице появятся дубли).
+    """
+    if stats.sheets_saved:
+        if destination is not None and success_message:
+            await destination.send("ℹ️ Этот результат уже сохранён в Google Sheets")
+        return True
+    queued = True
+    chunk = next(chunks, None)
+    while chunk is not None:
+        next_chunk = next(chunks, None)
+        queued = await sheets_writer.enqueue(
+            stats.sheet_range,
+            chunk,
+            destination=destination,
+            success_message=success_message if next_chunk is None else None
+        )
+        if not queued:
+            break
+        chunk = next_chunk
+    stats.sheets_saved = queued
+    return queued
+
+def format_report(stats, start_date, end_date, channel_label):
+    """Строки отчёта (время формирования учитывается в !perf)"""
+    with perf.span("format"):
+        return stats.report_lines(start_date, end_date, channel_label)
+
+async def send_timed(ctx, content=None, **kwargs):
+    """ctx.send с замером времени и объёма отправки для !perf"""
+    with perf.span("discord_send"):
+        message = await ctx.send(content, **kwargs)
+    perf.count("discord_messages_sent")
+    sent_bytes = len(content.encode("utf-8")) if content else 0
+    for embed in kwargs.get("embeds") or ():
+        sent_bytes += len((embed.description or "").encode("utf-8"))
+    if sent_bytes:
+        perf.count("discord_bytes_sent", sent_bytes)
+    return message
+
+async def send_report_lines(ctx, report_lines):
+    """
+    Отправляет отчёт: строки собираются в embed (до 10 в сообщении), короткий отчёт уходит
+    целиком, длинный — одним сообщением с кнопками листания. Без права «Встраивать ссылки»
+    отчёт отправляется текстом по частям, строки не разрываются.
+    """
+    channel = getattr(ctx, "channel", ctx)
+    if not can_embed(channel):
+        parts = pack_lines(report_lines, MESSAGE_LIMIT - 100)
+        for i, part in enumerate(parts, 1):
+            if i == 1:
+                await send_timed(ctx, part)
+            else:
+                await send_timed(ctx, f"**Часть {i} из {len(parts)}**\n{part}")
+        return
+    
+    pages = pack_embeds(report_lines)
+    if len(pages) <= INLINE_MESSAGES:
+        for descriptions in pages:
+            await send_timed(ctx, embeds=build_embeds(descriptions))
+        return
+    
+    author = getattr(ctx, "author", None)
+    view = PageView(pages, author.id if author is not None else None)
+    view.message = await send_timed(ctx, embeds=view.embeds(), view=view)
 
 # === ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: ПРОВЕРКА РОЛИ ===
 def has_senior_role():
     """Декоратор для проверки наличия роли у пользователя"""
     async def predicate(ctx):
-        # Ищем роль по имени (регистронезависимо)
-        senior_role = None
-        for role in ctx.guild.roles:
-            if role.name.lower() == SENIOR_ROLE_NAME.lower():
-                senior_role = role
-                break
-        
-        if senior_role is None:
-            await ctx.send(f"❌ Роль '{SENIOR_ROLE_NAME}' не найдена на этом сервере. Свяжитесь с администратором.")
+        if ctx.guild is None:
+            return False
+        # id разрешённых ролей берутся из кэша (сбрасывается в on_guild_role_*)
+        role_ids = role_access.role_ids(ctx.guild)
+        if not role_ids:
+            await ctx.send(f"❌ Роль {role_names_text(ctx.guild.id)} не найдена на этом сервере. Свяжитесь с администратором.")
             return False
             
-        # Проверяем, есть ли у пользователя эта роль
-        if senior_role not in ctx.author.roles:
-            await ctx.send(f"❌ У вас нет прав для использования этой команды. Требуется роль `{SENIOR_ROLE_NAME}`")
+        # Проверяем, есть ли у пользователя одна из ролей
+        if not role_access.is_allowed(ctx.author, role_ids):
+            await ctx.send(f"❌ У вас нет прав для использования этой команды. Требуется роль {role_names_text(ctx.guild.id)}")
             return False
             
         return True
     return commands.check(predicate)
 
+# === ЗАДАЧИ ОТЧЁТОВ: ОЧЕРЕДЬ, ХОД ВЫПОЛНЕНИЯ, ОТМЕНА ===
+report_jobs = jobs.JobManager(JOBS_PER_GUILD, JOB_PROGRESS_INTERVAL)
+
+def report_job(func):
+    """Декоратор: команда выполняется как задача отчёта (очередь сервера, сообщение о ходе, !cancel)"""
+    @functools.wraps(func)
+    async def wrapper(ctx, *args, **kwargs):
+        async with report_jobs.run(ctx, ctx.message.clean_content[:100]):
+            return await func(ctx, *args, **kwargs)
+    return wrapper
+
 # === КОМАНДА: АНАЛИЗ АКТИВНОСТИ С ТОП-ПОЛЬЗОВАТЕЛЯМИ (ТОЛЬКО ИЗОБРАЖЕНИЯ) ===
 @bot.command(name="activity")
 @has_senior_role()
-async def activity(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None):
-    """Анализ активности в канале за период. Пример: !activity #чат 01-01-2026 15-01-2026"""
-    await ctx.send(f"🔄 Запускаю анализ активности в канале {channel.mention}...")
+@report_job
+async def activity(ctx, channel: typing.Union[discord.TextChannel, str], start_date: str, end_date: str = None):
+    """Анализ активности в канале или группе каналов за период. Пример: !activity #чат 01-01-2026 15-01-2026"""
+    end_date = without_fresh(end_date)
+    try:
+        channels, channel_label = resolve_channels(ctx.guild, channel)
+    except LookupError as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    target_mention = describe_target(channels, channel_label)
+    await ctx.send(f"🔄 Запускаю анализ активности в {target_mention}...")
     
     try:
         # Обработка дат (формат ДД-ММ-ГГГГ)
         if end_date is None:
-            end_date = datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y")
+            end_date = local_today()
             
         # Парсим даты в формате ДД-ММ-ГГГГ
         start_dt = parse_date(start_date)
@@ -278,150 +687,57 @@ async def activity(ctx, channel: discord.TextChannel, start_date: str, end_date:
         if start_dt > end_dt:
             await ctx.send("❌ Ошибка: дата начала позже даты окончания!")
             return
-            
-        # Сбор статистики
-        message_count = 0
-        unique_users = {}  # {user_id: display_name}
-        images = 0
-        links = 0
-        
-        # Словари для сбора статистики по пользователям
-        user_messages = {}  # {user_id: количество сообщений}
-        user_images = {}    # {user_id: количество изображений}
-        
-        # Добавлен лимит для безопасности
-        async for message in channel.history(after=start_dt, before=end_dt, limit=10000):
-            if message.author.bot:
-                continue
-                
-            user_id = str(message.author.id)
-            # Используем отображаемое имя пользователя на сервере
-            display_name = str(message.author.display_name)
-            
-            # Сохраняем имя пользователя при первом появлении
-            if user_id not in unique_users:
-                unique_users[user_id] = display_name
-            
-            message_count += 1
-            
-            # Подсчет сообщений по пользователям
-            user_messages[user_id] = user_messages.get(user_id, 0) + 1
-            
-            # Анализ контента
-            # Подсчет ТОЛЬКО изображений
-            for attachment in message.attachments:
-                if is_image(attachment):
-                    images += 1
-                    # Подсчет изображений по пользователям
-                    user_images[user_id] = user_images.get(user_id, 0) + 1
-            
-            if "http://" in message.content or "https://" in message.content:
-                links += 1
-        
-        # Формирование отчета
-        report_lines = [
-            f"📊 **Отчет по активности (только изображения)**",
-            f"📅 Период: `{start_date} - {end_date}`",
-            f"💬 Сообщений: **{message_count}**",
-            f"👥 Уникальных пользователей: **{len(unique_users)}**",
-            f"🖼️ Изображений: **{images}**",
-            f"🔗 Ссылок: **{links}**",
-            f"📈 Канал: `{channel.name}`",
-            "\n🏆 **ТОП-10 пользователей по сообщениям:**"
-        ]
-        
-        # ТОП-10 по сообщениям
-        top_messages = sorted(user_messages.items(), key=lambda x: x[1], reverse=True)[:10]
-        if top_messages:
-            for i, (user_id, count) in enumerate(top_messages, 1):
-                username = unique_users.get(user_id, "Неизвестный пользователь")
-                report_lines.append(f"**{i}.** {username} — **{count}** сообщений")
-        else:
-            report_lines.append("ℹ️ Нет данных для формирования ТОП-10 по сообщениям")
         
-        # ТОП-10 по изображениям
-        report_lines.append("\n📸 **ТОП-10 пользователей по изображениям:**")
-        top_images = sorted(user_images.items(), key=lambda x: x[1], reverse=True)[:10]
-        if top_images:
-            for i, (user_id, count) in enumerate(top_images, 1):
-                username = unique_users.get(user_id, "Неизвестный пользователь")
-                report_lines.append(f"**{i}.** {username} — **{count}** изображений")
-        else:
-            report_lines.append("ℹ️ Нет данных для формирования ТОП-10 по изображениям")
-        
-        report = "\n".join(report_lines)
+        # Сбор статистики по всем каналам параллельно
+        stats = (await scan_reports(ctx, channels, start_dt, end_dt, ["activity"], fresh=wants_fresh(ctx)))["activity"]
         
-        # Отправка отчета (разбиваем на части если превышает лимит)
-        if len(report) > 1900:
-            parts = [report[i:i+1900] for i in range(0, len(report), 1900)]
-            for part in parts:
-                await ctx.send(part)
-        else:
-            await ctx.send(report)
+        # Формирование и отправка отчета
+        await send_report_lines(ctx, format_report(stats, start_date, end_date, channel_label))
         
         # Отправка в Google Sheets (сохраняем только общую статистику)
-        values = [[
-            ctx.guild.name,
-            channel.name,
-            start_date,
-            end_date,
-            message_count,
-            len(unique_users),
-            images,
-            links,
-            datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC")
-        ]]
-        
-        try:
-            sheets_service.spreadsheets().values().append(
-                spreadsheetId=SHEET_ID,
-                range="Activity!A:I",
-                valueInputOption="USER_ENTERED",
-                body={"values": values}
-            ).execute()
-            
-            await ctx.send("✅ Данные успешно сохранены в Google Sheets!")
-        except HttpError as e:
-            if "Unable to parse range" in str(e):
-                await ctx.send("❌ Ошибка записи в таблицу: отсутствуют необходимые листы. Бот пытается создать их автоматически...")
-                ensure_sheets_exist(SHEET_ID)
-                sheets_service.spreadsheets().values().append(
-                    spreadsheetId=SHEET_ID,
-                    range="Activity!A:I",
-                    valueInputOption="USER_ENTERED",
-                    body={"values": values}
-                ).execute()
-                await ctx.send("✅ Листы созданы и данные сохранены!")
-            else:
-                error_content = json.loads(e.content.decode('utf-8')) if hasattr(e, 'content') else str(e)
-                print(f"Google Sheets API error: {error_content}")
-                print(f"Request details: {e.uri}")
-                await ctx.send(f"⚠️ Ошибка при сохранении в Google Sheets: {str(e)}")
+        await enqueue_report_rows(
+            stats,
+            stats.sheet_chunks(ctx.guild.name, channel_label, start_date, end_date, sanitize_value),
+            destination=ctx,
+            success_message="✅ Данные успешно сохранены в Google Sheets!"
+        )
         
     except ValueError as e:
         await ctx.send(f"❌ Ошибка формата даты: {str(e)}")
     except discord.Forbidden:
-        await ctx.send(f"❌ У бота нет прав на чтение канала {channel.mention}. Проверьте разрешения в настройках сервера.")
+        await ctx.send(f"❌ У бота нет прав на чтение {target_mention}. Проверьте разрешения в настройках сервера.")
     except Exception as e:
         await ctx.send(f"⚠️ Критическая ошибка: `{str(e)}`")
         print(f"\n🔥 НЕОБРАБОТАННОЕ ИСКЛЮЧЕНИЕ В КОМАНДЕ activity: {e}")
-    finally:
-        gc.collect()
 
 # === КОМАНДА: АНАЛИЗ ИЗОБРАЖЕНИЙ С ГРУППИРОВКОЙ ===
 @bot.command(name="images")
 @has_senior_role()
-async def images(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None, limit: int = 500):
+@report_job
+async def images(ctx, channel: typing.Union[discord.TextChannel, str], start_date: str, end_date: str = None, limit: str = None):
     """
-    Анализ сообщений с изображениями за период.
-    Пример: !images #media 01-01-2026 07-01-2026 500
+    Анализ сообщений с изображениями за период (канал или группа каналов).
+    Пример: !images #media 01-01-2026 07-01-2026
+    Прежний аргумент limit (`!images #media 01-01-2026 07-01-2026 500`) принимается, но не используется.
     """
-    await ctx.send(f"🔍 Собираю сообщения с изображениями в канале {channel.mention}...")
+    end_date = without_fresh(end_date)
+    if without_fresh(limit) is not None:
+        await ctx.send(
+            f"ℹ️ Аргумент limit (`{limit}`) больше не используется: просматриваются все сообщения периода, "
+            f"в отчёте — до {IMAGES_SHOWN} сообщений, полный список — `{COMMAND_PREFIX}export_images`."
+        )
+    try:
+        channels, channel_label = resolve_channels(ctx.guild, channel)
+    except LookupError as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    target_mention = describe_target(channels, channel_label)
+    await ctx.send(f"🔍 Собираю сообщения с изображениями в {target_mention}...")
     
     try:
         # Обработка дат (формат ДД-ММ-ГГГГ)
         if end_date is None:
-            end_date = datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y")
+            end_date = local_today()
         
         start_dt = parse_date(start_date)
         end_dt = parse_date(end_date) + datetime.timedelta(days=1)
@@ -430,301 +746,124 @@ async def images(ctx, channel: discord.TextChannel, start_date: str, end_date: s
             await ctx.send("❌ Ошибка: дата начала позже даты окончания!")
             return
         
-        # Сбор данных
-        message_images = {}  # {message_id: {"link": str, "images": [{"number": int, "url": str}], "author": str, "created_at": str}}
-        image_number = 1
+        # Сбор данных по всем каналам параллельно
+        stats = (await scan_reports(ctx, channels, start_dt, end_dt, ["images"], fresh=wants_fresh(ctx)))["images"]
         
-        # Добавлен лимит для безопасности
-        async for message in channel.history(after=start_dt, before=end_dt, limit=10000):
-            if message.author.bot:
-                continue
-                
-            # Проверяем наличие ИЗОБРАЖЕНИЙ в сообщении
-            image_attachments = [
-                att for att in message.attachments 
-                if is_image(att)
-            ]
-            
-            if not image_attachments:
-                continue  # Пропускаем сообщения без изображений
-                
-            message_link = f"https://discord.com/channels/{ctx.guild.id}/{channel.id}/{message.id}"
-            
-            # Инициализируем данные для сообщения
-            if message.id not in message_images:
-                message_images[message.id] = {
-                    "link": message_link,
-                    "images": [],
-                    "author": str(message.author.display_name),  # Используем отображаемое имя
-                    "created_at": message.created_at.strftime("%d-%m-%Y %H:%M")
-                }
-            
-            # Добавляем каждое ИЗОБРАЖЕНИЕ к сообщению
-            for attachment in image_attachments:
-                message_images[message.id]["images"].append({
-                    "number": image_number,
-                    "url": attachment.url
-                })
-                image_number += 1
-        
-        total_messages = len(message_images)
-        total_images = sum(len(data["images"]) for data in message_images.values())
+        total_messages = stats.total_messages
+        total_images = stats.total_images
         
         # Формирование отчёта
-        if not message_images:
+        if not total_messages:
             await ctx.send(f"ℹ️ В период с {start_date} по {end_date} не найдено сообщений с изображениями.")
             return
         
-        # Генерация текста отчёта
-        report_lines = [f"📊 **Отчёт по изображениям** в канале `{channel.name}`"]
-        report_lines.append(f"📅 Период: `{start_date} - {end_date}`")
-        report_lines.append(f"🖼️ Всего изображений: **{total_images}**")
-        report_lines.append(f"💬 Сообщений с изображениями: **{total_messages}**")
-        report_lines.append("\n🔗 **Ссылки на сообщения с изображениями:**")
-        
-        # Формируем отчет с группировкой изображений по сообщениям
-        processed_messages = list(message_images.values())
-        
-        # Показываем первые 20 сообщений (а не изображений)
-        messages_to_show = min(20, len(processed_messages))
-        for i, data in enumerate(processed_messages[:messages_to_show], 1):
-            image_numbers = ", ".join(str(img["number"]) for img in data["images"])
-            # ИСПРАВЛЕНО: убрано дублирование ссылок
-            report_lines.append(f"**{i}.** {data['link']} • № {image_numbers} • **{data['author']}**")
+        # Генерация и отправка отчёта (длинный отчёт делится на части по строкам)
+        await send_report_lines(ctx, format_report(stats, start_date, end_date, channel_label))
         
-        if len(processed_messages) > 20:
-            report_lines.append(f"\nℹ️ Показаны первые 20 из {total_messages} сообщений с изображениями. Для полного отчёта используйте `!export_images`")
-        
-        report = "\n".join(report_lines)
-        
-        # === ИСПРАВЛЕНО: ДОБАВЛЕНА ПАГИНАЦИЯ ДЛЯ ДЛИННЫХ ОТЧЕТОВ ===
-        if len(report) > 1900:
-            # Делим отчет на части
-            parts = []
-            current_part = []
-            current_length = 0
-            
-            for line in report_lines:
-                line_length = len(line) + 1  # +1 для символа новой строки
-                if current_length + line_length > 1900 and current_part:
-                    parts.append("\n".join(current_part))
-                    current_part = [line]
-                    current_length = line_length
-                else:
-                    current_part.append(line)
-                    current_length += line_length
-            
-            if current_part:
-                parts.append("\n".join(current_part))
-            
-            # Отправляем части отчета
-            for i, part in enumerate(parts, 1):
-                if i == 1:
-                    await ctx.send(part)
-                else:
-                    await ctx.send(f"**Часть {i} из {len(parts)}**\n{part}")
-        else:
-            await ctx.send(report)
-        
-        # Сохранение полного отчёта в Google Sheets
-        if message_images:
-            values = []
-            for message_id, data in message_images.items():
-                # Формируем одну запись для всего сообщения со всеми его изображениями
-                image_numbers = ", ".join(str(img["number"]) for img in data["images"])
-                image_urls = " | ".join(img["url"] for img in data["images"])
-                
-                # ИСПРАВЛЕНО: добавлено экранирование значений
-                values.append([
-                    sanitize_value(ctx.guild.name),
-                    sanitize_value(channel.name),
-                    sanitize_value(start_date),
-                    sanitize_value(end_date),
-                    sanitize_value(data['link']),
-                    sanitize_value(image_urls),
-                    sanitize_value(image_numbers),
-                    sanitize_value(data['author']),
-                    sanitize_value(datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC"))
-                ])
-            
-            # Пакетная отправка в Google Sheets
-            batch_size = 1000
-            for i in range(0, len(values), batch_size):
-                batch = values[i:i+batch_size]
-                try:
-                    sheets_service.spreadsheets().values().append(
-                        spreadsheetId=SHEET_ID,
-                        range="Images!A:I",
-                        valueInputOption="USER_ENTERED",
-                        body={"values": batch}
-                    ).execute()
-                except HttpError as e:
-                    if "Unable to parse range" in str(e):
-                        await ctx.send("❌ Ошибка записи в таблицу: отсутствуют необходимые листы. Бот пытается создать их автоматически...")
-                        ensure_sheets_exist(SHEET_ID)
-                        sheets_service.spreadsheets().values().append(
-                            spreadsheetId=SHEET_ID,
-                            range="Images!A:I",
-                            valueInputOption="USER_ENTERED",
-                            body={"values": batch}
-                        ).execute()
-                        await ctx.send("✅ Листы созданы и данные сохранены!")
-                    else:
-                        error_content = json.loads(e.content.decode('utf-8')) if hasattr(e, 'content') else str(e)
-                        print(f"Google Sheets API error: {error_content}")
-                        print(f"Request details: {e.uri}")
-                        await ctx.send(f"⚠️ Ошибка при сохранении в Google Sheets: {str(e)}")
-            
-            await ctx.send(f"✅ Полный отчёт сохранён в Google Sheets! {total_messages} сообщений с {total_images} изображениями.")
+        # Сохранение полного отчёта в Google Sheets: строки читаются из временного файла
+        # и ставятся в очередь пачками по 1000 (в памяти держится одна пачка)
+        await enqueue_report_rows(
+            stats,
+            stats.sheet_chunks(ctx.guild.name, channel_label, start_date, end_date, sanitize_value),
+            destination=ctx,
+            success_message=f"✅ Полный отчёт сохранён в Google Sheets! {total_messages} сообщений с {total_images} изображениями."
+        )
     
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}\n💡 Даты могут быть произвольными: понедельник-воскресенье, рабочие дни, любой период")
     except discord.Forbidden:
-        await ctx.send(f"❌ У бота нет прав на чтение канала {channel.mention}. Выдайте права: `Просмотр канала` и `Чтение истории сообщений`")
+        await ctx.send(f"❌ У бота нет прав на чтение {target_mention}. Выдайте права: `Просмотр канала` и `Чтение истории сообщений`")
     except Exception as e:
         await ctx.send(f"⚠️ Ошибка при обработке: `{str(e)}`")
         print(f"\n🔥 ОШИБКА В КОМАНДЕ images: {e}")
-    finally:
-        gc.collect()
 
-# === КОМАНДА: ЭКСПОРТ ИЗОБРАЖЕНИЙ В CSV С СОХРАНЕНИЕМ В GOOGLE SHEETS ===
+# === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ЭКСПОРТА ===
+def split_optional_end_date(end_date, option):
+    """Конечную дату можно пропустить: `!export_images #media 01-01-2026 jsonl`"""
+    if option is None and end_date is not None and not end_date[:1].isdigit():
+        return None, end_date
+    return end_date, option
+
+async def send_export_files(ctx, file_export, summary):
+    """Отправляет файлы экспорта, по одному на сообщение, если их несколько"""
+    files = file_export.files()
+    for i, (filename, fp) in enumerate(files, 1):
+        file = discord.File(fp=fp, filename=filename)
+        if len(files) == 1:
+            text = summary
+        elif i == 1:
+            text = f"{summary} Файл разбит на {len(files)} частей.\n**Часть 1 из {len(files)}**"
+        else:
+            text = f"**Часть {i} из {len(files)}**"
+        perf.count("discord_bytes_sent", fp.seek(0, io.SEEK_END))
+        fp.seek(0)
+        await send_timed(ctx, text, file=file)
+
+# === КОМАНДА: ЭКСПОРТ ИЗОБРАЖЕНИЙ В ФАЙЛ С СОХРАНЕНИЕМ В GOOGLE SHEETS ===
 @bot.command(name="export_images")
 @has_senior_role()
-async def export_images(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None):
-    """Экспорт полного отчёта по изображениям в CSV файл и сохранение в Google Sheets
+@report_job
+async def export_images(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None, fmt: str = None):
+    """Экспорт полного отчёта по изображениям в файл (csv, jsonl, parquet, arrow) и сохранение в Google Sheets
     
-    Пример: !export_images #media 01-01-2026 07-01-2026
+    Пример: !export_images #media 01-01-2026 07-01-2026 parquet
     """
+    end_date, fmt = split_optional_end_date(end_date, fmt)
+    fmt = (fmt or "csv").lower()
     await ctx.send(f"💾 Готовлю полный экспорт изображений из канала {channel.mention}...")
     
+    export = None
     try:
         # Обработка дат (формат ДД-ММ-ГГГГ)
         if end_date is None:
-            end_date = datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y")
+            end_date = local_today()
         
         start_dt = parse_date(start_date)
         end_dt = parse_date(end_date) + datetime.timedelta(days=1)
         
-        # Сбор всех ИЗОБРАЖЕНИЙ
-        message_images = {}
-        image_number = 1
-        
-        # Добавлен лимит для безопасности
-        async for message in channel.history(after=start_dt, before=end_dt, limit=10000):
-            if message.author.bot:
-                continue
-                
-            # Фильтруем только изображения
-            image_attachments = [
-                att for att in message.attachments 
-                if is_image(att)
-            ]
-            
-            if not image_attachments:
-                continue  # Пропускаем сообщения без изображений
-                
-            message_link = f"https://discord.com/channels/{ctx.guild.id}/{channel.id}/{message.id}"
-            
-            if message.id not in message_images:
-                message_images[message.id] = {
-                    "link": message_link,
-                    "images": [],
-                    "author": str(message.author.display_name),
-                    "created_at": message.created_at.strftime("%d-%m-%Y %H:%M:%S")
-                }
-            
-            for attachment in image_attachments:
-                message_images[message.id]["images"].append({
-                    "number": image_number,
-                    "url": attachment.url
-                })
-                image_number += 1
-        
-        total_messages = len(message_images)
-        total_images = image_number - 1
+        # Сбор всех ИЗОБРАЖЕНИЙ: строки сразу пишутся во временные файлы, история читается постранично
+        basename = f"images_{start_date.replace('-', '')}_{end_date.replace('-', '')}"
+        size_limit = min(ctx.guild.filesize_limit, EXPORT_MAX_FILE_SIZE)
+        export = ImageExport(
+            FileExport(basename, ImageExport.schema_for(fmt), size_limit, fmt, EXPORT_COMPRESSION),
+            [ctx.guild.name, channel.name, start_date, end_date],
+            sanitize_value
+        )
+        await collect_reports(channel, start_dt, end_dt, {"export": export})
+        total_messages = export.total_messages
+        total_images = export.total_images
         
-        if not message_images:
+        if not total_messages:
             await ctx.send("ℹ️ Не найдено изображений для экспорта.")
             return
+        if not export.complete:
+            await ctx.send(f"⚠️ {scan_status_line(False)}")
         
         # === СОХРАНЕНИЕ В GOOGLE SHEETS ===
         await ctx.send("📤 Сохраняю данные в Google Sheets...")
         
-        try:
-            values = []
-            for message_id, data in message_images.items():
-                image_numbers = ", ".join(str(img["number"]) for img in data["images"])
-                image_urls = " | ".join(img["url"] for img in data["images"])
-                
-                # ИСПРАВЛЕНО: добавлено экранирование значений
-                values.append([
-                    sanitize_value(ctx.guild.name),
-                    sanitize_value(channel.name),
-                    sanitize_value(start_date),
-                    sanitize_value(end_date),
-                    sanitize_value(data['link']),
-                    sanitize_value(image_urls),
-                    sanitize_value(image_numbers),
-                    sanitize_value(data['author']),
-                    sanitize_value(datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC"))
-                ])
-            
-            # Пакетная отправка в Google Sheets
-            batch_size = 1000
-            for i in range(0, len(values), batch_size):
-                batch = values[i:i+batch_size]
-                sheets_service.spreadsheets().values().append(
-                    spreadsheetId=SHEET_ID,
-                    range="Images!A:I",
-                    valueInputOption="USER_ENTERED",
-                    body={"values": batch}
-                ).execute()
-            
-            await ctx.send(f"✅ Данные успешно сохранены в Google Sheets! {total_messages} сообщений с {total_images} изображениями.")
-            
-        except HttpError as e:
-            if "Unable to parse range" in str(e):
-                await ctx.send("❌ Ошибка записи в таблицу: отсутствуют необходимые листы. Бот пытается создать их автоматически...")
-                ensure_sheets_exist(SHEET_ID)
-                # Повторная попытка записи
-                for i in range(0, len(values), batch_size):
-                    batch = values[i:i+batch_size]
-                    sheets_service.spreadsheets().values().append(
-                        spreadsheetId=SHEET_ID,
-                        range="Images!A:I",
-                        valueInputOption="USER_ENTERED",
-                        body={"values": batch}
-                    ).execute()
-                await ctx.send("✅ Листы созданы и данные сохранены!")
-            else:
-                error_content = json.loads(e.content.decode('utf-8')) if hasattr(e, 'content') else str(e)
-                print(f"Google Sheets API error: {error_content}")
-                print(f"Request details: {e.uri}")
-                await ctx.send(f"⚠️ Ошибка при сохранении в Google Sheets: {str(e)}")
-                print(f"Google Sheets error: {e}")
-        
-        # === ГЕНЕРАЦИЯ CSV ФАЙЛА ===
-        # ИСПРАВЛЕНО: убран неверный параметр encoding
-        output = io.StringIO(newline='')
-        writer = csv.writer(output)
-        writer.writerow(["Ссылка на сообщение", "№ изображений", "Автор", "Дата"])
-        
-        for data in message_images.values():
-            image_numbers = ", ".join(str(img["number"]) for img in data["images"])
-            writer.writerow([
-                data['link'],
-                image_numbers,
-                data['author'],
-                data['created_at']
-            ])
-        
-        output.seek(0)
-        filename = f"images_{start_date.replace('-', '')}_{end_date.replace('-', '')}.csv"
-        file = discord.File(fp=output, filename=filename)
+        # Пакетная отправка в Google Sheets: пачки по 1000 строк сохраняются в спул на диске
+        # (в памяти держится одна пачка) и записываются в таблицу в фоне, переживая ошибки API и перезапуск
+        exported_at = datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC")
+        chunks = export.sheet_chunks(exported_at)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            next_chunk = next(chunks, None)
+            queued = await sheets_writer.enqueue(
+                export.sheet_range,
+                chunk,
+                destination=ctx,
+                success_message=None if next_chunk is not None else f"✅ Данные успешно сохранены в Google Sheets! {total_messages} сообщений с {total_images} изображениями."
+            )
+            if not queued:
+                break
+            chunk = next_chunk
         
-        await ctx.send(
-            f"✅ Экспорт завершён! Найдено {total_messages} сообщений с {total_images} изображениями.",
-            file=file
+        # === ОТПРАВКА ФАЙЛА (ПО ЧАСТЯМ, ЕСЛИ НЕ ПОМЕЩАЕТСЯ В ЛИМИТ DISCORD) ===
+        await send_export_files(
+            ctx,
+            export.file_export,
+            f"✅ Экспорт завершён! Найдено {total_messages} сообщений с {total_images} изображениями."
         )
         
     except ValueError as e:
@@ -733,22 +872,77 @@ async def export_images(ctx, channel: discord.TextChannel, start_date: str, end_
         await ctx.send(f"❌ Ошибка при экспорте: {str(e)}")
         print(f"\n🔥 ОШИБКА В КОМАНДЕ export_images: {e}")
     finally:
-        gc.collect()
+        if export is not None:
+            export.close()
+
+# === КОМАНДА: ВЫГРУЗКА СЫРЫХ ДАННЫХ АКТИВНОСТИ ===
+@bot.command(name="export_activity")
+@has_senior_role()
+@report_job
+async def export_activity(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None, fmt: str = None):
+    """Выгрузка всех сообщений канала за период (одна строка на сообщение) для анализа в pandas
+    
+    Пример: !export_activity #general 01-01-2026 31-03-2026 parquet
+    """
+    end_date, fmt = split_optional_end_date(end_date, fmt)
+    fmt = (fmt or "jsonl").lower()
+    await ctx.send(f"💾 Готовлю выгрузку активности канала {channel.mention} ({fmt})...")
+    
+    export = None
+    try:
+        # Обработка дат (формат ДД-ММ-ГГГГ)
+        if end_date is None:
+            end_date = local_today()
+        
+        start_dt = parse_date(start_date)
+        end_dt = parse_date(end_date) + datetime.timedelta(days=1)
+        
+        basename = f"activity_{channel.name}_{start_date.replace('-', '')}_{end_date.replace('-', '')}"
+        size_limit = min(ctx.guild.filesize_limit, EXPORT_MAX_FILE_SIZE)
+        export = ActivityExport(FileExport(basename, ActivityExport.schema_for(fmt), size_limit, fmt, EXPORT_COMPRESSION))
+        await collect_reports(channel, start_dt, end_dt, {"export": export})
+        
+        if not export.total_messages:
+            await ctx.send("ℹ️ Нет сообщений за этот период.")
+            return
+        if not export.complete:
+            await ctx.send(f"⚠️ {scan_status_line(False)}")
+        
+        await send_export_files(ctx, export.file_export, f"✅ Выгрузка завершена! {export.total_messages} сообщений.")
+    
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except discord.Forbidden:
+        await ctx.send(f"❌ У бота нет прав на чтение канала {channel.mention}. Проверьте разрешения в настройках сервера.")
+    except Exception as e:
+        await ctx.send(f"❌ Ошибка при выгрузке: {str(e)}")
+        print(f"\n🔥 ОШИБКА В КОМАНДЕ export_activity: {e}")
+    finally:
+        if export is not None:
+            export.close()
 
 # === КОМАНДА: АНАЛИЗ КАДРОВЫХ СООБЩЕНИЙ ===
 @bot.command(name="staff_analysis")
 @has_senior_role()
-async def staff_analysis(ctx, channel: discord.TextChannel, start_date: str, end_date: str = None):
+@report_job
+async def staff_analysis(ctx, channel: typing.Union[discord.TextChannel, str], start_date: str, end_date: str = None):
     """
-    Анализ сообщений о кадровых изменениях (принят/уволен/повышен) за период.
+    Анализ сообщений о кадровых изменениях (принят/уволен/повышен) за период (канал или группа каналов).
     Пример: !staff_analysis #personnel 01-01-2026 07-01-2026
     """
-    await ctx.send(f"🔄 Запускаю анализ кадровых сообщений в канале {channel.mention}...")
+    end_date = without_fresh(end_date)
+    try:
+        channels, channel_label = resolve_channels(ctx.guild, channel)
+    except LookupError as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    target_mention = describe_target(channels, channel_label)
+    await ctx.send(f"🔄 Запускаю анализ кадровых сообщений в {target_mention}...")
     
     try:
         # Обработка дат (формат ДД-ММ-ГГГГ)
         if end_date is None:
-            end_date = datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y")
+            end_date = local_today()
         
         start_dt = parse_date(start_date)
         end_dt = parse_date(end_date) + datetime.timedelta(days=1)
@@ -757,191 +951,343 @@ async def staff_analysis(ctx, channel: discord.TextChannel, start_date: str, end
             await ctx.send("❌ Ошибка: дата начала позже даты окончания!")
             return
         
-        # Ключевые слова для поиска
-        hired_keywords = ["принят", "принята", "принято", "приняты", "оформлен", "оформлена", "трудоустроен", "трудоустроена", "принял контракт", "заключил контракт"]
-        fired_keywords = ["уволен", "уволена", "уволено", "уволены", "увольнение", "уволен по собственному", "уволен за нарушение", "расторг контракт", "прекратил контракт"]
-        promoted_keywords = ["повышен", "повышение", "получил звание", "награжден званием", "присвоено звание", "повышен в звании", "предоставлено звание", "награжден повышением", "присвоено очередное звание", "награжден званием"]
-        
-        # Словари для сбора статистики
-        hired_messages = []
-        fired_messages = []
-        promoted_messages = []
-        
-        hired_authors = {}
-        fired_authors = {}
-        promoted_authors = {}
-        
-        # Сбор данных
-        # Добавлен лимит для безопасности
-        async for message in channel.history(after=start_dt, before=end_dt, limit=10000):
-            if message.author.bot:
-                continue
-            
-            content_lower = message.content.lower()
-            display_name = str(message.author.display_name)
-            
-            # Используется поиск целых слов с помощью регулярных выражений
-            is_hired = any(re.search(rf'\b{re.escape(keyword)}\b', content_lower) for keyword in hired_keywords)
-            is_fired = any(re.search(rf'\b{re.escape(keyword)}\b', content_lower) for keyword in fired_keywords)
-            is_promoted = any(re.search(rf'\b{re.escape(keyword)}\b', content_lower) for keyword in promoted_keywords)
-            
-            message_info = {
-                "content": message.content,
-                "author": display_name,
-                "created_at": message.created_at.strftime("%d-%m-%Y %H:%M"),
-                "link": f"https://discord.com/channels/{ctx.guild.id}/{channel.id}/{message.id}"
-            }
-            
-            if is_hired:
-                hired_messages.append(message_info)
-                hired_authors[display_name] = hired_authors.get(display_name, 0) + 1
-            
-            if is_fired:
-                fired_messages.append(message_info)
-                fired_authors[display_name] = fired_authors.get(display_name, 0) + 1
-            
-            # Обработка повышений
-            if is_promoted:
-                promoted_messages.append(message_info)
-                promoted_authors[display_name] = promoted_authors.get(display_name, 0) + 1
-        
-        # Формирование отчета
-        report_lines = [
-            f"📊 **Отчет по кадровым сообщениям (версия {BOT_VERSION})**",
-            f"📅 Период: `{start_date} - {end_date}`",
-            f"📈 Канал: `{channel.name}`",
-            "\n✅ **Сообщения о приеме на работу:**",
-            f"   • Всего сообщений: **{len(hired_messages)}**",
-            f"   • Уникальных авторов: **{len(hired_authors)}**",
-            "\n❌ **Сообщения об увольнениях:**",
-            f"   • Всего сообщений: **{len(fired_messages)}**",
-            f"   • Уникальных авторов: **{len(fired_authors)}**",
-            "\n🔼 **Сообщения о повышениях:**",
-            f"   • Всего сообщений: **{len(promoted_messages)}**",
-            f"   • Уникальных авторов: **{len(promoted_authors)}**",
-            "\n🏆 **ТОП-10 авторов сообщений о приеме:**"
-        ]
+        # Сбор данных по всем каналам параллельно
+        stats = (await scan_reports(ctx, channels, start_dt, end_dt, ["staff"], fresh=wants_fresh(ctx)))["staff"]
         
-        # ТОП-10 авторов по приему
-        top_hired = sorted(hired_authors.items(), key=lambda x: x[1], reverse=True)[:10]
-        if top_hired:
-            for i, (author, count) in enumerate(top_hired, 1):
-                report_lines.append(f"**{i}.** {author} — **{count}** сообщений")
-        else:
-            report_lines.append("ℹ️ Нет сообщений о приеме на работу")
+        # Формирование и отправка отчета
+        await send_report_lines(ctx, format_report(stats, start_date, end_date, channel_label))
         
-        # ТОП-10 авторов по увольнениям
-        report_lines.append("\n🔥 **ТОП-10 авторов сообщений об увольнениях:**")
-        top_fired = sorted(fired_authors.items(), key=lambda x: x[1], reverse=True)[:10]
-        if top_fired:
-            for i, (author, count) in enumerate(top_fired, 1):
-                report_lines.append(f"**{i}.** {author} — **{count}** сообщений")
-        else:
-            report_lines.append("ℹ️ Нет сообщений об увольнениях")
+        # Сохранение данных в Google Sheets (одна строка на категорию)
+        await enqueue_report_rows(
+            stats,
+            stats.sheet_chunks(ctx.guild.name, channel_label, start_date, end_date, sanitize_value),
+            destination=ctx,
+            success_message="✅ Данные о кадровых сообщениях сохранены в Google Sheets!"
+        )
+    
+    except ValueError as e:
+        await ctx.send(f"❌ Ошибка формата даты: {str(e)}")
+    except discord.Forbidden:
+        await ctx.send(f"❌ У бота нет прав на чтение {target_mention}. Проверьте разрешения в настройках сервера.")
+    except Exception as e:
+        await ctx.send(f"⚠️ Критическая ошибка: `{str(e)}`")
+        print(f"\n🔥 НЕОБРАБОТАННОЕ ИСКЛЮЧЕНИЕ В КОМАНДЕ staff_analysis: {e}")
+
+def parse_report_names(kinds):
+    """Список отчётов из «activity,images,staff» (без повторов); по умолчанию — все"""
+    names = [name.strip().lower() for name in (kinds or ",".join(REPORT_TYPES)).split(",") if name.strip()]
+    unknown = [name for name in names if name not in REPORT_TYPES]
+    if unknown or not names:
+        raise ValueError(f"Неизвестные отчёты: {', '.join(unknown) or '—'}. Доступные: {', '.join(REPORT_TYPES)}")
+    return list(dict.fromkeys(names))
+
+# === КОМАНДА: НЕСКОЛЬКО ОТЧЁТОВ ЗА ОДИН ПРОХОД ===
+@bot.command(name="report")
+@has_senior_role()
+@report_job
+async def report_cmd(ctx, channel: typing.Union[discord.TextChannel, str], start_date: str, end_date: str = None, kinds: str = None):
+    """
+    Несколько отчётов по каналу или группе каналов за один просмотр истории.
+    Пример: !report #media 01-01-2026 07-01-2026 activity,images,staff
+    """
+    # Конечную дату можно пропустить: !report #media 01-01-2026 activity,staff
+    end_date, kinds = split_optional_end_date(without_fresh(end_date), without_fresh(kinds))
+    try:
+        names = parse_report_names(kinds)
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    
+    try:
+        channels, channel_label = resolve_channels(ctx.guild, channel)
+    except LookupError as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    target_mention = describe_target(channels, channel_label)
+    await ctx.send(f"🔄 Собираю отчёты ({', '.join(names)}) в {target_mention} за один проход...")
+    
+    try:
+        # Обработка дат (формат ДД-ММ-ГГГГ)
+        if end_date is None:
+            end_date = local_today()
         
-        # ТОП-10 авторов по повышениям
-        report_lines.append("\n⭐ **ТОП-10 авторов сообщений о повышениях:**")
-        top_promoted = sorted(promoted_authors.items(), key=lambda x: x[1], reverse=True)[:10]
-        if top_promoted:
-            for i, (author, count) in enumerate(top_promoted, 1):
-                report_lines.append(f"**{i}.** {author} — **{count}** сообщений")
-        else:
-            report_lines.append("ℹ️ Нет сообщений о повышениях")
+        start_dt = parse_date(start_date)
+        end_dt = parse_date(end_date) + datetime.timedelta(days=1)
         
-        report = "\n".join(report_lines)
+        if start_dt > end_dt:
+            await ctx.send("❌ Ошибка: дата начала позже даты окончания!")
+            return
         
-        # Добавлена пагинация для длинных отчетов
-        if len(report) > 1900:
-            parts = [report[i:i+1900] for i in range(0, len(report), 1900)]
-            for part in parts:
-                await ctx.send(part)
+        reports = await scan_reports(ctx, channels, start_dt, end_dt, names, fresh=wants_fresh(ctx))
+        
+        queued = True
+        for name in names:
+            stats = reports[name]
+            await send_report_lines(ctx, format_report(stats, start_date, end_date, channel_label))
+            queued = await enqueue_report_rows(
+                stats,
+                stats.sheet_chunks(ctx.guild.name, channel_label, start_date, end_date, sanitize_value)
+            ) and queued
+        if queued:
+            await ctx.send("📤 Данные отчётов поставлены в очередь на сохранение в Google Sheets")
         else:
-            await ctx.send(report)
-        
-        # Сохранение данных в Google Sheets
-        values = []
-        
-        # Данные по приему
-        if hired_messages:
-            top_hired_authors = ", ".join([f"{author} ({count})" for author, count in top_hired][:3])
-            values.append([
-                sanitize_value(ctx.guild.name),
-                sanitize_value(channel.name),
-                sanitize_value(start_date),
-                sanitize_value(end_date),
-                sanitize_value("принят"),
-                sanitize_value(len(hired_messages)),
-                sanitize_value(len(hired_authors)),
-                sanitize_value(top_hired_authors),
-                sanitize_value(datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC"))
-            ])
-        
-        # Данные по увольнениям
-        if fired_messages:
-            top_fired_authors = ", ".join([f"{author} ({count})" for author, count in top_fired][:3])
-            values.append([
-                sanitize_value(ctx.guild.name),
-                sanitize_value(channel.name),
-                sanitize_value(start_date),
-                sanitize_value(end_date),
-                sanitize_value("уволен"),
-                sanitize_value(len(fired_messages)),
-                sanitize_value(len(fired_authors)),
-                sanitize_value(top_fired_authors),
-                sanitize_value(datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC"))
-            ])
-        
-        # Данные по повышениям
-        if promoted_messages:
-            top_promoted_authors = ", ".join([f"{author} ({count})" for author, count in top_promoted][:3])
-            values.append([
-                sanitize_value(ctx.guild.name),
-                sanitize_value(channel.name),
-                sanitize_value(start_date),
-                sanitize_value(end_date),
-                sanitize_value("повышен"),
-                sanitize_value(len(promoted_messages)),
-                sanitize_value(len(promoted_authors)),
-                sanitize_value(top_promoted_authors),
-                sanitize_value(datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC"))
-            ])
-        
-        # Отправка в Google Sheets
-        if values:
-            try:
-                sheets_service.spreadsheets().values().append(
-                    spreadsheetId=SHEET_ID,
-                    range="StaffAnalysis!A:I",
-                    valueInputOption="USER_ENTERED",
-                    body={"values": values}
-                ).execute()
-                await ctx.send("✅ Данные о кадровых сообщениях сохранены в Google Sheets!")
-            except HttpError as e:
-                if "Unable to parse range" in str(e):
-                    await ctx.send("❌ Ошибка записи в таблицу: отсутствуют необходимые листы. Бот пытается создать их автоматически...")
-                    ensure_sheets_exist(SHEET_ID)
-                    sheets_service.spreadsheets().values().append(
-                        spreadsheetId=SHEET_ID,
-                        range="StaffAnalysis!A:I",
-                        valueInputOption="USER_ENTERED",
-                        body={"values": values}
-                    ).execute()
-                    await ctx.send("✅ Листы созданы и данные сохранены!")
-                else:
-                    error_content = json.loads(e.content.decode('utf-8')) if hasattr(e, 'content') else str(e)
-                    print(f"Google Sheets API error: {error_content}")
-                    print(f"Request details: {e.uri}")
-                    await ctx.send(f"⚠️ Ошибка при сохранении в Google Sheets: {str(e)}")
+            await ctx.send(f"⚠️ Google Sheets недоступен ({sheets_writer.unavailable_reason}): отчёты не сохранены в таблицу")
     
     except ValueError as e:
         await ctx.send(f"❌ Ошибка формата даты: {str(e)}")
     except discord.Forbidden:
-        await ctx.send(f"❌ У бота нет прав на чтение канала {channel.mention}. Проверьте разрешения в настройках сервера.")
+        await ctx.send(f"❌ У бота нет прав на чтение {target_mention}. Проверьте разрешения в настройках сервера.")
     except Exception as e:
         await ctx.send(f"⚠️ Критическая ошибка: `{str(e)}`")
-        print(f"\n🔥 НЕОБРАБОТАННОЕ ИСКЛЮЧЕНИЕ В КОМАНДЕ staff_analysis: {e}")
+        print(f"\n🔥 НЕОБРАБОТАННОЕ ИСКЛЮЧЕНИЕ В КОМАНДЕ report: {e}")
+
+# === ПЛАНОВЫЕ ОТЧЁТЫ ===
+async def run_scheduled_report(entry, moment):
+    """Считает плановый отчёт за его период, отправляет результаты в канал и пишет их в Google Sheets"""
+    guild = bot.get_guild(entry.guild_id)
+    post_channel = guild.get_channel(entry.post_channel_id) if guild else None
+    if post_channel is None:
+        print(f"⚠️ Плановый отчёт {entry.name}: сервер или канал для результатов недоступен")
+        return
+    target = guild.get_channel(entry.target) if isinstance(entry.target, int) else entry.target
+    if target is None:
+        await post_channel.send(f"❌ Плановый отчёт `{entry.name}`: канал для анализа удалён")
+        return
+    try:
+        channels, channel_label = resolve_channels(guild, target)
+    except LookupError as e:
+        await post_channel.send(f"❌ Плановый отчёт `{entry.name}`: {str(e)}")
+        return
+    
+    first_day, last_day = period_dates(entry.period, moment)
+    start_date = first_day.strftime("%d-%m-%Y")
+    end_date = last_day.strftime("%d-%m-%Y")
+    start_dt = parse_date(start_date)
+    end_dt = parse_date(end_date) + datetime.timedelta(days=1)
+    target_mention = describe_target(channels, channel_label)
+    
+    handle = perf.metrics.begin_command("schedule")
+    failed = False
+    try:
+        async with report_jobs.run(post_channel, f"🗓️ {entry.name}: {start_date} - {end_date}", author=guild.me):
+            await post_channel.send(
+                f"🗓️ **Плановый отчёт `{entry.name}`** ({', '.join(entry.reports)}) в {target_mention} за `{start_date} - {end_date}`"
+            )
+            # Результаты сохраняются в кэш: запрос за тот же период не будет просматривать историю заново
+            reports = await scan_reports(post_channel, channels, start_dt, end_dt, entry.reports)
+            
+            sheet_batch = []
+            for name in entry.reports:
+                stats = reports[name]
+                await send_report_lines(post_channel, format_report(stats, start_date, end_date, channel_label))
+                chunks = stats.sheet_chunks(guild.name, channel_label, start_date, end_date, sanitize_value)
+                first_chunk = next(chunks, None)
+                if first_chunk is not None:
+                    sheet_batch.append((stats, itertools.chain([first_chunk], chunks)))
+            
+            # Строки всех отчётов ставятся в очередь подряд и уходят в таблицу одной пачкой
+            for i, (stats, chunks) in enumerate(sheet_batch, 1):
+                queued = await enqueue_report_rows(
+                    stats,
+                    chunks,
+                    destination=post_channel,
+                    success_message=f"✅ Плановый отчёт `{entry.name}` сохранён в Google Sheets" if i == len(sheet_batch) else None
+                )
+                if not queued:
+                    break
+    except discord.Forbidden:
+        failed = True
+        await post_channel.send(f"❌ Плановый отчёт `{entry.name}`: у бота нет прав на чтение {target_mention}")
+    except Exception as e:
+        failed = True
+        await post_channel.send(f"⚠️ Ошибка планового отчёта `{entry.name}`: `{str(e)}`")
+        print(f"\n🔥 ОШИБКА ПЛАНОВОГО ОТЧЁТА {entry.name}: {e}")
     finally:
-        gc.collect()
+        perf.metrics.end_command(handle, failed)
+
+report_scheduler = ReportScheduler(SCHEDULE_PATH, TIMEZONE, run_scheduled_report)
+
+def schedule_lines(guild):
+    """Строки списка плановых отчётов сервера"""
+    entries = report_scheduler.for_guild(guild.id)
+    lines = [f"**🗓️ Плановые отчёты** (часовой пояс `{TIMEZONE_NAME}`)"]
+    if not entries:
+        lines.append(f"ℹ️ Нет плановых отчётов. Добавить: `{COMMAND_PREFIX}schedule add <имя> \"0 4 * * 1\" #канал week activity,staff`")
+        return lines
+    for entry in entries:
+        target = guild.get_channel(entry.target) if isinstance(entry.target, int) else None
+        target_text = target.mention if target is not None else f"`{entry.target}`"
+        post_channel = guild.get_channel(entry.post_channel_id)
+        next_run = entry.next_run(TIMEZONE)
+        lines.append(
+            f"**{entry.name}** `{entry.cron}` — {', '.join(entry.reports)} по {target_text}, "
+            f"период: {PERIODS[entry.period]}, результаты в {post_channel.mention if post_channel else 'удалённый канал'}, "
+            f"следующий запуск: {next_run.strftime('%d-%m-%Y %H:%M') if next_run else 'никогда'}"
+        )
+    return lines
+
+# === КОМАНДА: РАСПИСАНИЕ ПЛАНОВЫХ ОТЧЁТОВ ===
+@bot.command(name="schedule")
+@has_senior_role()
+async def schedule_cmd(ctx, action: str = "list", name: str = None, cron: str = None,
+                       channel: typing.Union[discord.TextChannel, str] = None, period: str = "week", kinds: str = None):
+    """
+    Плановые отчёты: list, add, remove, run.
+    Пример: !schedule add weekly "0 4 * * 1" #personnel week activity,staff
+    """
+    action = action.lower()
+    if action == "list":
+        await send_report_lines(ctx, schedule_lines(ctx.guild))
+        return
+    
+    if action in ("remove", "run"):
+        entry = report_scheduler.get(ctx.guild.id, name) if name else None
+        if entry is None:
+            await ctx.send(f"❌ Плановый отчёт `{name}` не найден. Список: `{COMMAND_PREFIX}schedule list`")
+            return
+        if action == "remove":
+            report_scheduler.remove(ctx.guild.id, name)
+            await ctx.send(f"🗑️ Плановый отчёт `{entry.name}` удалён")
+        else:
+            await ctx.send(f"▶️ Запускаю плановый отчёт `{entry.name}` вне расписания")
+            report_scheduler.trigger(entry)
+        return
+    
+    if action != "add":
+        await ctx.send(f"❌ Неизвестное действие `{action}`. Доступные: list, add, remove, run")
+        return
+    if not name or not cron or channel is None:
+        await ctx.send(f"❌ Пример: `{COMMAND_PREFIX}schedule add weekly \"0 4 * * 1\" #канал week activity,staff`")
+        return
+    try:
+        names = parse_report_names(kinds)
+        channels, channel_label = resolve_channels(ctx.guild, channel)
+        entry = ScheduledReport(
+            name.lower(), ctx.guild.id, ctx.channel.id,
+            channel.id if isinstance(channel, discord.TextChannel) else channel.strip().lstrip("#"),
+            cron, period.lower(), names, created_by=str(ctx.author)
+        )
+    except (ValueError, LookupError) as e:
+        await ctx.send(f"❌ {str(e)}")
+        return
+    report_scheduler.add(entry)
+    next_run = entry.next_run(TIMEZONE)
+    await ctx.send(
+        f"✅ Плановый отчёт `{entry.name}` добавлен: {', '.join(names)} по {describe_target(channels, channel_label)}, "
+        f"период: {PERIODS[entry.period]}. Результаты будут приходить в этот канал. "
+        f"Следующий запуск: {next_run.strftime('%d-%m-%Y %H:%M') if next_run else 'никогда'} ({TIMEZONE_NAME})"
+    )
+
+# === КОМАНДЫ: СПИСОК И ОТМЕНА ЗАДАЧ ОТЧЁТОВ ===
+@bot.command(name="jobs")
+@has_senior_role()
+async def jobs_cmd(ctx):
+    """Отчёты, которые выполняются или ждут очереди на этом сервере"""
+    guild_jobs = report_jobs.for_guild(ctx.guild.id)
+    if not guild_jobs:
+        await ctx.send("ℹ️ Нет выполняемых отчётов")
+        return
+    lines = [f"**📋 Задачи отчётов** (одновременно на сервере: {report_jobs.per_guild})"]
+    for job in guild_jobs:
+        lines.append(f"**#{job.id}** `{job.description}` — {job.author.display_name}: {job.status_text()}")
+    lines.append(f"\nОтменить: `{COMMAND_PREFIX}cancel <номер>`")
+    await send_report_lines(ctx, lines)
+
+@bot.command(name="cancel")
+@has_senior_role()
+async def cancel_cmd(ctx, job_id: int):
+    """Отменяет отчёт по номеру из !jobs. Пример: !cancel 3"""
+    job = report_jobs.get(ctx.guild.id, job_id)
+    if job is None:
+        await ctx.send(f"❌ Задача #{job_id} не найдена. Список задач: `{COMMAND_PREFIX}jobs`")
+        return
+    job.cancel(ctx.author)
+    print(f"⛔ Задача #{job.id} ({job.description}) отменена пользователем {ctx.author}")
+    await ctx.send(f"⛔ Задача #{job.id} отменяется")
+
+# === КОМАНДА: ЗАМЕРЫ ПРОИЗВОДИТЕЛЬНОСТИ ===
+# Порядок этапов в отчёте !perf
+PERF_PHASES = ["total", "history", "history_page", "aggregate", "format", "discord_send", "sheets_write"]
+PERF_COUNTERS = {
+    "messages_scanned": "просмотрено сообщений",
+    "discord_messages_fetched": "загружено из Discord",
+    "discord_history_pages": "страниц истории",
+    "discord_messages_sent": "отправлено сообщений",
+    "discord_bytes_sent": "отправлено байт",
+    "sheets_rows": "записано строк в Sheets",
+    "errors": "ошибок",
+}
+
+def perf_report_lines(snapshot, writer_stats, cache_stats=None):
+    """Строки отчёта !perf"""
+    since = datetime.datetime.fromtimestamp(perf.metrics.started, datetime.timezone.utc).strftime("%d-%m-%Y %H:%M UTC")
+    lines = [f"**⏱️ Производительность команд** (с {since})"]
+    for command in sorted(snapshot):
+        entry = snapshot[command]
+        runs = entry["phases"].get("total", {}).get("count", 0)
+        header = f"\n**{command}**"
+        if runs:
+            header += f" — запусков: {runs}"
+        if entry["in_flight"]:
+            header += f", выполняется сейчас: {entry['in_flight']}"
+        lines.append(header)
+        phases = sorted(entry["phases"].items(), key=lambda item: PERF_PHASES.index(item[0]) if item[0] in PERF_PHASES else len(PERF_PHASES))
+        for phase, stats in phases:
+            lines.append(
+                f"`{phase:<13}` n={stats['count']} avg {stats['avg']:.3f}с p50 {stats['p50']:.3f}с "
+                f"p95 {stats['p95']:.3f}с max {stats['max']:.3f}с"
+            )
+        counters = entry["counters"]
+        for name, value in counters.items():
+            lines.append(f"→ {PERF_COUNTERS.get(name, name)}: {value}")
+        # Скорость подсчёта: сообщений в секунду на этапе aggregate
+        aggregate = entry["phases"].get("aggregate")
+        if counters.get("messages_scanned") and aggregate and aggregate["total"] > 0:
+            lines.append(f"→ скорость подсчёта: {counters['messages_scanned'] / aggregate['total']:.0f} сообщ/сек")
+    
+    lines.append(f"\n**📤 Google Sheets:** в спуле {writer_stats['queued']} строк, записано {writer_stats['rows_written']}")
+    transport = writer_stats["transport"]
+    if transport is None:
+        lines.append(f"→ не подключён ({sheets_writer.unavailable_reason})")
+    else:
+        lines.append(
+            f"→ запросов: {transport['requests']}, повторов: {transport['retries']}, ошибок: {transport['failures']}, "
+            f"отправлено {transport['bytes_sent'] / 1024:.0f} КБ"
+        )
+        lines.append(f"→ ожидание квоты: {transport['throttle_wait_seconds']:.1f}с, паузы повторов: {transport['backoff_wait_seconds']:.1f}с")
+        for operation, histogram in sorted(transport["latency"].items()):
+            if histogram["count"]:
+                lines.append(f"`{operation:<13}` n={histogram['count']} avg {histogram['sum'] / histogram['count']:.3f}с")
+    
+    if cache_stats is not None:
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        hit_rate = f", попаданий {cache_stats['hits'] / lookups:.0%}" if lookups else ""
+        lines.append(
+            f"\n**🗃️ Кэш отчётов:** {cache_stats['entries']}/{cache_stats['max_entries']} результатов, "
+            f"{cache_stats['weight']}/{cache_stats['max_weight']} записей{hit_rate}"
+        )
+        lines.append(
+            f"→ попаданий: {cache_stats['hits']}, промахов: {cache_stats['misses']}, устарело: {cache_stats['expired']}, "
+            f"вытеснено: {cache_stats['evictions']}, не сохранено (слишком большие): {cache_stats['too_heavy']}, "
+            f"дождались идущего подсчёта: {cache_stats['shared']}"
+        )
+    return lines
+
+@bot.command(name="perf")
+@has_senior_role()
+async def perf_cmd(ctx, action: str = None):
+    """Длительность этапов команд и счётчики. `!perf reset` — сбросить замеры"""
+    if action == "reset":
+        perf.metrics.reset()
+        await ctx.send("🔄 Замеры производительности сброшены")
+        return
+    writer_stats = await asyncio.to_thread(sheets_writer.stats)
+    await send_report_lines(ctx, perf_report_lines(perf.metrics.snapshot(), writer_stats, report_cache.stats()))
+
+async def render_metrics():
+    """Текст для эндпоинта /metrics (счётчики спула читаются из SQLite в потоке, не блокируя бота)"""
+    writer_stats = await asyncio.to_thread(sheets_writer.stats)
+    return perf.render_prometheus(perf.metrics, writer_stats, report_cache.stats())
 
 # === КОМАНДА: СПРАВКА ===
 @bot.command(name="help")
@@ -955,15 +1301,21 @@ async def help_cmd(ctx):
         "→ Считает ТОЛЬКО изображения (игнорирует документы, видео, аудио)\n"
         "→ Показывает ТОП-10 пользователей по сообщениям и изображениям с их именами\n\n"
         
-        f"**`{COMMAND_PREFIX}images #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ] [лимит]`**\n"
+        f"**`{COMMAND_PREFIX}images #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ]`**\n"
         "→ Анализ сообщений с изображениями\n"
-        "→ Лимит по умолчанию: 500 сообщений\n"
+        "→ Просматриваются все сообщения периода, без ограничения по количеству\n"
+        "→ Прежний аргумент limit после дат больше не нужен и игнорируется\n"
         "→ Изображения в одном сообщении группируются под одной ссылкой с номерами\n"
         "→ Отображается имя пользователя для каждого сообщения\n\n"
         
-        f"**`{COMMAND_PREFIX}export_images #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ]`**\n"
-        "→ Экспорт полного отчёта по изображениям в CSV файл и сохранение в Google Sheets\n"
-        "→ В CSV включаются имена авторов изображений\n\n"
+        f"**`{COMMAND_PREFIX}export_images #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ] [csv|jsonl|parquet|arrow]`**\n"
+        "→ Экспорт полного отчёта по изображениям в файл и сохранение в Google Sheets\n"
+        "→ jsonl/parquet/arrow: id, время в эпохе и списки ссылок вместо строк — удобно для pandas\n"
+        "→ В CSV включаются имена авторов изображений\n"
+        "→ Большой экспорт сжимается в zip и делится на части по лимиту размера файла Discord\n\n"
+        
+        f"**`{COMMAND_PREFIX}export_activity #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ] [jsonl|parquet|arrow|csv]`**\n"
+        "→ Выгрузка всех сообщений периода (одна строка на сообщение), по умолчанию jsonl\n\n"
         
         f"**`{COMMAND_PREFIX}staff_analysis #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ]`**\n"
         "→ Анализ сообщений о кадровых изменениях (принят/уволен/повышен)\n"
@@ -971,8 +1323,26 @@ async def help_cmd(ctx):
         "→ Отображение ТОП-10 активных авторов по имени\n"
         "→ Сохранение данных в Google Sheets\n\n"
         
+        f"**`{COMMAND_PREFIX}report #канал ДД-ММ-ГГГГ [ДД-ММ-ГГГГ] [activity,images,staff]`**\n"
+        "→ Несколько отчётов за один просмотр истории канала (по умолчанию все)\n\n"
+        
+        f"**`{COMMAND_PREFIX}schedule add <имя> \"0 4 * * 1\" #канал week activity,staff`**\n"
+        f"→ Плановый отчёт по расписанию cron (часовой пояс `{TIMEZONE_NAME}`) за прошлый день, неделю или месяц; "
+        f"`{COMMAND_PREFIX}schedule list`, `remove <имя>`, `run <имя>`\n\n"
+        
+        f"**`{COMMAND_PREFIX}jobs`** и **`{COMMAND_PREFIX}cancel <номер>`**\n"
+        "→ Выполняемые отчёты сервера (ход, скорость, оставшееся время) и отмена долгого отчёта\n\n"
+        
+        f"**`{COMMAND_PREFIX}perf [reset]`**\n"
+        "→ Время этапов команд (загрузка истории, подсчёт, отправка, запись в Sheets) и счётчики\n\n"
+        
+        "**📁 Группы каналов:**\n"
+        "→ В `activity`, `images`, `staff_analysis` и `report` вместо `#канал` можно указать имя группы из `config.json`\n"
+        f"→ Доступные группы: {', '.join(f'`{group}`' for group in PREDEFINED_GROUPS) or 'не настроены'}\n"
+        f"→ Повтор отчёта за тот же период берётся из кэша; `{FRESH_FLAG}` в конце команды — пересчитать\n\n"
+        
         "**🔐 Безопасность:**\n"
-        f"→ Все команды доступны **только пользователям с ролью `{SENIOR_ROLE_NAME}`**\n"
+        f"→ Все команды доступны **только пользователям с ролью {role_names_text(ctx.guild.id if ctx.guild else None)}**\n"
         "→ Если роль не найдена на сервере, свяжитесь с администратором\n\n"
         
         "**🖼️ Важно:**\n"
@@ -990,20 +1360,53 @@ async def help_cmd(ctx):
         
         "**📋 Требования для работы:**\n"
         "• У бота должны быть права: `Просмотр канала`, `Чтение истории сообщений`, `Отправка сообщений`\n"
-        f"• У пользователя должна быть роль `{SENIOR_ROLE_NAME}` для доступа к командам\n"
+        f"• У пользователя должна быть роль {role_names_text(ctx.guild.id if ctx.guild else None)} для доступа к командам\n"
         "• Бот автоматически создаст необходимые листы в Google Таблице при первом запуске"
     )
-    await ctx.send(help_text)
+    # Справка длиннее лимита обычного сообщения: отправляется как отчёт
+    await send_report_lines(ctx, help_text.split("\n"))
 
 # === СИСТЕМНЫЕ СОБЫТИЯ ===
+@bot.event
+async def setup_hook():
+    # Запускаем фоновую запись в Google Sheets и в локальный индекс до подключения к Discord
+    sheets_writer.start()
+    live_ingestor.start()
+    if METRICS_PORT:
+        try:
+            await perf.start_metrics_server(METRICS_HOST, int(METRICS_PORT), render_metrics)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось запустить эндпоинт метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+# === ЗАМЕРЫ КОМАНД ДЛЯ !perf ===
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.perf_handle = perf.metrics.begin_command(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    handle = getattr(ctx, "perf_handle", None)
+    if handle is not None:
+        perf.metrics.end_command(handle, failed=ctx.command_failed)
+
 @bot.event
 async def on_ready():
+    global sheets_init_task
+    live_ingestor.begin_live()
+    # Google Sheets подключается в фоне, только после того как бот готов отвечать в Discord
+    first_ready = sheets_init_task is None
+    if first_ready:
+        sheets_init_task = asyncio.create_task(init_google_sheets(), name="sheets-init")
+        # Плановые отчёты запускаются, когда бот уже видит серверы
+        report_scheduler.start()
     print("\n" + "="*60)
     print(f"✅ УСПЕШНЫЙ ЗАПУСК: {bot.user} (версия {BOT_VERSION}) готов к работе!")
-    print(f"🔐 Роль для доступа: '{SENIOR_ROLE_NAME}'")
+    print(f"🔐 Роли для доступа: {role_names_text()}")
     print(f"🌐 Серверов в работе: {len(bot.guilds)}")
     print(f"⌨️ Префикс команд: '{COMMAND_PREFIX}'")
-    print(f"📊 Google Sheet ID: {SHEET_ID[:10]}...")
+    print(f"📊 Google Sheet ID: {SHEET_ID[:10] + '...' if SHEET_ID else 'не задан'}")
+    if first_ready:
+        print(f"⏱️ Время до готовности: {time.perf_counter() - STARTED_AT:.2f} сек")
     print("="*60)
     
     # Отображаем список серверов для отладки
@@ -1019,10 +1422,51 @@ async def on_ready():
     else:
         print("\n⚠️ Бот не добавлен ни на один сервер! Добавьте его через OAuth2 URL")
 
+@bot.event
+async def on_resumed():
+    live_ingestor.begin_live()
+
+@bot.event
+async def on_disconnect():
+    await live_ingestor.end_live()
+
+# === ПРИЁМ СООБЩЕНИЙ В ЛОКАЛЬНЫЙ ИНДЕКС ===
+@bot.event
+async def on_message(message):
+    if message.guild is not None:
+        live_ingestor.add_message(message)
+    await bot.process_commands(message)
+
+@bot.event
+async def on_raw_message_edit(payload):
+    live_ingestor.add_edit(payload.channel_id, payload.message_id, payload.data)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    live_ingestor.add_delete(payload.channel_id, payload.message_id)
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    for message_id in payload.message_ids:
+        live_ingestor.add_delete(payload.channel_id, message_id)
+
 @bot.event
 async def on_guild_join(guild):
     print(f"\n🎉 БОТ ДОБАВЛЕН НА НОВЫЙ СЕРВЕР: {guild.name} (ID: {guild.id})")
-    print(f"  🔐 Требуемая роль для доступа: '{SENIOR_ROLE_NAME}'")
+    print(f"  🔐 Требуемая роль для доступа: {role_names_text(guild.id)}")
+
+# === СБРОС КЭША РОЛЕЙ ДОСТУПА ===
+@bot.event
+async def on_guild_role_create(role):
+    role_access.invalidate(role.guild.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    role_access.invalidate(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    role_access.invalidate(role.guild.id)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -1038,6 +1482,7 @@ async def on_command_error(ctx, error):
 # === ЗАПУСК БОТА ===
 if __name__ == "__main__":
     try:
+        check_env_vars()
         print("\n⏳ ЗАПУСК БОТА...")
         bot.run(DISCORD_TOKEN)
     except discord.LoginFailure:
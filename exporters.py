@@ -0,0 +1,420 @@
+import csv
+import gzip
+import json
+import tempfile
+import zipfile
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow нужен только для форматов parquet и arrow
+    pyarrow = None
+
+from reports import ReportAccumulator, message_link, SHEETS_CHUNK_ROWS
+
+# Сколько байт части держать в памяти, прежде чем сбросить её во временный файл на диске
+SPOOL_MEMORY = 4 * 1024 * 1024
+# Запас до лимита размера файла: сжатые данные выходят из компрессора блоками
+MAX_SIZE_MARGIN = 1024 * 1024
+# Форматы файлов экспорта
+FORMATS = ("csv", "jsonl", "parquet", "arrow")
+# Режимы сжатия csv и jsonl: auto — файл как есть, а если не помещается в лимит, то zip.
+# parquet и arrow сжимаются внутри файла (zstd), поэтому для них режим не используется
+COMPRESSIONS = ("auto", "none", "gzip", "zip")
+# Сколько строк собирать в одну группу строк parquet / пакет arrow
+ROW_GROUP_SIZE = 10_000
+
+
+def arrow_type(name):
+    """Тип колонки из схемы экспорта → тип pyarrow"""
+    if name.startswith("list<"):
+        return pyarrow.list_(arrow_type(name[5:-1]))
+    if name == "timestamp":
+        return pyarrow.timestamp("ms", tz="UTC")
+    return {
+        "int32": pyarrow.int32(),
+        "int64": pyarrow.int64(),
+        "bool": pyarrow.bool_(),
+        "string": pyarrow.string(),
+    }[name]
+
+
+# === ЧАСТИ ЭКСПОРТА ===
+class SpooledPart:
+    """
+    Файл одной части экспорта во временном файле (SpooledTemporaryFile):
+    пока он небольшой, он в памяти, дальше — на диске. Данные пишутся сразу в сжатый поток,
+    поэтому размер части известен во время записи.
+    """
+    extension = None
+
+    def __init__(self, name, compression):
+        self.name = name
+        self.compression = compression
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+        self._zip = None
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(filename=self.inner_filename, mode="wb", fileobj=self.buffer)
+        elif compression == "zip":
+            self._zip = zipfile.ZipFile(self.buffer, "w", zipfile.ZIP_DEFLATED)
+            self._stream = self._zip.open(self.inner_filename, "w", force_zip64=True)
+        else:
+            self._stream = self.buffer
+        self.rows = 0
+
+    @property
+    def inner_filename(self):
+        return f"{self.name}.{self.extension}"
+
+    @property
+    def filename(self):
+        if self.compression == "gzip":
+            return self.inner_filename + ".gz"
+        if self.compression == "zip":
+            return f"{self.name}.zip"
+        return self.inner_filename
+
+    def write_bytes(self, data):
+        self._stream.write(data)
+
+    def size(self):
+        """Сколько байт части уже записано (без данных, ещё не вышедших из компрессора)"""
+        return self.buffer.tell()
+
+    def finish(self):
+        """Закрывает сжатый поток и возвращает файл, готовый к отправке"""
+        if self._stream is not self.buffer:
+            self._stream.close()
+        if self._zip is not None:
+            self._zip.close()
+        self.buffer.seek(0)
+        return self.buffer
+
+    def seal(self):
+        """Часть заполнена: переносим её из памяти во временный файл на диске"""
+        self.buffer.rollover()
+
+    def close(self):
+        self.buffer.close()
+
+
+class CsvPart(SpooledPart):
+    """Часть CSV: строки — списки значений, первой строкой идёт заголовок"""
+    extension = "csv"
+
+    def __init__(self, name, compression, schema, write_header=True):
+        super().__init__(name, compression)
+        self.writer = csv.writer(self)
+        if write_header:
+            self.writer.writerow([column for column, _ in schema])
+
+    def write(self, text):
+        """Вызывается csv.writer"""
+        self.write_bytes(text.encode("utf-8"))
+
+    def add(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+
+
+class JsonlPart(SpooledPart):
+    """Часть JSONL: одна запись (dict) на строку, удобно читать потоково"""
+    extension = "jsonl"
+
+    def __init__(self, name, compression, schema, write_header=True):
+        super().__init__(name, compression)
+
+    def add(self, record):
+        self.write_bytes(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.rows += 1
+
+
+class ArrowPart(SpooledPart):
+    """
+    Часть parquet или arrow (IPC) с типизированными колонками.
+    Записи копятся пакетами по ROW_GROUP_SIZE строк, каждый пакет сразу пишется в файл.
+    """
+
+    def __init__(self, name, kind, schema):
+        self.extension = kind
+        super().__init__(name, "none")
+        self.kind = kind
+        self.columns = [column for column, _ in schema]
+        self.timestamps = {column for column, type_name in schema if type_name == "timestamp"}
+        self.schema = pyarrow.schema([(column, arrow_type(type_name)) for column, type_name in schema])
+        if kind == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(self.buffer, self.schema, compression="zstd")
+        else:
+            self._writer = pyarrow.ipc.new_file(self.buffer, self.schema, options=pyarrow.ipc.IpcWriteOptions(compression="zstd"))
+        self._pending = {column: [] for column in self.columns}
+        self._pending_rows = 0
+
+    def add(self, record):
+        for column in self.columns:
+            value = record[column]
+            if column in self.timestamps:
+                # Эпоха в секундах → миллисекунды
+                value = round(value * 1000)
+            self._pending[column].append(value)
+        self._pending_rows += 1
+        self.rows += 1
+        if self._pending_rows >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending_rows:
+            return
+        batch = pyarrow.record_batch(
+            [pyarrow.array(self._pending[column], self.schema.field(column).type) for column in self.columns],
+            schema=self.schema
+        )
+        if self.kind == "parquet":
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+        self._pending = {column: [] for column in self.columns}
+        self._pending_rows = 0
+
+    def finish(self):
+        self._flush()
+        self._writer.close()
+        self.buffer.seek(0)
+        return self.buffer
+
+
+# === ЭКСПОРТ С РАЗБИВКОЙ НА ЧАСТИ ===
+class FileExport:
+    """
+    Потоковый экспорт строк в файлы одного формата.
+
+    Строки пишутся во временный файл по мере поступления, в памяти держится только
+    текущий буфер. Когда часть приближается к лимиту размера вложения Discord, в режиме
+    auto она пересжимается в zip, а если не помещается и так — начинается следующая
+    часть (images_..._part2.csv и т.д.).
+
+    schema — колонки [(имя, тип)]: для csv это заголовок, и строки — списки значений;
+    для остальных форматов строки — словари {колонка: значение}.
+    """
+
+    def __init__(self, basename, schema, size_limit, fmt="csv", compression="auto"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Неизвестный формат '{fmt}'. Доступные: {', '.join(FORMATS)}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Неизвестный режим сжатия '{compression}'. Доступные: {', '.join(COMPRESSIONS)}")
+        if fmt in ("parquet", "arrow") and pyarrow is None:
+            raise ValueError(f"Для формата {fmt} нужен пакет pyarrow: `pip install pyarrow`")
+        self.basename = basename
+        self.schema = schema
+        self.size_limit = size_limit
+        self.threshold = size_limit - min(MAX_SIZE_MARGIN, size_limit // 10)
+        self.format = fmt
+        self.compression = compression
+        self.parts = []
+        self.rows = 0
+        self._current = None
+        self._zip_parts = compression == "zip"
+
+    def _part_name(self, number):
+        if number == 1:
+            return self.basename
+        return f"{self.basename}_part{number}"
+
+    def _make_part(self, name, compression, write_header=True):
+        if self.format == "csv":
+            return CsvPart(name, compression, self.schema, write_header)
+        if self.format == "jsonl":
+            return JsonlPart(name, compression, self.schema, write_header)
+        return ArrowPart(name, self.format, self.schema)
+
+    def _new_part(self):
+        if self._zip_parts:
+            compression = "zip"
+        else:
+            compression = "none" if self.compression == "auto" else self.compression
+        part = self._make_part(self._part_name(len(self.parts) + 1), compression)
+        self.parts.append(part)
+        self._current = part
+        return part
+
+    def _compress_current(self):
+        """Пересжимает текущую несжатую часть в zip (режим auto)"""
+        plain = self._current
+        plain_file = plain.finish()
+        compressed = self._make_part(plain.name, "zip", write_header=False)
+        while True:
+            chunk = plain_file.read(1024 * 1024)
+            if not chunk:
+                break
+            compressed.write_bytes(chunk)
+        compressed.rows = plain.rows
+        plain.close()
+        # Раз одна часть не поместилась без сжатия, следующие сразу пишутся в zip
+        self._zip_parts = True
+        self.parts[-1] = compressed
+        self._current = compressed
+
+    def add(self, row):
+        part = self._current or self._new_part()
+        part.add(row)
+        self.rows += 1
+        if part.size() < self.threshold:
+            return
+        if self.compression == "auto" and part.compression == "none" and self.format in ("csv", "jsonl"):
+            self._compress_current()
+            if self._current.size() < self.threshold:
+                return
+        # Часть заполнена: следующие строки пойдут в новую
+        self._current.seal()
+        self._current = None
+
+    def files(self):
+        """Завершает запись и возвращает [(имя файла, файл)] по частям"""
+        if not self.parts:
+            self._new_part()
+        return [(part.filename, part.finish()) for part in self.parts]
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+
+
+# === НАКОПИТЕЛЬ: ПОЛНЫЙ ЭКСПОРТ ИЗОБРАЖЕНИЙ ===
+class ImageExport(ReportAccumulator):
+    """
+    Сообщения с изображениями для !export_images. Не хранит сообщения: строки сразу
+    пишутся в FileExport, а строки для Google Sheets — во временный CSV-файл,
+    который после просмотра читается обратно порциями.
+    """
+    sheet_range = "Images!A:J"
+
+    # Колонки CSV (как раньше: строки для чтения человеком)
+    CSV_SCHEMA = [("Ссылка на сообщение", "string"), ("№ изображений", "string"), ("Автор", "string"), ("Дата", "string")]
+    # Колонки jsonl/parquet/arrow: идентификаторы, время в эпохе, списки вместо строк через запятую
+    SCHEMA = [
+        ("message_id", "int64"),
+        ("channel_id", "int64"),
+        ("guild_id", "int64"),
+        ("author_id", "int64"),
+        ("author_name", "string"),
+        ("created_at", "timestamp"),
+        ("link", "string"),
+        ("image_numbers", "list<int32>"),
+        ("image_urls", "list<string>"),
+    ]
+
+    def __init__(self, file_export, sheet_prefix, sanitize):
+        super().__init__()
+        self.file_export = file_export
+        # Первые колонки строк Google Sheets: сервер, канал, даты
+        self.sheet_prefix = [sanitize(value) for value in sheet_prefix]
+        self.sanitize = sanitize
+        self.sheet_buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY, mode="w+", encoding="utf-8", newline="")
+        self._sheet_writer = csv.writer(self.sheet_buffer)
+        self.total_messages = 0
+        self.total_images = 0
+
+    @classmethod
+    def schema_for(cls, fmt):
+        return cls.CSV_SCHEMA if fmt == "csv" else cls.SCHEMA
+
+    def add(self, message, channel, images):
+        if not images:
+            return
+        link = message_link(channel.guild.id, channel.id, message.id)
+        numbers = list(range(self.total_images + 1, self.total_images + len(images) + 1))
+        image_urls = [attachment.url for attachment in images]
+        numbers_text = ", ".join(str(number) for number in numbers)
+        self.total_messages += 1
+        self.total_images += len(images)
+        if self.file_export.format == "csv":
+            self.file_export.add([
+                link,
+                numbers_text,
+                message.author_name,
+                message.created_at.strftime("%d-%m-%Y %H:%M:%S")
+            ])
+        else:
+            self.file_export.add({
+                "message_id": message.id,
+                "channel_id": channel.id,
+                "guild_id": channel.guild.id,
+                "author_id": message.author_id,
+                "author_name": message.author_name,
+                "created_at": message.created_ts,
+                "link": link,
+                "image_numbers": numbers,
+                "image_urls": image_urls,
+            })
+        self._sheet_writer.writerow([
+            self.sanitize(link),
+            self.sanitize(" | ".join(image_urls)),
+            self.sanitize(numbers_text),
+            self.sanitize(message.author_name)
+        ])
+
+    def sheet_chunks(self, exported_at, chunk_rows=SHEETS_CHUNK_ROWS):
+        """Перебирает строки для листа Images порциями по chunk_rows"""
+        self.sheet_buffer.seek(0)
+        chunk = []
+        for row in csv.reader(self.sheet_buffer):
+            chunk.append(self.sheet_prefix + row + [self.sanitize(exported_at)])
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self):
+        self.sheet_buffer.close()
+        self.file_export.close()
+
+
+# === НАКОПИТЕЛЬ: СЫРЫЕ ДАННЫЕ АКТИВНОСТИ ===
+class ActivityExport(ReportAccumulator):
+    """Одна строка на сообщение (не от бота) для !export_activity"""
+
+    SCHEMA = [
+        ("message_id", "int64"),
+        ("channel_id", "int64"),
+        ("author_id", "int64"),
+        ("author_name", "string"),
+        ("created_at", "timestamp"),
+        ("content_length", "int32"),
+        ("attachments", "int32"),
+        ("images", "int32"),
+        ("has_link", "bool"),
+    ]
+    COLUMNS = [column for column, _ in SCHEMA]
+
+    def __init__(self, file_export):
+        super().__init__()
+        self.file_export = file_export
+        self.total_messages = 0
+
+    @classmethod
+    def schema_for(cls, fmt):
+        return cls.SCHEMA
+
+    def add(self, message, channel, images):
+        self.total_messages += 1
+        csv_format = self.file_export.format == "csv"
+        content = message.content
+        # Значения в порядке SCHEMA; словарь нужен только форматам с именованными колонками
+        record = [
+            message.id,
+            channel.id,
+            message.author_id,
+            message.author_name,
+            message.created_at.strftime("%d-%m-%Y %H:%M:%S") if csv_format else message.created_ts,
+            len(content),
+            len(message.attachments),
+            len(images),
+            "http://" in content or "https://" in content,
+        ]
+        if not csv_format:
+            record = dict(zip(self.COLUMNS, record))
+        self.file_export.add(record)
+
+    def close(self):
+        self.file_export.close()
@@ -0,0 +1,254 @@
+import asyncio
+import datetime
+import logging
+import re
+import time
+
+import discord
+
+import jobs
+import perf
+from message_store import message_to_row, to_timestamp
+
+# Сколько интервалов одного периода загружать одновременно (по умолчанию)
+FETCH_CONCURRENCY = 4
+# На сколько частей максимум делить один недостающий интервал
+MAX_SLICES = 16
+# Короче этого интервал не делится (секунды)
+MIN_SLICE_SECONDS = 6 * 3600
+# Сколько сообщений сохранять в индекс за одну транзакцию
+STORE_BATCH_SIZE = 500
+# Discord отдаёт историю страницами по 100 сообщений
+DISCORD_PAGE_SIZE = 100
+# После скольких успешных страниц без 429 разрешать ещё один параллельный запрос
+RECOVERY_PAGES = 50
+# Сколько раз повторять интервал, если Discord вернул 429 и discord.py не стал ждать сам
+MAX_RATE_LIMIT_RETRIES = 3
+# Запрос страницы истории в логе discord.http: «GET https://discord.com/api/v10/channels/<id>/messages?... responded with 429»
+HISTORY_RATE_LIMIT_RE = re.compile(r"\bGET \S*/channels/\d+/messages(?:\?\S*)? responded with 429\b")
+
+
+def split_range(start_ts, end_ts, max_slices=MAX_SLICES, min_slice=MIN_SLICE_SECONDS):
+    """Делит [start_ts, end_ts) на равные части не короче min_slice секунд"""
+    length = end_ts - start_ts
+    if length <= 0:
+        return []
+    count = max(1, min(max_slices, int(length // min_slice)))
+    step = length / count
+    bounds = [start_ts + step * i for i in range(count)] + [end_ts]
+    return list(zip(bounds, bounds[1:]))
+
+
+# === АДАПТИВНОЕ ОГРАНИЧЕНИЕ ПАРАЛЛЕЛЬНЫХ ЗАГРУЗОК ===
+class AdaptiveConcurrency:
+    """
+    Ограничивает число одновременных загрузок истории.
+    При ответе 429 лимит уменьшается вдвое, после RECOVERY_PAGES успешных страниц
+    подряд — снова растёт на единицу, но не выше исходного.
+    """
+
+    def __init__(self, limit, minimum=1, recovery_pages=RECOVERY_PAGES):
+        self.maximum = max(minimum, limit)
+        self.minimum = minimum
+        self.limit = self.maximum
+        self.recovery_pages = recovery_pages
+        self.active = 0
+        self.rate_limited = 0
+        self._pages_ok = 0
+        self._released = asyncio.Event()
+
+    async def __aenter__(self):
+        while self.active >= self.limit:
+            self._released.clear()
+            await self._released.wait()
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._released.set()
+
+    def on_page(self):
+        """Успешно получена страница истории"""
+        self._pages_ok += 1
+        if self._pages_ok >= self.recovery_pages and self.limit < self.maximum:
+            self._pages_ok = 0
+            self.limit += 1
+            self._released.set()
+
+    def on_rate_limited(self):
+        """Discord ответил 429: уменьшаем число параллельных загрузок"""
+        self.rate_limited += 1
+        self._pages_ok = 0
+        new_limit = max(self.minimum, self.limit // 2)
+        if new_limit < self.limit:
+            print(f"🐢 Discord ограничил частоту запросов (429): параллельных загрузок истории {self.limit} → {new_limit}")
+        self.limit = new_limit
+
+
+class RateLimitListener(logging.Handler):
+    """
+    discord.py сам ждёт и повторяет запрос после 429, сообщая об этом только в лог.
+    Обработчик слушает лог discord.http и передаёт ограничителю только 429 на загрузку
+    истории (GET /channels/{id}/messages): ограничения отправки сообщений, реакций и
+    других маршрутов на загрузку истории не влияют.
+    """
+
+    def __init__(self, concurrency):
+        super().__init__(level=logging.WARNING)
+        self.concurrency = concurrency
+
+    def emit(self, record):
+        try:
+            if HISTORY_RATE_LIMIT_RE.search(record.getMessage()):
+                self.concurrency.on_rate_limited()
+        except Exception:
+            self.handleError(record)
+
+
+# === ЗАГРУЗКА ИСТОРИИ КАНАЛОВ В ЛОКАЛЬНЫЙ ИНДЕКС ===
+class HistoryFetcher:
+    """
+    Догружает из Discord интервалы, которых нет в локальном индексе.
+
+    Каждый недостающий интервал делится на части по времени, и части загружаются
+    параллельно (у каждой свои after/before). Сообщения всех частей сохраняются в общий
+    индекс, а загруженные интервалы отмечаются по отдельности и склеиваются в MessageStore,
+    поэтому отчёты дальше работают с индексом так же, как при последовательной загрузке.
+    Общее число параллельных загрузок по всем каналам ограничено и подстраивается под 429.
+    """
+
+    def __init__(self, store, concurrency=FETCH_CONCURRENCY, max_slices=MAX_SLICES, min_slice=MIN_SLICE_SECONDS):
+        self.store = store
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self.max_slices = max_slices
+        self.min_slice = min_slice
+        # Блокировки по каналам, чтобы два отчёта не загружали один и тот же интервал одновременно
+        self._locks = {}
+        self._listener = RateLimitListener(self.concurrency)
+        logging.getLogger("discord.http").addHandler(self._listener)
+
+    async def sync(self, channel, start_dt, end_dt, limit=None):
+        """
+        Догружает недостающие интервалы периода.
+        Возвращает True, если после загрузки весь период есть в индексе
+        (лимит не сработал и все части загрузились без ошибок).
+        """
+        lock = self._locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            # Будущее время ещё не может быть загружено полностью
+            fetch_started = datetime.datetime.now(datetime.timezone.utc)
+            end_ts = min(to_timestamp(end_dt), to_timestamp(fetch_started))
+            # Сообщения, полученные в реальном времени, учитываются только если бот видит канал
+            can_read = channel.permissions_for(channel.guild.me).read_messages
+            gaps = await asyncio.to_thread(self.store.missing_ranges, channel.id, to_timestamp(start_dt), end_ts, can_read)
+            slices = [part for gap_start, gap_end in gaps for part in split_range(gap_start, gap_end, self.max_slices, self.min_slice)]
+            if not slices:
+                return True
+
+            # Общий лимит сообщений на все части периода
+            budget = {"left": limit}
+            results = await asyncio.gather(
+                *(self._fetch_slice(channel, slice_start, slice_end, budget) for slice_start, slice_end in slices),
+                return_exceptions=True
+            )
+            fetched = 0
+            complete = True
+            for result in results:
+                if isinstance(result, BaseException):
+                    # Нет прав на канал или отмена — ошибка всей команды
+                    if isinstance(result, discord.Forbidden) or not isinstance(result, Exception):
+                        raise result
+                    # Часть периода не загрузилась: отчёт будет построен по остальному и помечен неполным
+                    print(f"⚠️ Канал {channel.name}: не удалось загрузить часть истории: {result}")
+                    complete = False
+                    continue
+                fetched += result[0]
+                complete = complete and result[1]
+            print(f"🗄️ Канал {channel.name}: загружено {fetched} сообщений из Discord ({len(slices)} частей)")
+            return complete
+
+    async def _fetch_slice(self, channel, slice_start, slice_end, budget):
+        """Загружает одну часть периода. Возвращает (сколько загружено, загружена ли полностью)"""
+        # Ход загрузки для сообщения о задаче отчёта (см. jobs.py)
+        jobs.track(("history", channel.id, slice_end), slice_start, slice_end, jobs.HISTORY_WEIGHT)
+        async with self.concurrency:
+            fetched = 0
+            cursor = slice_start
+            retries = 0
+            while True:
+                try:
+                    fetched_now, cursor, complete = await self._fetch_from(channel, cursor, slice_end, budget)
+                    fetched += fetched_now
+                    return fetched, complete
+                except (discord.HTTPException, discord.RateLimited) as e:
+                    # discord.py отдаёт 429 наружу, только если ждать слишком долго
+                    if isinstance(e, discord.HTTPException) and e.status != 429:
+                        raise
+                    retries += 1
+                    if retries > MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    self.concurrency.on_rate_limited()
+                    await asyncio.sleep(getattr(e, "retry_after", 1.0) or 1.0)
+                    # Продолжаем с начала первого ещё не загруженного интервала
+                    gaps = await asyncio.to_thread(self.store.missing_ranges, channel.id, slice_start, slice_end, False)
+                    if not gaps:
+                        return fetched, True
+                    cursor = gaps[0][0]
+
+    async def _fetch_from(self, channel, cursor, slice_end, budget):
+        """
+        Загружает сообщения [cursor, slice_end) от старых к новым.
+        Сохранённое отмечается в индексе даже при ошибке, чтобы повтор продолжил с места остановки.
+        """
+        batch = []
+        fetched = 0
+        complete = False
+        limit = budget["left"]
+        if limit is not None and limit <= 0:
+            return 0, cursor, False
+        page_started = time.perf_counter()
+        try:
+            async for message in channel.history(
+                after=datetime.datetime.fromtimestamp(cursor, datetime.timezone.utc),
+                before=datetime.datetime.fromtimestamp(slice_end, datetime.timezone.utc),
+                limit=limit,
+                oldest_first=True
+            ):
+                batch.append(message_to_row(message))
+                fetched += 1
+                if fetched % DISCORD_PAGE_SIZE == 0:
+                    self.concurrency.on_page()
+                    # Время получения страницы истории (включая ожидание лимитов Discord)
+                    now = time.perf_counter()
+                    perf.observe("history_page", now - page_started)
+                    perf.count("discord_history_pages")
+                    jobs.advance(("history", channel.id, slice_end), batch[-1][0][6], fetched=DISCORD_PAGE_SIZE)
+                    page_started = now
+                if len(batch) >= STORE_BATCH_SIZE:
+                    cursor = await self._save(channel, batch, cursor)
+                    batch = []
+                if budget["left"] is not None:
+                    budget["left"] -= 1
+                    if budget["left"] <= 0:
+                        break
+            else:
+                complete = True
+        finally:
+            perf.count("discord_messages_fetched", fetched)
+            cursor = await self._save(channel, batch, cursor)
+            jobs.advance(("history", channel.id, slice_end), cursor, fetched=fetched % DISCORD_PAGE_SIZE)
+        if complete:
+            await asyncio.to_thread(self.store.mark_fetched, channel.id, cursor, slice_end)
+            cursor = slice_end
+            jobs.done(("history", channel.id, slice_end))
+        return fetched, cursor, complete
+
+    async def _save(self, channel, batch, cursor):
+        """Сохраняет сообщения и отмечает загруженным интервал до последнего из них"""
+        if not batch:
+            return cursor
+        await asyncio.to_thread(self.store.save_messages, batch)
+        last_ts = batch[-1][0][6]
+        await asyncio.to_thread(self.store.mark_fetched, channel.id, cursor, last_ts)
+        return last_ts
@@ -0,0 +1,252 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import time
+
+import discord
+
+# Сколько задач отчётов одного сервера выполняется одновременно (остальные ждут в очереди)
+JOBS_PER_GUILD = 2
+# Как часто обновлять сообщение о ходе задачи (секунды): правки сообщений тоже ограничены Discord
+PROGRESS_INTERVAL = 5.0
+
+# Во сколько раз загрузка интервала из Discord медленнее просмотра того же интервала в индексе
+HISTORY_WEIGHT = 4.0
+
+QUEUED = "queued"
+RUNNING = "running"
+
+# Задача, внутри которой выполняется код (наследуется в gather и asyncio.to_thread)
+_current_job = contextvars.ContextVar("report_job", default=None)
+
+
+def format_duration(seconds):
+    """12 с, 3:05, 1:02:07"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}:{seconds:02d}"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def format_count(value):
+    """12 345 -> «12 345»"""
+    return f"{value:,.0f}".replace(",", " ")
+
+
+# === ЗАДАЧА ОТЧЁТА ===
+class ReportJob:
+    """
+    Одна команда отчёта: очередь, ход выполнения и отмена.
+
+    Ход выполнения считается по времени периода: каждая часть работы (загрузка интервала
+    истории, просмотр канала) регистрируется как отрезок [начало, конец) в секундах UTC
+    и продвигается по времени обработанных сообщений. Доля готовности — пройденная часть
+    всех отрезков с учётом их веса (загрузка из Discord дороже просмотра индекса);
+    по ней оценивается оставшееся время.
+    """
+
+    def __init__(self, job_id, guild_id, author, description):
+        self.id = job_id
+        self.guild_id = guild_id
+        self.author = author
+        self.description = description
+        self.state = QUEUED
+        self.created = time.monotonic()
+        self.started = None
+        self.scanned = 0  # просмотрено сообщений в индексе
+        self.fetched = 0  # загружено сообщений из Discord
+        self.cancelled_by = None
+        self.task = None
+        self.progress_message = None
+        self._spans = {}  # {ключ: [пройдено секунд, длина отрезка, начало, вес]}
+
+    @property
+    def messages(self):
+        return self.scanned + self.fetched
+
+    def track(self, key, start_ts, end_ts, weight=1.0):
+        """Регистрирует часть работы за [start_ts, end_ts)"""
+        self._spans[key] = [0.0, max(0.0, end_ts - start_ts), start_ts, weight]
+
+    def advance(self, key, position_ts, scanned=0, fetched=0):
+        """Часть работы key дошла до position_ts"""
+        self.scanned += scanned
+        self.fetched += fetched
+        span = self._spans.get(key)
+        if span is not None:
+            span[0] = min(span[1], max(span[0], position_ts - span[2]))
+
+    def done(self, key, scanned=0, fetched=0):
+        """Часть работы key завершена"""
+        self.scanned += scanned
+        self.fetched += fetched
+        span = self._spans.get(key)
+        if span is not None:
+            span[0] = span[1]
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def fraction(self):
+        total = sum(span[1] * span[3] for span in self._spans.values())
+        if not total:
+            return None
+        return sum(span[0] * span[3] for span in self._spans.values()) / total
+
+    def eta(self):
+        """Оценка оставшегося времени (секунды) или None, если оценить пока нельзя"""
+        fraction = self.fraction()
+        if not fraction or fraction >= 1.0 or self.elapsed < 1.0:
+            return None
+        return self.elapsed * (1.0 - fraction) / fraction
+
+    def status_text(self):
+        """Ход задачи одной строкой"""
+        if self.state == QUEUED:
+            return f"в очереди {format_duration(time.monotonic() - self.created)}"
+        parts = [f"выполняется {format_duration(self.elapsed)}"]
+        if self.fetched:
+            parts.append(f"загружено из Discord {format_count(self.fetched)}")
+        parts.append(f"просмотрено {format_count(self.scanned)} сообщ.")
+        if self.elapsed >= 1.0 and self.messages:
+            parts.append(f"{format_count(self.messages / self.elapsed)} сообщ./с")
+        fraction = self.fraction()
+        if fraction is not None:
+            parts.append(f"готово {fraction:.0%}")
+        eta = self.eta()
+        if eta is not None:
+            parts.append(f"осталось ≈ {format_duration(eta)}")
+        return ", ".join(parts)
+
+    def cancel(self, by):
+        self.cancelled_by = by
+        if self.task is not None:
+            self.task.cancel()
+
+
+def current():
+    """Задача отчёта, внутри которой выполняется код, или None"""
+    return _current_job.get()
+
+
+def track(key, start_ts, end_ts, weight=1.0):
+    job = _current_job.get()
+    if job is not None:
+        job.track(key, start_ts, end_ts, weight)
+
+
+def advance(key, position_ts, scanned=0, fetched=0):
+    job = _current_job.get()
+    if job is not None:
+        job.advance(key, position_ts, scanned, fetched)
+
+
+def done(key, scanned=0, fetched=0):
+    job = _current_job.get()
+    if job is not None:
+        job.done(key, scanned, fetched)
+
+
+# === ОЧЕРЕДЬ ЗАДАЧ ОТЧЁТОВ ===
+class JobManager:
+    """
+    Ограничивает число одновременных отчётов на сервере и показывает их ход.
+
+    Команда выполняется в своей задаче asyncio, но сначала ждёт свободного места на сервере
+    (очередь FIFO, поэтому офицеры не вытесняют друг друга). Пока она выполняется, одно
+    сообщение о ходе правится не чаще раза в progress_interval секунд и только если текст
+    изменился. !cancel отменяет задачу: выполняемую — на ближайшем await, ожидающую — сразу.
+    """
+
+    def __init__(self, per_guild=JOBS_PER_GUILD, progress_interval=PROGRESS_INTERVAL):
+        self.per_guild = max(1, per_guild)
+        self.progress_interval = progress_interval
+        self.jobs = {}  # {id: ReportJob}
+        self._ids = itertools.count(1)
+        self._slots = {}  # {guild_id: asyncio.Semaphore}
+
+    def for_guild(self, guild_id):
+        """Задачи сервера в порядке постановки"""
+        return [job for job in self.jobs.values() if job.guild_id == guild_id]
+
+    def get(self, guild_id, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.guild_id != guild_id:
+            return None
+        return job
+
+    def _slot(self, guild_id):
+        slot = self._slots.get(guild_id)
+        if slot is None:
+            slot = self._slots[guild_id] = asyncio.Semaphore(self.per_guild)
+        return slot
+
+    @contextlib.asynccontextmanager
+    async def run(self, ctx, description, author=None):
+        """Выполняет блок как задачу отчёта сервера ctx.guild (ctx — контекст команды или канал)"""
+        job = ReportJob(next(self._ids), ctx.guild.id, author or ctx.author, description)
+        job.task = asyncio.current_task()
+        self.jobs[job.id] = job
+        slot = self._slot(job.guild_id)
+        token = _current_job.set(job)
+        updater = None
+        outcome = "❌ завершена с ошибкой"
+        try:
+            if slot.locked():
+                job.progress_message = await self._send(ctx, self._progress_text(job))
+            async with slot:
+                job.state = RUNNING
+                job.started = time.monotonic()
+                updater = asyncio.create_task(self._update_progress(ctx, job), name=f"job-{job.id}-progress")
+                yield job
+            outcome = f"✅ завершена за {format_duration(job.elapsed)}, просмотрено {format_count(job.scanned)} сообщ."
+        except asyncio.CancelledError:
+            if job.cancelled_by is not None:
+                outcome = f"⛔ отменена ({job.cancelled_by.display_name})"
+            else:
+                outcome = "⛔ прервана"
+            raise
+        finally:
+            _current_job.reset(token)
+            self.jobs.pop(job.id, None)
+            if updater is not None:
+                updater.cancel()
+            if job.progress_message is not None:
+                await self._edit(job.progress_message, f"**Задача #{job.id}** {outcome}")
+
+    def _progress_text(self, job):
+        return f"⏳ **Задача #{job.id}** `{job.description}`: {job.status_text()}. Отменить: `!cancel {job.id}`"
+
+    async def _update_progress(self, ctx, job):
+        """Правит сообщение о ходе задачи не чаще раза в progress_interval секунд"""
+        last_text = None
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            text = self._progress_text(job)
+            if text == last_text:
+                continue
+            if job.progress_message is None:
+                job.progress_message = await self._send(ctx, text)
+            else:
+                await self._edit(job.progress_message, text)
+            last_text = text
+
+    @staticmethod
+    async def _send(ctx, text):
+        try:
+            return await ctx.send(text)
+        except discord.HTTPException:
+            return None
+
+    @staticmethod
+    async def _edit(message, text):
+        try:
+            await message.edit(content=text)
+        except discord.HTTPException as e:
+            print(f"⚠️ Не удалось обновить сообщение о ходе задачи: {e}")
@@ -0,0 +1,696 @@
+import asyncio
+import datetime
+import sqlite3
+import threading
+
+# Сколько сообщений читать из базы за один запрос
+PAGE_SIZE = 500
+
+# Общий пустой список вложений: у большинства сообщений вложений нет
+NO_ATTACHMENTS = ()
+
+# Длина суток в секундах: сводки считаются по суткам UTC
+DAY_SECONDS = 86400
+
+# Версия формата сводок: при изменении сводки пересчитываются из сообщений
+ROLLUP_VERSION = 2
+# Версия таблицы имён авторов: с версии 3 имя хранится отдельно для каждого сервера
+AUTHORS_VERSION = 3
+# Версия базы (PRAGMA user_version)
+STORE_VERSION = max(ROLLUP_VERSION, AUTHORS_VERSION)
+
+# Та же проверка, что is_image в bot.py: image/* или application/octet-stream
+IMAGE_CONDITION = "(lower(a.content_type) LIKE 'image/%' OR lower(a.content_type) = 'application/octet-stream')"
+
+# Последнее известное отображаемое имя автора на сервере (ник у каждого сервера свой; 0 — вне сервера)
+AUTHORS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    guild_id  INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    name      TEXT    NOT NULL,
+    PRIMARY KEY (guild_id, author_id)
+) WITHOUT ROWID;
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id  INTEGER NOT NULL,
+    message_id  INTEGER NOT NULL,
+    guild_id    INTEGER,
+    author_id   INTEGER NOT NULL,
+    author_name TEXT    NOT NULL,
+    is_bot      INTEGER NOT NULL,
+    created_at  REAL    NOT NULL,
+    content     TEXT    NOT NULL,
+    PRIMARY KEY (channel_id, message_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_messages_channel_created
+    ON messages (channel_id, created_at);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    channel_id   INTEGER NOT NULL,
+    message_id   INTEGER NOT NULL,
+    position     INTEGER NOT NULL,
+    url          TEXT    NOT NULL,
+    content_type TEXT,
+    PRIMARY KEY (channel_id, message_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fetched_ranges (
+    channel_id INTEGER NOT NULL,
+    start_ts   REAL    NOT NULL,
+    end_ts     REAL    NOT NULL,
+    PRIMARY KEY (channel_id, start_ts)
+) WITHOUT ROWID;
+
+-- Интервалы, когда бот был подключён к Discord и получал сообщения всех каналов в реальном времени
+CREATE TABLE IF NOT EXISTS live_ranges (
+    start_ts REAL NOT NULL PRIMARY KEY,
+    end_ts   REAL NOT NULL
+);
+
+-- Сводка по каналу за сутки UTC (без сообщений ботов)
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    channel_id INTEGER NOT NULL,
+    day        INTEGER NOT NULL,
+    guild_id   INTEGER,
+    messages   INTEGER NOT NULL,
+    images     INTEGER NOT NULL,
+    links      INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, day)
+) WITHOUT ROWID;
+
+-- Сводка по каждому автору канала за сутки UTC: из неё считаются ТОП и уникальные пользователи
+CREATE TABLE IF NOT EXISTS daily_user_rollups (
+    channel_id INTEGER NOT NULL,
+    day        INTEGER NOT NULL,
+    author_id  INTEGER NOT NULL,
+    messages   INTEGER NOT NULL,
+    images     INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, day, author_id)
+) WITHOUT ROWID;
+""" + AUTHORS_SCHEMA
+
+
+def to_timestamp(dt):
+    """Переводит datetime в секунды UTC"""
+    return dt.timestamp()
+
+
+def from_timestamp(ts):
+    """Переводит секунды UTC в datetime с часовым поясом UTC"""
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+
+
+def day_of(dt):
+    """Номер суток UTC, к которым относится datetime"""
+    return int(to_timestamp(dt) // DAY_SECONDS)
+
+
+def has_link(content):
+    """Та же проверка ссылки, что в сводках: http:// или https:// в тексте"""
+    return 1 if "http://" in content or "https://" in content else 0
+
+
+def is_image_type(content_type):
+    """Та же проверка, что IMAGE_CONDITION: image/* или application/octet-stream"""
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    return content_type.startswith("image/") or content_type == "application/octet-stream"
+
+
+def contribution_of(row, attachments):
+    """
+    Вклад сообщения (строки message_to_row) в суточные сводки:
+    (channel_id, день, guild_id, author_id, is_bot, изображений, есть ли ссылка)
+    """
+    channel_id, _, guild_id, author_id, _, is_bot, created_at, content = row
+    images = sum(1 for attachment in attachments if is_image_type(attachment[4]))
+    return (channel_id, int(created_at // DAY_SECONDS), guild_id, author_id, is_bot, images, has_link(content))
+
+
+# === ИЗМЕНЕНИЯ СУТОЧНЫХ СВОДОК ===
+class RollupDeltas:
+    """Изменения суточных сводок за одну транзакцию, сложенные по дням и авторам"""
+    __slots__ = ("days", "users")
+
+    def __init__(self):
+        self.days = {}  # {(channel_id, день): [guild_id, сообщений, изображений, ссылок]}
+        self.users = {}  # {(channel_id, день, author_id): [сообщений, изображений]}
+
+    def add(self, contribution, sign):
+        """sign = 1 — сообщение добавлено, -1 — удалено (или это его вклад до правки)"""
+        if contribution is None:
+            return
+        channel_id, day, guild_id, author_id, is_bot, images, links = contribution
+        # Сообщения ботов в сводки не входят
+        if is_bot:
+            return
+        day_values = self.days.get((channel_id, day))
+        if day_values is None:
+            day_values = self.days[(channel_id, day)] = [guild_id, 0, 0, 0]
+        day_values[1] += sign
+        day_values[2] += sign * images
+        day_values[3] += sign * links
+        user_values = self.users.get((channel_id, day, author_id))
+        if user_values is None:
+            user_values = self.users[(channel_id, day, author_id)] = [0, 0]
+        user_values[0] += sign
+        user_values[1] += sign * images
+
+
+# === ЗАПИСИ ЛОКАЛЬНОГО ИНДЕКСА ===
+class StoredAttachment:
+    """Вложение сообщения из локального индекса"""
+    __slots__ = ("url", "content_type")
+
+    def __init__(self, url, content_type):
+        self.url = url
+        self.content_type = content_type
+
+
+class StoredMessage:
+    """Сообщение из локального индекса (только поля, которые нужны отчётам)"""
+    __slots__ = ("id", "channel_id", "guild_id", "author_id", "author_name", "is_bot", "created_ts", "content", "attachments")
+
+    def __init__(self, message_id, channel_id, guild_id, author_id, author_name, is_bot, created_ts, content, attachments):
+        self.id = message_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.is_bot = is_bot
+        self.created_ts = created_ts  # секунды UTC, datetime создаётся только по запросу
+        self.content = content
+        self.attachments = attachments
+
+    @property
+    def created_at(self):
+        return from_timestamp(self.created_ts)
+
+
+def message_to_row(message):
+    """Преобразует discord.Message в строки для сохранения в индексе"""
+    channel_id = message.channel.id
+    row = (
+        channel_id,
+        message.id,
+        message.guild.id if message.guild else None,
+        message.author.id,
+        str(message.author.display_name),
+        1 if message.author.bot else 0,
+        to_timestamp(message.created_at),
+        message.content or "",
+    )
+    attachments = [
+        (channel_id, message.id, position, attachment.url, attachment.content_type)
+        for position, attachment in enumerate(message.attachments)
+    ]
+    return row, attachments
+
+
+# === ЛОКАЛЬНЫЙ ИНДЕКС СООБЩЕНИЙ ===
+class MessageStore:
+    """
+    Локальный индекс сообщений на SQLite.
+
+    Хранит только поля, которые используют отчёты, и запоминает, какие интервалы времени
+    каждого канала уже полностью загружены из Discord. Повторные и пересекающиеся запросы
+    читаются из базы, а из Discord догружаются только недостающие интервалы.
+    Все методы синхронные: из корутин их вызывают через asyncio.to_thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        """Обновляет базу, созданную более старой версией бота: имена авторов и сводки"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= STORE_VERSION:
+            return
+        days = []
+        with self._conn:
+            if version < AUTHORS_VERSION:
+                # Раньше имя хранилось одно на все серверы: собираем имена заново по серверам
+                self._conn.execute("DROP TABLE IF EXISTS authors")
+                self._conn.execute(AUTHORS_SCHEMA)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO authors SELECT COALESCE(guild_id, 0), author_id, author_name "
+                    "FROM messages WHERE is_bot = 0 ORDER BY created_at"
+                )
+            if version < ROLLUP_VERSION:
+                days = self._conn.execute(
+                    f"SELECT DISTINCT channel_id, CAST(created_at / {DAY_SECONDS} AS INTEGER) FROM messages"
+                ).fetchall()
+                self._rebuild_rollups(days)
+            self._conn.execute(f"PRAGMA user_version = {STORE_VERSION}")
+        if days:
+            print(f"🗄️ Суточные сводки пересчитаны: {len(days)} дней")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Запись ---
+
+    def save_messages(self, rows):
+        """Сохраняет пачку сообщений: rows — результаты message_to_row"""
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                deltas = RollupDeltas()
+                self._insert_messages(rows, deltas)
+                self._apply_deltas(deltas)
+
+    def apply_live_batch(self, rows, edits, deletes, live_range=None):
+        """
+        Применяет накопленные события в одной транзакции.
+        rows — новые сообщения (message_to_row), edits — (channel_id, message_id, content, attachments),
+        deletes — (channel_id, message_id), live_range — (start_ts, end_ts) текущего подключения.
+        """
+        with self._lock:
+            with self._conn:
+                deltas = RollupDeltas()
+                if rows:
+                    self._insert_messages(rows, deltas)
+
+                for channel_id, message_id, content, attachments in edits:
+                    old = self._contribution(channel_id, message_id)
+                    if old is None:
+                        continue
+                    if content is not None:
+                        self._conn.execute(
+                            "UPDATE messages SET content = ? WHERE channel_id = ? AND message_id = ?",
+                            (content, channel_id, message_id)
+                        )
+                    if attachments is not None:
+                        self._conn.execute(
+                            "DELETE FROM attachments WHERE channel_id = ? AND message_id = ?",
+                            (channel_id, message_id)
+                        )
+                        self._conn.executemany(
+                            "INSERT INTO attachments VALUES (?, ?, ?, ?, ?)",
+                            [(channel_id, message_id, position, url, content_type)
+                             for position, (url, content_type) in enumerate(attachments)]
+                        )
+                    # Правка меняет только изображения и ссылки: число сообщений прежнее
+                    deltas.add(old, -1)
+                    deltas.add(self._contribution(channel_id, message_id), 1)
+
+                for channel_id, message_id in deletes:
+                    old = self._contribution(channel_id, message_id)
+                    if old is None:
+                        continue
+                    self._conn.execute(
+                        "DELETE FROM messages WHERE channel_id = ? AND message_id = ?",
+                        (channel_id, message_id)
+                    )
+                    self._conn.execute(
+                        "DELETE FROM attachments WHERE channel_id = ? AND message_id = ?",
+                        (channel_id, message_id)
+                    )
+                    deltas.add(old, -1)
+
+                self._apply_deltas(deltas)
+
+                if live_range is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO live_ranges VALUES (?, ?)",
+                        live_range
+                    )
+
+    def _insert_messages(self, rows, deltas):
+        # Одно и то же сообщение могло попасть в пачку дважды: учитываем последнюю версию
+        rows = list({(row[0], row[1]): (row, attachments) for row, attachments in rows}.values())
+        # Сообщение уже могло быть в индексе (повторная загрузка интервала): сначала вычитаем его прежний вклад
+        for channel_id, message_id in self._existing_ids([(row[0], row[1]) for row, _ in rows]):
+            deltas.add(self._contribution(channel_id, message_id), -1)
+        for row, attachments in rows:
+            deltas.add(contribution_of(row, attachments), 1)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [row for row, _ in rows]
+        )
+        self._conn.executemany(
+            "DELETE FROM attachments WHERE channel_id = ? AND message_id = ?",
+            [(row[0], row[1]) for row, _ in rows]
+        )
+        self._conn.executemany(
+            "INSERT INTO attachments VALUES (?, ?, ?, ?, ?)",
+            [attachment for _, attachments in rows for attachment in attachments]
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO authors VALUES (?, ?, ?)",
+            [(row[2] or 0, row[3], row[4]) for row, _ in rows if not row[5]]
+        )
+
+    def _existing_ids(self, keys):
+        """Какие из (channel_id, message_id) уже есть в индексе"""
+        by_channel = {}
+        for channel_id, message_id in keys:
+            by_channel.setdefault(channel_id, []).append(message_id)
+        existing = []
+        for channel_id, message_ids in by_channel.items():
+            for i in range(0, len(message_ids), PAGE_SIZE):
+                chunk = message_ids[i:i + PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                existing.extend(
+                    (channel_id, message_id) for (message_id,) in self._conn.execute(
+                        f"SELECT message_id FROM messages WHERE channel_id = ? AND message_id IN ({placeholders})",
+                        (channel_id, *chunk)
+                    )
+                )
+        return existing
+
+    def _contribution(self, channel_id, message_id):
+        """Вклад сообщения из индекса в сводки (см. contribution_of) или None, если его нет"""
+        found = self._conn.execute(
+            f"""
+            SELECT m.created_at, m.guild_id, m.author_id, m.is_bot, m.content,
+                   (SELECT COUNT(*) FROM attachments a
+                    WHERE a.channel_id = m.channel_id AND a.message_id = m.message_id AND {IMAGE_CONDITION})
+            FROM messages m WHERE m.channel_id = ? AND m.message_id = ?
+            """,
+            (channel_id, message_id)
+        ).fetchone()
+        if found is None:
+            return None
+        created_at, guild_id, author_id, is_bot, content, images = found
+        return (channel_id, int(created_at // DAY_SECONDS), guild_id, author_id, is_bot, images, has_link(content))
+
+    def _apply_deltas(self, deltas):
+        """Прибавляет изменения к суточным сводкам (строки, которых ещё нет, создаются)"""
+        if deltas.days:
+            self._conn.executemany(
+                """
+                INSERT INTO daily_rollups (channel_id, day, guild_id, messages, images, links)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (channel_id, day) DO UPDATE SET
+                    guild_id = COALESCE(excluded.guild_id, guild_id),
+                    messages = messages + excluded.messages,
+                    images = images + excluded.images,
+                    links = links + excluded.links
+                """,
+                [(channel_id, day, *values) for (channel_id, day), values in deltas.days.items()]
+            )
+        if deltas.users:
+            params = [(channel_id, day, author_id, *values) for (channel_id, day, author_id), values in deltas.users.items()]
+            self._conn.executemany(
+                """
+                INSERT INTO daily_user_rollups (channel_id, day, author_id, messages, images)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (channel_id, day, author_id) DO UPDATE SET
+                    messages = messages + excluded.messages,
+                    images = images + excluded.images
+                """,
+                params
+            )
+            # Все сообщения автора за день удалены: автор не должен считаться уникальным пользователем
+            self._conn.executemany(
+                "DELETE FROM daily_user_rollups WHERE channel_id = ? AND day = ? AND author_id = ? AND messages <= 0",
+                [param[:3] for param in params]
+            )
+
+    def _rebuild_rollups(self, days):
+        """
+        Пересчитывает суточные сводки (общие и по авторам) для (channel_id, day) из сообщений.
+        Обычная запись меняет сводки на вклад каждого сообщения; полный пересчёт нужен
+        только для восстановления (миграция формата сводок).
+        """
+        for channel_id, day in days:
+            day_start = day * DAY_SECONDS
+            day_range = (channel_id, day_start, day_start + DAY_SECONDS)
+            self._conn.execute(
+                f"""
+                INSERT OR REPLACE INTO daily_rollups (channel_id, day, guild_id, messages, images, links)
+                SELECT ?, ?, MAX(m.guild_id), COUNT(*),
+                       COALESCE(SUM((SELECT COUNT(*) FROM attachments a
+                                     WHERE a.channel_id = m.channel_id AND a.message_id = m.message_id
+                                       AND {IMAGE_CONDITION})), 0),
+                       COALESCE(SUM(instr(m.content, 'http://') > 0 OR instr(m.content, 'https://') > 0), 0)
+                FROM messages m
+                WHERE m.channel_id = ? AND m.created_at >= ? AND m.created_at < ? AND m.is_bot = 0
+                """,
+                (channel_id, day, *day_range)
+            )
+            self._conn.execute(
+                "DELETE FROM daily_user_rollups WHERE channel_id = ? AND day = ?",
+                (channel_id, day)
+            )
+            self._conn.execute(
+                f"""
+                INSERT INTO daily_user_rollups (channel_id, day, author_id, messages, images)
+                SELECT ?, ?, m.author_id, COUNT(*),
+                       COALESCE(SUM((SELECT COUNT(*) FROM attachments a
+                                     WHERE a.channel_id = m.channel_id AND a.message_id = m.message_id
+                                       AND {IMAGE_CONDITION})), 0)
+                FROM messages m
+                WHERE m.channel_id = ? AND m.created_at >= ? AND m.created_at < ? AND m.is_bot = 0
+                GROUP BY m.author_id
+                """,
+                (channel_id, day, *day_range)
+            )
+
+    def mark_fetched(self, channel_id, start_ts, end_ts):
+        """Отмечает интервал [start_ts, end_ts) канала как полностью загруженный"""
+        if end_ts <= start_ts:
+            return
+        with self._lock:
+            with self._conn:
+                # Объединяем с пересекающимися и соседними интервалами
+                overlapping = self._conn.execute(
+                    "SELECT start_ts, end_ts FROM fetched_ranges WHERE channel_id = ? AND start_ts <= ? AND end_ts >= ?",
+                    (channel_id, end_ts, start_ts)
+                ).fetchall()
+                for other_start, other_end in overlapping:
+                    start_ts = min(start_ts, other_start)
+                    end_ts = max(end_ts, other_end)
+                self._conn.execute(
+                    "DELETE FROM fetched_ranges WHERE channel_id = ? AND start_ts <= ? AND end_ts >= ?",
+                    (channel_id, end_ts, start_ts)
+                )
+                self._conn.execute(
+                    "INSERT INTO fetched_ranges VALUES (?, ?, ?)",
+                    (channel_id, start_ts, end_ts)
+                )
+
+    # --- Чтение ---
+
+    def missing_ranges(self, channel_id, start_ts, end_ts, include_live=True):
+        """
+        Возвращает интервалы внутри [start_ts, end_ts), которых ещё нет в индексе.
+        include_live — учитывать время, когда бот получал сообщения канала в реальном времени.
+        """
+        with self._lock:
+            covered = self._conn.execute(
+                "SELECT start_ts, end_ts FROM fetched_ranges WHERE channel_id = ? AND start_ts < ? AND end_ts > ?",
+                (channel_id, end_ts, start_ts)
+            ).fetchall()
+            if include_live:
+                covered += self._conn.execute(
+                    "SELECT start_ts, end_ts FROM live_ranges WHERE start_ts < ? AND end_ts > ?",
+                    (end_ts, start_ts)
+                ).fetchall()
+        covered.sort()
+        gaps = []
+        cursor = start_ts
+        for covered_start, covered_end in covered:
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end_ts:
+            gaps.append((cursor, end_ts))
+        return gaps
+
+    def daily_rollups(self, channel_id, start_day, end_day):
+        """Суточные сводки канала за дни [start_day, end_day)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT day, messages, images, links FROM daily_rollups "
+                "WHERE channel_id = ? AND day >= ? AND day < ? ORDER BY day",
+                (channel_id, start_day, end_day)
+            ).fetchall()
+
+    def activity_summary(self, guild_id, channel_id, start_day, end_day):
+        """
+        Статистика активности канала сервера guild_id за дни [start_day, end_day) по суточным сводкам.
+        Возвращает ((сообщений, изображений, ссылок), [(author_id, имя, сообщений, изображений), ...]).
+        Время ответа зависит от числа дней и авторов, а не от числа сообщений.
+        """
+        with self._lock:
+            totals = self._conn.execute(
+                "SELECT COALESCE(SUM(messages), 0), COALESCE(SUM(images), 0), COALESCE(SUM(links), 0) "
+                "FROM daily_rollups WHERE channel_id = ? AND day >= ? AND day < ?",
+                (channel_id, start_day, end_day)
+            ).fetchone()
+            users = self._conn.execute(
+                "SELECT r.author_id, COALESCE(a.name, CAST(r.author_id AS TEXT)), SUM(r.messages), SUM(r.images) "
+                "FROM daily_user_rollups r LEFT JOIN authors a ON a.guild_id = ? AND a.author_id = r.author_id "
+                "WHERE r.channel_id = ? AND r.day >= ? AND r.day < ? "
+                "GROUP BY r.author_id",
+                (guild_id or 0, channel_id, start_day, end_day)
+            ).fetchall()
+        return totals, users
+
+    def fetch_page(self, channel_id, start_ts, end_ts, after_key=None, page_size=PAGE_SIZE):
+        """
+        Возвращает страницу сообщений канала за [start_ts, end_ts) в порядке от старых к новым
+        и ключ для следующей страницы.
+        after_key — (created_at, message_id) последнего сообщения предыдущей страницы.
+        """
+        with self._lock:
+            if after_key is None:
+                rows = self._conn.execute(
+                    "SELECT message_id, guild_id, author_id, author_name, is_bot, created_at, content FROM messages "
+                    "WHERE channel_id = ? AND created_at >= ? AND created_at < ? "
+                    "ORDER BY created_at, message_id LIMIT ?",
+                    (channel_id, start_ts, end_ts, page_size)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT message_id, guild_id, author_id, author_name, is_bot, created_at, content FROM messages "
+                    "WHERE channel_id = ? AND (created_at, message_id) > (?, ?) AND created_at < ? "
+                    "ORDER BY created_at, message_id LIMIT ?",
+                    (channel_id, after_key[0], after_key[1], end_ts, page_size)
+                ).fetchall()
+            if not rows:
+                return [], after_key
+
+            attachments = {}
+            placeholders = ",".join("?" * len(rows))
+            for message_id, url, content_type in self._conn.execute(
+                f"SELECT message_id, url, content_type FROM attachments "
+                f"WHERE channel_id = ? AND message_id IN ({placeholders}) ORDER BY message_id, position",
+                (channel_id, *[row[0] for row in rows])
+            ):
+                attachments.setdefault(message_id, []).append(StoredAttachment(url, content_type))
+
+        messages = [
+            StoredMessage(
+                message_id, channel_id, guild_id, author_id, author_name, bool(is_bot),
+                created_at, content, attachments.get(message_id, NO_ATTACHMENTS)
+            )
+            for message_id, guild_id, author_id, author_name, is_bot, created_at, content in rows
+        ]
+        last = rows[-1]
+        return messages, (last[5], last[0])
+
+    async def iter_messages(self, channel_id, start_ts, end_ts, limit=None):
+        """Асинхронно перебирает сообщения канала постранично, не загружая всё в память"""
+        after_key = None
+        yielded = 0
+        while True:
+            page, after_key = await asyncio.to_thread(self.fetch_page, channel_id, start_ts, end_ts, after_key)
+            for message in page:
+                if limit is not None and yielded >= limit:
+                    return
+                yielded += 1
+                yield message
+            if len(page) < PAGE_SIZE:
+                return
+
+
+# === ПРИЁМ СООБЩЕНИЙ В РЕАЛЬНОМ ВРЕМЕНИ ===
+class LiveIngestor:
+    """
+    Пакетная запись событий on_message / правок / удалений в локальный индекс.
+
+    Обработчики событий только кладут данные в буфер; фоновая задача сбрасывает его
+    одной транзакцией раз в flush_interval секунд или при накоплении max_batch событий.
+    Пока бот подключён, индекс считается полным для всех каналов, поэтому отчёты
+    за текущую неделю не обращаются к истории Discord.
+    """
+
+    def __init__(self, store, flush_interval=2.0, max_batch=500):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._rows = []
+        self._edits = []
+        self._deletes = []
+        self._live_start = None
+        self._wakeup = None
+        self._task = None
+        self.events_written = 0
+        self.flushes = 0
+
+    def start(self):
+        """Запускает фоновый сброс буфера (вызывается внутри работающего цикла событий)"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="live-ingestor")
+
+    def begin_live(self):
+        """Начинает интервал, в котором бот получает все сообщения (on_ready / on_resumed)"""
+        self._live_start = datetime.datetime.now(datetime.timezone.utc).timestamp()
+
+    async def end_live(self):
+        """Закрывает интервал при отключении от Discord"""
+        await self.flush()
+        self._live_start = None
+
+    def add_message(self, message):
+        self._rows.append(message_to_row(message))
+        self._maybe_wakeup()
+
+    def add_edit(self, channel_id, message_id, data):
+        """Правка из on_raw_message_edit: обновляются только поля, пришедшие в событии"""
+        content = data.get("content")
+        attachments = data.get("attachments")
+        if attachments is not None:
+            attachments = [(attachment.get("url"), attachment.get("content_type")) for attachment in attachments]
+        if content is None and attachments is None:
+            return
+        self._edits.append((channel_id, message_id, content, attachments))
+        self._maybe_wakeup()
+
+    def add_delete(self, channel_id, message_id):
+        self._deletes.append((channel_id, message_id))
+        self._maybe_wakeup()
+
+    def _pending(self):
+        return len(self._rows) + len(self._edits) + len(self._deletes)
+
+    def _maybe_wakeup(self):
+        if self._wakeup is not None and self._pending() >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Записывает накопленные события в индекс"""
+        rows, edits, deletes = self._rows, self._edits, self._deletes
+        self._rows, self._edits, self._deletes = [], [], []
+        live_range = None
+        if self._live_start is not None:
+            live_range = (self._live_start, datetime.datetime.now(datetime.timezone.utc).timestamp())
+        if not (rows or edits or deletes or live_range):
+            return
+        try:
+            await asyncio.to_thread(self.store.apply_live_batch, rows, edits, deletes, live_range)
+        except Exception:
+            # Возвращаем события в буфер, чтобы записать их при следующей попытке
+            self._rows[:0], self._edits[:0], self._deletes[:0] = rows, edits, deletes
+            raise
+        self.events_written += len(rows) + len(edits) + len(deletes)
+        self.flushes += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Ошибка записи событий в локальный индекс: {e}")
@@ -0,0 +1,214 @@
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+
+from sheets_client import LatencyHistogram
+
+# Границы корзин длительности этапов команд (секунды): от одной страницы истории до экспорта за год
+SPAN_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Сколько последних замеров каждого этапа хранить для перцентилей в !perf
+RECENT_SAMPLES = 256
+# Метка для работы вне команд (фоновая запись в Google Sheets и т.п.)
+BACKGROUND = "background"
+
+# Команда, которая сейчас выполняется в этой задаче (наследуется в gather и asyncio.to_thread)
+_current_command = contextvars.ContextVar("perf_command", default=None)
+
+
+class PhaseStats:
+    """Длительности одного этапа: гистограмма для Prometheus и последние замеры для перцентилей"""
+    __slots__ = ("histogram", "recent", "max")
+
+    def __init__(self):
+        self.histogram = LatencyHistogram(SPAN_BUCKETS)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.histogram.observe(seconds)
+        self.recent.append(seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# === ЗАМЕРЫ ПРОИЗВОДИТЕЛЬНОСТИ КОМАНД ===
+class PerfRegistry:
+    """
+    Длительности этапов команд и счётчики событий.
+
+    Этапы (загрузка истории, подсчёт, формирование отчёта, отправка в Discord, запись
+    в Google Sheets) относятся к команде, внутри которой выполняются: команда запоминается
+    в contextvars, поэтому её не нужно передавать во вспомогательные функции.
+    Потокобезопасен: этапы замеряются и в пуле потоков.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.phases = {}  # {(команда, этап): PhaseStats}
+        self.counters = {}  # {(команда, счётчик): значение}
+        self.in_flight = {}  # {команда: сколько выполняется сейчас}
+
+    def begin_command(self, name):
+        """Начало команды. Возвращает отметку для end_command"""
+        token = _current_command.set(name)
+        with self._lock:
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        return name, time.perf_counter(), token
+
+    def end_command(self, handle, failed=False):
+        name, started, token = handle
+        self.observe("total", time.perf_counter() - started, command=name)
+        with self._lock:
+            self.in_flight[name] -= 1
+        if failed:
+            self.count("errors", command=name)
+        _current_command.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, phase, command=None):
+        """Замеряет длительность блока как этап текущей команды"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, command)
+
+    def observe(self, phase, seconds, command=None):
+        key = (command or _current_command.get() or BACKGROUND, phase)
+        with self._lock:
+            stats = self.phases.get(key)
+            if stats is None:
+                stats = self.phases[key] = PhaseStats()
+            stats.observe(seconds)
+
+    def count(self, name, value=1, command=None):
+        key = (command or _current_command.get() or BACKGROUND, name)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.phases = {}
+            self.counters = {}
+
+    def snapshot(self):
+        """
+        {команда: {"phases": {этап: {"count", "avg", "p50", "p95", "max", "total"}},
+                   "counters": {счётчик: значение}, "in_flight": n}}
+        """
+        result = {}
+        with self._lock:
+            for (command, phase), stats in self.phases.items():
+                histogram = stats.histogram
+                entry = result.setdefault(command, {"phases": {}, "counters": {}, "in_flight": 0})
+                entry["phases"][phase] = {
+                    "count": histogram.count,
+                    "total": histogram.total,
+                    "avg": histogram.total / histogram.count if histogram.count else 0.0,
+                    "p50": stats.percentile(0.5),
+                    "p95": stats.percentile(0.95),
+                    "max": stats.max,
+                }
+            for (command, name), value in self.counters.items():
+                result.setdefault(command, {"phases": {}, "counters": {}, "in_flight": 0})["counters"][name] = value
+            for command, active in self.in_flight.items():
+                result.setdefault(command, {"phases": {}, "counters": {}, "in_flight": 0})["in_flight"] = active
+        return result
+
+    def histograms(self):
+        """[(команда, этап, снимок гистограммы)] для Prometheus"""
+        with self._lock:
+            return [(command, phase, stats.histogram.snapshot()) for (command, phase), stats in self.phases.items()]
+
+
+metrics = PerfRegistry()
+span = metrics.span
+observe = metrics.observe
+count = metrics.count
+
+
+# === ФОРМАТ PROMETHEUS ===
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _histogram_lines(name, labels, snapshot):
+    label_text = ",".join(f'{key}="{_label(value)}"' for key, value in labels.items())
+    separator = "," if label_text else ""
+    lines = []
+    for bound, cumulative in snapshot["buckets"]:
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{name}_bucket{{{label_text}{separator}le="{le}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{label_text}}} {snapshot['sum']}")
+    lines.append(f"{name}_count{{{label_text}}} {snapshot['count']}")
+    return lines
+
+
+def render_prometheus(registry, writer_stats=None, cache_stats=None):
+    """Метрики в текстовом формате Prometheus (этапы команд, счётчики, Google Sheets, кэш отчётов)"""
+    lines = [
+        "# HELP discord_bot_phase_seconds Длительность этапов команд",
+        "# TYPE discord_bot_phase_seconds histogram",
+    ]
+    for command, phase, snapshot in sorted(registry.histograms(), key=lambda item: item[:2]):
+        lines.extend(_histogram_lines("discord_bot_phase_seconds", {"command": command, "phase": phase}, snapshot))
+
+    snapshot = registry.snapshot()
+    lines.append("# HELP discord_bot_events_total Счётчики событий команд (сообщения, запросы API, байты)")
+    lines.append("# TYPE discord_bot_events_total counter")
+    for command in sorted(snapshot):
+        for name, value in sorted(snapshot[command]["counters"].items()):
+            lines.append(f'discord_bot_events_total{{command="{_label(command)}",event="{_label(name)}"}} {value}')
+    lines.append("# TYPE discord_bot_commands_in_flight gauge")
+    for command in sorted(snapshot):
+        lines.append(f'discord_bot_commands_in_flight{{command="{_label(command)}"}} {snapshot[command]["in_flight"]}')
+
+    if writer_stats is not None:
+        lines.append("# TYPE discord_bot_sheets_queued_rows gauge")
+        lines.append(f"discord_bot_sheets_queued_rows {writer_stats['queued']}")
+        lines.append("# TYPE discord_bot_sheets_rows_written_total counter")
+        lines.append(f"discord_bot_sheets_rows_written_total {writer_stats['rows_written']}")
+        transport = writer_stats.get("transport")
+        if transport:
+            for name in ("requests", "retries", "failures", "bytes_sent"):
+                lines.append(f"# TYPE discord_bot_sheets_{name}_total counter")
+                lines.append(f"discord_bot_sheets_{name}_total {transport[name]}")
+            lines.append("# TYPE discord_bot_sheets_request_seconds histogram")
+            for operation, histogram in sorted(transport["latency"].items()):
+                lines.extend(_histogram_lines("discord_bot_sheets_request_seconds", {"operation": operation}, histogram))
+
+    if cache_stats is not None:
+        lines.append("# TYPE discord_bot_report_cache_entries gauge")
+        lines.append(f"discord_bot_report_cache_entries {cache_stats['entries']}")
+        lines.append("# TYPE discord_bot_report_cache_weight gauge")
+        lines.append(f"discord_bot_report_cache_weight {cache_stats['weight']}")
+        for name in ("hits", "misses", "expired", "evictions", "shared", "too_heavy"):
+            lines.append(f"# TYPE discord_bot_report_cache_{name}_total counter")
+            lines.append(f"discord_bot_report_cache_{name}_total {cache_stats[name]}")
+    return "\n".join(lines) + "\n"
+
+
+# === HTTP-ЭНДПОИНТ ДЛЯ PROMETHEUS ===
+async def start_metrics_server(host, port, render):
+    """Отдаёт await render() по адресу http://host:port/metrics (aiohttp устанавливается вместе с discord.py)"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=await render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Метрики Prometheus: http://{host}:{port}/metrics")
+    return runner
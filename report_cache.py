@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+# Сколько готовых результатов хранить (дольше всех не запрашиваемые вытесняются)
+CACHE_MAX_ENTRIES = 64
+# Сколько записей накопителей (ReportAccumulator.weight) хранить всего: большие результаты вытесняют больше
+CACHE_MAX_WEIGHT = 500_000
+# Сколько хранить результат за закончившийся период (секунды): история за него почти не меняется
+CACHE_TTL_CLOSED = 24 * 3600
+# Сколько хранить результат за период, который включает сегодня: в нём появляются новые сообщения
+CACHE_TTL_OPEN = 5 * 60
+
+
+def cache_key(name, guild_id, channels, start_ts, end_ts, options_key=None):
+    """
+    Ключ результата: отчёт, сервер, каналы, период (секунды UTC, поэтому 1-1-2026 и 01-01-2026
+    совпадают) и настройки накопителя (например, версия словарей кадровых сообщений).
+    """
+    return (name, guild_id, tuple(sorted(channel.id for channel in channels)), start_ts, end_ts, options_key)
+
+
+class CachedReport:
+    """Результат в кэше: накопитель, его вес и время, до которого он действителен"""
+    __slots__ = ("accumulator", "weight", "stored_at", "expires_at")
+
+    def __init__(self, accumulator, weight, stored_at, expires_at):
+        self.accumulator = accumulator
+        self.weight = weight
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+
+# === ГОТОВЫЕ РЕЗУЛЬТАТЫ ОТЧЁТОВ ===
+class ReportCache:
+    """
+    LRU-кэш посчитанных накопителей отчётов со сроком жизни.
+
+    Размер ограничен и числом результатов (max_entries), и суммой их весов (max_weight,
+    ReportAccumulator.weight — число хранимых записей): один отчёт за длинный период
+    вытесняет несколько маленьких, а результат тяжелее max_weight не кэшируется.
+
+    Накопитель из кэша только читается (report_lines, sheet_chunks), поэтому один и тот же
+    объект можно отдавать нескольким командам. Результат за закончившийся период живёт
+    ttl_closed секунд, за период с сегодняшним днём — ttl_open. Если такой же отчёт уже
+    считается, повторный запрос ждёт его результат вместо второго просмотра истории.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_closed=CACHE_TTL_CLOSED, ttl_open=CACHE_TTL_OPEN,
+                 max_weight=CACHE_MAX_WEIGHT):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weight = 0  # сумма весов хранимых результатов
+        self.ttl_closed = ttl_closed
+        self.ttl_open = ttl_open
+        self._entries = OrderedDict()  # {ключ: CachedReport}, в начале — дольше всех не запрашиваемые
+        self._in_flight = {}  # {ключ: asyncio.Future с накопителем или None}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.shared = 0  # запросов, дождавшихся уже идущего подсчёта
+        self.too_heavy = 0  # результатов тяжелее max_weight (не сохранены)
+
+    def get(self, key):
+        """CachedReport или None (устаревший результат удаляется)"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._remove(key)
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, accumulator, open_range):
+        """Сохраняет результат; open_range — период включает текущий день"""
+        if self.max_entries <= 0:
+            return
+        weight = accumulator.weight()
+        if key in self._entries:
+            self._remove(key)
+        if weight > self.max_weight:
+            self.too_heavy += 1
+            return
+        now = time.time()
+        ttl = self.ttl_open if open_range else self.ttl_closed
+        self._entries[key] = CachedReport(accumulator, weight, now, now + ttl)
+        self.weight += weight
+        while len(self._entries) > self.max_entries or self.weight > self.max_weight:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.weight -= self._entries.pop(key).weight
+
+    def in_flight(self, key):
+        """Future подсчёта, который уже идёт, или None"""
+        return self._in_flight.get(key)
+
+    def begin(self, key):
+        """Отмечает, что результат для key считается (другие запросы дождутся его)"""
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        return future
+
+    def finish(self, key, future, accumulator=None):
+        """Подсчёт завершён: accumulator или None, если результат не подходит для повторного использования"""
+        # --fresh мог начать новый подсчёт того же отчёта: его отметку не трогаем
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.done():
+            future.set_result(accumulator)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "shared": self.shared,
+            "too_heavy": self.too_heavy,
+        }
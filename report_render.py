@@ -0,0 +1,179 @@
+import discord
+
+# Лимиты Discord
+MESSAGE_LIMIT = 2000  # текст одного сообщения
+EMBED_DESCRIPTION_LIMIT = 4096  # описание одного embed
+EMBEDS_PER_MESSAGE = 10
+EMBEDS_TOTAL_LIMIT = 6000  # все embed одного сообщения вместе (описания, заголовки, подписи)
+
+# Запас под подпись «Страница N из M» в лимите сообщения
+FOOTER_RESERVE = 100
+# Меньше этого места в сообщении не начинаем новый embed: остаток уходит в следующее сообщение
+MIN_EMBED_SPACE = 200
+# Сколько сообщений отчёта отправлять целиком; длиннее — одно сообщение с кнопками листания
+INLINE_MESSAGES = 2
+# Сколько секунд работают кнопки листания (потом отчёт остаётся на последней открытой странице)
+PAGE_TIMEOUT = 15 * 60
+
+REPORT_COLOUR = discord.Colour.blue()
+
+
+def _split_long_line(line, limit):
+    """Строку длиннее limit делит по пробелам (или жёстко, если пробелов нет)"""
+    while len(line) > limit:
+        cut = line.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        yield line[:cut]
+        line = line[cut:].lstrip(" ")
+    yield line
+
+
+def pack_lines(lines, limit):
+    """
+    Собирает строки в части не длиннее limit символов, не разрывая строки
+    (а с ними ссылки и разметку). Разрезается только строка, которая сама длиннее limit.
+    """
+    parts = []
+    current = []
+    length = 0
+    for line in lines:
+        for piece in _split_long_line(line, limit):
+            added = len(piece) + (1 if current else 0)
+            if current and length + added > limit:
+                parts.append("\n".join(current))
+                current = [piece]
+                length = len(piece)
+            else:
+                current.append(piece)
+                length += added
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+def pack_embeds(lines):
+    """
+    Раскладывает строки по сообщениям из embed: [[описание, ...], ...].
+    Каждое сообщение заполняется до общего лимита embed (до 10 описаний по 4096 символов,
+    вместе не больше 6000), поэтому длинный отчёт занимает как можно меньше сообщений.
+    """
+    budget = EMBEDS_TOTAL_LIMIT - FOOTER_RESERVE
+    messages = []
+    descriptions = []
+    current = []
+    length = 0
+    space = min(EMBED_DESCRIPTION_LIMIT, budget)
+
+    def close_embed():
+        nonlocal current, length
+        if current:
+            descriptions.append("\n".join(current))
+        current = []
+        length = 0
+
+    for line in lines:
+        for piece in _split_long_line(line, EMBED_DESCRIPTION_LIMIT):
+            added = len(piece) + (1 if current else 0)
+            if length + added <= space:
+                current.append(piece)
+                length += added
+                continue
+            close_embed()
+            used = sum(len(description) for description in descriptions)
+            space = min(EMBED_DESCRIPTION_LIMIT, budget - used)
+            if len(descriptions) >= EMBEDS_PER_MESSAGE or space < max(len(piece), MIN_EMBED_SPACE):
+                messages.append(descriptions)
+                descriptions = []
+                space = min(EMBED_DESCRIPTION_LIMIT, budget)
+            current = [piece]
+            length = len(piece)
+    close_embed()
+    if descriptions:
+        messages.append(descriptions)
+    return messages
+
+
+def build_embeds(descriptions, page=None, pages=None):
+    """embed одного сообщения; page/pages — подпись с номером страницы"""
+    embeds = [discord.Embed(description=description, colour=REPORT_COLOUR) for description in descriptions]
+    if page is not None and embeds:
+        embeds[-1].set_footer(text=f"Страница {page} из {pages}")
+    return embeds
+
+
+def can_embed(channel):
+    """Может ли бот отправлять embed в канал (нужно право «Встраивать ссылки»)"""
+    permissions_for = getattr(channel, "permissions_for", None)
+    guild = getattr(channel, "guild", None)
+    if permissions_for is None or guild is None or guild.me is None:
+        return True
+    return permissions_for(guild.me).embed_links
+
+
+# === ЛИСТАНИЕ ДЛИННЫХ ОТЧЁТОВ ===
+class PageView(discord.ui.View):
+    """
+    Кнопки листания отчёта в одном сообщении.
+
+    Страница открывается правкой того же сообщения в ответ на нажатие (ответ на взаимодействие
+    не расходует лимит отправки сообщений в канал), поэтому отчёт на сотни строк стоит одного
+    сообщения вместо десятков. Листать может автор команды (или любой, если автора нет).
+    """
+
+    def __init__(self, pages, author_id=None, timeout=PAGE_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.pages = pages  # [[описание, ...], ...] — содержимое каждой страницы
+        self.author_id = author_id
+        self.index = 0
+        self.message = None
+        self._sync_buttons()
+
+    def embeds(self):
+        return build_embeds(self.pages[self.index], self.index + 1, len(self.pages))
+
+    def _sync_buttons(self):
+        last = len(self.pages) - 1
+        self.first_page.disabled = self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.last_page.disabled = self.index == last
+        self.page_counter.label = f"{self.index + 1}/{len(self.pages)}"
+
+    async def interaction_check(self, interaction):
+        if self.author_id is None or interaction.user.id == self.author_id:
+            return True
+        await interaction.response.send_message("⛔ Листать отчёт может только автор команды", ephemeral=True)
+        return False
+
+    async def _show(self, interaction, index):
+        self.index = max(0, min(index, len(self.pages) - 1))
+        self._sync_buttons()
+        await interaction.response.edit_message(embeds=self.embeds(), view=self)
+
+    @discord.ui.button(label="⏮", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction, button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.primary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.index - 1)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.secondary, disabled=True)
+    async def page_counter(self, interaction, button):
+        pass
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.index + 1)
+
+    @discord.ui.button(label="⏭", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction, button):
+        await self._show(interaction, len(self.pages) - 1)
+
+    async def on_timeout(self):
+        # Кнопки больше не работают: убираем их, страница остаётся
+        self.pages = [self.pages[self.index]]
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
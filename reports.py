@@ -0,0 +1,492 @@
+import datetime
+import json
+import tempfile
+from collections import Counter
+
+# Сколько пользователей показывать в ТОП-списках
+TOP_LIMIT = 10
+# Сколько сообщений с изображениями показывать в отчёте !images
+IMAGES_SHOWN = 500
+# Общий пустой список изображений для сообщений без вложений
+NO_IMAGES = ()
+# Сколько строк отправлять в Google Sheets одним заданием очереди
+SHEETS_CHUNK_ROWS = 1000
+# Сколько байт строк !images держать в памяти, прежде чем сбросить их во временный файл на диске
+IMAGE_ROWS_MEMORY = 256 * 1024
+
+
+# === ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: ПРОВЕРКА ИЗОБРАЖЕНИЯ ===
+def is_image(attachment):
+    """Проверяет, является ли вложение изображением"""
+    if not attachment.content_type:
+        return False
+    content_type = attachment.content_type.lower()
+    return content_type.startswith('image/') or content_type == 'application/octet-stream'
+
+
+def message_link(guild_id, channel_id, message_id):
+    """Ссылка на сообщение Discord"""
+    return f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
+
+
+def top_items(counter, limit=TOP_LIMIT):
+    """ТОП записей словаря {ключ: количество} по убыванию количества"""
+    return sorted(counter.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+def scan_status_line(complete):
+    """Строка отчёта о том, все ли сообщения периода были просмотрены"""
+    if complete:
+        return "✅ Просмотрены все сообщения периода"
+    return "⚠️ Отчёт неполный: часть истории не удалось загрузить из Discord или каналы недоступны"
+
+
+def utc_now_str():
+    """Текущее время для колонки «Время» в Google Sheets"""
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%d-%m-%Y %H:%M:%S UTC")
+
+
+# === РЕЕСТР ОТЧЁТОВ ===
+# {имя отчёта: класс накопителя}. Имена используются в команде !report
+REPORT_TYPES = {}
+
+
+def register_report(name):
+    """Регистрирует класс накопителя под именем name"""
+    def decorator(cls):
+        cls.name = name
+        REPORT_TYPES[name] = cls
+        return cls
+    return decorator
+
+
+class ReportAccumulator:
+    """
+    Накопитель одного отчёта. Получает сообщения по одному и не хранит их целиком,
+    статистику нескольких каналов можно объединить через merge.
+    """
+    name = None
+    # Лист Google Sheets, куда пишутся строки отчёта
+    sheet_range = None
+    # Можно ли посчитать отчёт по суточным сводкам без просмотра сообщений
+    uses_rollups = False
+
+    def __init__(self):
+        self.complete = True  # все ли сообщения периода просмотрены
+        self.sheets_saved = False  # строки уже поставлены в очередь Google Sheets (результат из кэша повторно не пишется)
+
+    @classmethod
+    def create(cls, options):
+        """Создаёт накопитель; options — общие настройки команды (например, словари кадровых сообщений)"""
+        return cls()
+
+    @classmethod
+    def cache_key(cls, options):
+        """Настройки, от которых зависит результат (часть ключа кэша готовых отчётов)"""
+        return None
+
+    def add(self, message, channel, images):
+        """Учитывает сообщение (не от бота); images — его вложения-изображения"""
+        raise NotImplementedError
+
+    def merge(self, other):
+        """Добавляет статистику другого канала"""
+        self.complete = self.complete and other.complete
+        return self
+
+    def weight(self):
+        """Сколько записей хранит накопитель (по сумме весов ограничивается кэш готовых отчётов)"""
+        return 1
+
+    def report_lines(self, start_date, end_date, channel_label):
+        raise NotImplementedError
+
+    def sheet_rows(self, guild_name, channel_label, start_date, end_date, sanitize):
+        raise NotImplementedError
+
+    def sheet_chunks(self, guild_name, channel_label, start_date, end_date, sanitize):
+        """Строки для Google Sheets порциями (по заданию очереди на порцию)"""
+        rows = self.sheet_rows(guild_name, channel_label, start_date, end_date, sanitize)
+        if rows:
+            yield rows
+
+
+# === ОДИН ПРОХОД ДЛЯ НЕСКОЛЬКИХ ОТЧЁТОВ ===
+class ReportPipeline:
+    """Раздаёт каждое сообщение всем накопителям: боты и изображения определяются один раз"""
+
+    def __init__(self, accumulators):
+        self.accumulators = list(accumulators)
+
+    def add(self, message, channel):
+        if message.is_bot:
+            return
+        attachments = message.attachments
+        images = [attachment for attachment in attachments if is_image(attachment)] if attachments else NO_IMAGES
+        for accumulator in self.accumulators:
+            accumulator.add(message, channel, images)
+
+
+# === СТАТИСТИКА АКТИВНОСТИ ===
+@register_report("activity")
+class ActivityStats(ReportAccumulator):
+    """Сообщения, изображения и ссылки канала (или группы каналов) с разбивкой по пользователям"""
+    sheet_range = "Activity!A:J"
+    uses_rollups = True
+
+    def __init__(self):
+        super().__init__()
+        self.message_count = 0
+        self.images = 0
+        self.links = 0
+        self.user_names = {}     # {user_id: display_name}
+        self.user_messages = {}  # {user_id: количество сообщений}
+        self.user_images = {}    # {user_id: количество изображений}
+
+    def add(self, message, channel, images):
+        user_id = message.author_id
+        # Сохраняем имя пользователя при первом появлении
+        if user_id not in self.user_names:
+            self.user_names[user_id] = message.author_name
+
+        self.message_count += 1
+        self.user_messages[user_id] = self.user_messages.get(user_id, 0) + 1
+
+        # Подсчет ТОЛЬКО изображений
+        if images:
+            self.images += len(images)
+            self.user_images[user_id] = self.user_images.get(user_id, 0) + len(images)
+
+        content = message.content
+        if "http" in content and ("http://" in content or "https://" in content):
+            self.links += 1
+
+    def add_summary(self, totals, users):
+        """Учитывает готовую сводку из суточных таблиц (MessageStore.activity_summary)"""
+        message_count, images, links = totals
+        self.message_count += message_count
+        self.images += images
+        self.links += links
+        for user_id, display_name, user_messages, user_images in users:
+            self.user_names.setdefault(user_id, display_name)
+            self.user_messages[user_id] = self.user_messages.get(user_id, 0) + user_messages
+            if user_images:
+                self.user_images[user_id] = self.user_images.get(user_id, 0) + user_images
+
+    def merge(self, other):
+        super().merge(other)
+        self.message_count += other.message_count
+        self.images += other.images
+        self.links += other.links
+        for user_id, display_name in other.user_names.items():
+            self.user_names.setdefault(user_id, display_name)
+        for user_id, count in other.user_messages.items():
+            self.user_messages[user_id] = self.user_messages.get(user_id, 0) + count
+        for user_id, count in other.user_images.items():
+            self.user_images[user_id] = self.user_images.get(user_id, 0) + count
+        return self
+
+    def weight(self):
+        return 1 + len(self.user_names)
+
+    def report_lines(self, start_date, end_date, channel_label):
+        lines = [
+            f"📊 **Отчет по активности (только изображения)**",
+            f"📅 Период: `{start_date} - {end_date}`",
+            f"💬 Сообщений: **{self.message_count}**",
+            f"👥 Уникальных пользователей: **{len(self.user_names)}**",
+            f"🖼️ Изображений: **{self.images}**",
+            f"🔗 Ссылок: **{self.links}**",
+            f"📈 Канал: `{channel_label}`",
+            scan_status_line(self.complete),
+            "\n🏆 **ТОП-10 пользователей по сообщениям:**"
+        ]
+
+        # ТОП-10 по сообщениям
+        top_messages = top_items(self.user_messages)
+        if top_messages:
+            for i, (user_id, count) in enumerate(top_messages, 1):
+                username = self.user_names.get(user_id, "Неизвестный пользователь")
+                lines.append(f"**{i}.** {username} — **{count}** сообщений")
+        else:
+            lines.append("ℹ️ Нет данных для формирования ТОП-10 по сообщениям")
+
+        # ТОП-10 по изображениям
+        lines.append("\n📸 **ТОП-10 пользователей по изображениям:**")
+        top_images = top_items(self.user_images)
+        if top_images:
+            for i, (user_id, count) in enumerate(top_images, 1):
+                username = self.user_names.get(user_id, "Неизвестный пользователь")
+                lines.append(f"**{i}.** {username} — **{count}** изображений")
+        else:
+            lines.append("ℹ️ Нет данных для формирования ТОП-10 по изображениям")
+        return lines
+
+    def sheet_rows(self, guild_name, channel_label, start_date, end_date, sanitize):
+        """Строки для листа Activity (сохраняем только общую статистику)"""
+        return [[
+            sanitize(guild_name),
+            sanitize(channel_label),
+            sanitize(start_date),
+            sanitize(end_date),
+            self.message_count,
+            len(self.user_names),
+            self.images,
+            self.links,
+            utc_now_str()
+        ]]
+
+
+# === СООБЩЕНИЯ С ИЗОБРАЖЕНИЯМИ ===
+class ImageMessage:
+    """Сообщение с изображениями: только идентификаторы, ссылка собирается при выводе"""
+    __slots__ = ("channel_name", "guild_id", "channel_id", "message_id", "image_urls", "author", "created_ts")
+
+    def __init__(self, channel_name, guild_id, channel_id, message_id, image_urls, author, created_ts):
+        self.channel_name = channel_name
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.image_urls = image_urls
+        self.author = author
+        self.created_ts = created_ts
+
+    def link(self):
+        return message_link(self.guild_id, self.channel_id, self.message_id)
+
+
+@register_report("images")
+class ImageStats(ReportAccumulator):
+    """
+    Сообщения с изображениями в порядке сканирования.
+    В памяти держатся только счётчики и первые IMAGES_SHOWN сообщений для вывода; строки
+    для Google Sheets по всем сообщениям пишутся во временный файл (в памяти — не больше
+    IMAGE_ROWS_MEMORY байт) и после просмотра читаются обратно порциями.
+    Номера изображений присваиваются при выводе, поэтому статистику нескольких каналов
+    можно объединять без перенумерации.
+    """
+    sheet_range = "Images!A:J"
+
+    def __init__(self):
+        super().__init__()
+        self.shown = []  # [ImageMessage] — первые IMAGES_SHOWN сообщений
+        self.total_messages = 0
+        self.total_images = 0
+        self._rows = None  # временный файл строк этого канала (создаётся при первом изображении)
+        self.row_files = []  # файлы строк всех каналов в порядке объединения
+
+    def add(self, message, channel, images):
+        """Учитывает сообщение канала channel, если в нём есть изображения"""
+        if not images:
+            return  # Пропускаем сообщения без изображений
+        image_urls = tuple(attachment.url for attachment in images)
+        self.total_messages += 1
+        self.total_images += len(image_urls)
+        if len(self.shown) < IMAGES_SHOWN:
+            self.shown.append(ImageMessage(
+                channel.name, channel.guild.id, channel.id, message.id, image_urls, message.author_name, message.created_ts
+            ))
+        if self._rows is None:
+            self._rows = tempfile.SpooledTemporaryFile(max_size=IMAGE_ROWS_MEMORY, mode="w+", encoding="utf-8")
+            self.row_files.append(self._rows)
+        # Номера изображений не пишутся: после объединения каналов нумерация сквозная
+        self._rows.write(json.dumps([
+            channel.name,
+            message_link(channel.guild.id, channel.id, message.id),
+            " | ".join(image_urls),
+            len(image_urls),
+            message.author_name
+        ], ensure_ascii=False) + "\n")
+
+    def merge(self, other):
+        super().merge(other)
+        # Пока показаны не все IMAGES_SHOWN, в shown лежат все сообщения: порядок не нарушается
+        self.shown.extend(other.shown[:IMAGES_SHOWN - len(self.shown)])
+        self.total_messages += other.total_messages
+        self.total_images += other.total_images
+        self.row_files.extend(other.row_files)
+        return self
+
+    def weight(self):
+        # Строки для Google Sheets лежат во временных файлах (в памяти — до IMAGE_ROWS_MEMORY на канал), но тоже занимают место
+        return 1 + len(self.shown) + self.total_messages
+
+    def numbered(self):
+        """Перебирает показываемые сообщения с номерами их изображений (сквозная нумерация)"""
+        image_number = 1
+        for record in self.shown:
+            image_urls = record.image_urls
+            numbers = range(image_number, image_number + len(image_urls))
+            image_number += len(image_urls)
+            yield record.channel_name, record.link(), image_urls, numbers, record.author, record.created_ts
+
+    def report_lines(self, start_date, end_date, channel_label):
+        total_messages = self.total_messages
+        lines = [f"📊 **Отчёт по изображениям** в канале `{channel_label}`"]
+        lines.append(f"📅 Период: `{start_date} - {end_date}`")
+        lines.append(f"🖼️ Всего изображений: **{self.total_images}**")
+        lines.append(f"💬 Сообщений с изображениями: **{total_messages}**")
+        lines.append(scan_status_line(self.complete))
+        lines.append("\n🔗 **Ссылки на сообщения с изображениями:**")
+
+        # Показываем первые IMAGES_SHOWN сообщений (а не изображений): длинный список листается кнопками
+        for i, (_, link, _, numbers, author, _) in enumerate(self.numbered(), 1):
+            image_numbers = ", ".join(str(number) for number in numbers)
+            lines.append(f"**{i}.** {link} • № {image_numbers} • **{author}**")
+
+        if total_messages > IMAGES_SHOWN:
+            lines.append(f"\nℹ️ Показаны первые {IMAGES_SHOWN} из {total_messages} сообщений с изображениями. Для полного отчёта используйте `!export_images`")
+        return lines
+
+    def stored_rows(self, block_rows=SHEETS_CHUNK_ROWS):
+        """
+        Перебирает сохранённые строки [канал, ссылка, ссылки на изображения, число изображений, автор].
+        Файлы читаются блоками с запоминанием позиции: результат из кэша могут читать
+        несколько команд одновременно.
+        """
+        for rows in self.row_files:
+            position = 0
+            while True:
+                rows.seek(position)
+                lines = []
+                while len(lines) < block_rows:
+                    line = rows.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+                position = rows.tell()
+                for line in lines:
+                    yield json.loads(line)
+                if len(lines) < block_rows:
+                    break
+
+    def sheet_chunks(self, guild_name, channel_label, start_date, end_date, sanitize, chunk_rows=SHEETS_CHUNK_ROWS):
+        """Строки для листа Images порциями: одна запись на сообщение со всеми его изображениями (канал — свой у каждой)"""
+        exported_at = sanitize(utc_now_str())
+        prefix = [sanitize(guild_name)]
+        dates = [sanitize(start_date), sanitize(end_date)]
+        image_number = 1
+        chunk = []
+        for channel_name, link, image_urls, count, author in self.stored_rows(chunk_rows):
+            numbers = ", ".join(str(number) for number in range(image_number, image_number + count))
+            image_number += count
+            chunk.append(prefix + [sanitize(channel_name)] + dates + [
+                sanitize(link),
+                sanitize(image_urls),
+                sanitize(numbers),
+                sanitize(author),
+                exported_at
+            ])
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# === КАДРОВЫЕ СООБЩЕНИЯ ===
+@register_report("staff")
+class StaffStats(ReportAccumulator):
+    """
+    Количество кадровых сообщений по категориям словаря staff_keywords и их авторы.
+    Текст сообщений не сохраняется: отчёту нужны только счётчики по id авторов,
+    имена подставляются при выводе.
+    """
+    sheet_range = "StaffAnalysis!A:J"
+
+    def __init__(self, categories, classifier, bot_version=None):
+        super().__init__()
+        self.bot_version = bot_version
+        self.categories = categories
+        self.classifier = classifier
+        self.category_counts = {name: 0 for name in categories}
+        self.category_authors = {name: Counter() for name in categories}  # {категория: {user_id: количество}}
+        self.author_names = {}  # {user_id: display_name}
+
+    @classmethod
+    def create(cls, options):
+        categories, classifier = options["staff_keywords"]
+        return cls(categories, classifier, options.get("bot_version"))
+
+    @classmethod
+    def cache_key(cls, options):
+        # Классификатор пересобирается при изменении словарей: старый результат не подходит
+        return options["staff_keywords"][1]
+
+    def add(self, message, channel, images):
+        # Все категории определяются за один проход по тексту
+        found = self.classifier.classify(message.content)
+        if not found:
+            return
+
+        user_id = message.author_id
+        if user_id not in self.author_names:
+            self.author_names[user_id] = message.author_name
+        for name in found:
+            self.category_counts[name] += 1
+            self.category_authors[name][user_id] += 1
+
+    def merge(self, other):
+        super().merge(other)
+        for user_id, display_name in other.author_names.items():
+            self.author_names.setdefault(user_id, display_name)
+        for name in self.categories:
+            self.category_counts[name] += other.category_counts[name]
+            self.category_authors[name].update(other.category_authors[name])
+        return self
+
+    def weight(self):
+        return 1 + len(self.author_names) + sum(len(authors) for authors in self.category_authors.values())
+
+    def top_authors(self, name, limit=TOP_LIMIT):
+        """ТОП авторов категории: [(имя, количество)]"""
+        return [
+            (self.author_names.get(user_id, "Неизвестный пользователь"), count)
+            for user_id, count in top_items(self.category_authors[name], limit)
+        ]
+
+    def report_lines(self, start_date, end_date, channel_label):
+        lines = [
+            f"📊 **Отчет по кадровым сообщениям (версия {self.bot_version})**",
+            f"📅 Период: `{start_date} - {end_date}`",
+            f"📈 Канал: `{channel_label}`",
+            scan_status_line(self.complete)
+        ]
+        for name, category in self.categories.items():
+            lines.extend([
+                f"\n{category['title']}",
+                f"   • Всего сообщений: **{self.category_counts[name]}**",
+                f"   • Уникальных авторов: **{len(self.category_authors[name])}**"
+            ])
+
+        # ТОП-10 авторов по каждой категории
+        for name, category in self.categories.items():
+            lines.append(f"\n{category['top_title']}")
+            top_authors = self.top_authors(name)
+            if top_authors:
+                for i, (author, count) in enumerate(top_authors, 1):
+                    lines.append(f"**{i}.** {author} — **{count}** сообщений")
+            else:
+                lines.append(category['empty'])
+        return lines
+
+    def sheet_rows(self, guild_name, channel_label, start_date, end_date, sanitize):
+        """Строки для листа StaffAnalysis: одна строка на категорию с сообщениями"""
+        rows = []
+        exported_at = utc_now_str()
+        for name, category in self.categories.items():
+            if not self.category_counts[name]:
+                continue
+            top_category_authors = ", ".join(f"{author} ({count})" for author, count in self.top_authors(name, 3))
+            rows.append([
+                sanitize(guild_name),
+                sanitize(channel_label),
+                sanitize(start_date),
+                sanitize(end_date),
+                sanitize(category['label']),
+                sanitize(self.category_counts[name]),
+                sanitize(len(self.category_authors[name])),
+                sanitize(top_category_authors),
+                sanitize(exported_at)
+            ])
+        return rows
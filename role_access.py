@@ -0,0 +1,64 @@
+# === ДОСТУП К КОМАНДАМ ПО РОЛЯМ ===
+class RoleAccess:
+    """
+    Проверка ролей с доступом к командам.
+
+    Имена разрешённых ролей задаются для всех серверов и (необязательно) для отдельных
+    серверов. Имена переводятся в id ролей один раз на сервер и кэшируются; кэш сервера
+    сбрасывается, когда на нём создают, меняют или удаляют роль. Проверка участника не
+    перебирает роли сервера и не создаёт объектов.
+    """
+
+    def __init__(self, default_names, guild_names=None):
+        self.default_names = self._normalize(default_names)
+        # {guild_id: (имена ролей)}
+        self.guild_names = {int(guild_id): self._normalize(names) for guild_id, names in (guild_names or {}).items()}
+        self._resolved = {}  # {guild_id: tuple(id ролей)}
+
+    @staticmethod
+    def _normalize(names):
+        if isinstance(names, str):
+            names = [names]
+        unique = {}
+        for name in names:
+            if name and name.strip():
+                unique.setdefault(name.strip().lower(), name.strip())
+        return tuple(unique.values())
+
+    @classmethod
+    def from_config(cls, config, default_name):
+        """
+        Роли из config.json: "ALLOWED_ROLES" — список имён для всех серверов или словарь
+        {"default": [...], "<id сервера>": [...]}. Без настройки — одна роль default_name.
+        """
+        allowed = config.get("ALLOWED_ROLES")
+        if not allowed:
+            return cls([default_name])
+        if isinstance(allowed, dict):
+            guild_names = {key: names for key, names in allowed.items() if key != "default"}
+            return cls(allowed.get("default") or [default_name], guild_names)
+        return cls(allowed)
+
+    def names_for(self, guild_id):
+        """Имена разрешённых ролей сервера"""
+        return self.guild_names.get(guild_id, self.default_names)
+
+    def role_ids(self, guild):
+        """id разрешённых ролей, которые есть на сервере"""
+        resolved = self._resolved.get(guild.id)
+        if resolved is None:
+            # Имена сравниваются без учёта регистра
+            names = {name.lower() for name in self.names_for(guild.id)}
+            resolved = tuple(role.id for role in guild.roles if role.name.lower() in names)
+            self._resolved[guild.id] = resolved
+        return resolved
+
+    def invalidate(self, guild_id):
+        """Сбрасывает кэш сервера (роль создана, переименована или удалена)"""
+        self._resolved.pop(guild_id, None)
+
+    def is_allowed(self, member, role_ids):
+        for role_id in role_ids:
+            if member.get_role(role_id) is not None:
+                return True
+        return False
@@ -0,0 +1,265 @@
+import asyncio
+import datetime
+import json
+import os
+
+# Файл расписания по умолчанию
+DEFAULT_SCHEDULE_PATH = "schedules.json"
+# Как далеко вперёд искать следующий запуск (дней): выражение вроде «30 февраля» не срабатывает никогда
+CRON_SEARCH_DAYS = 366 * 5
+# Самое долгое ожидание между проверками расписания (секунды)
+MAX_SLEEP = 3600
+
+# Сокращения как в cron
+CRON_MACROS = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# Периоды плановых отчётов: за какие даты считать отчёт относительно момента запуска
+PERIODS = {
+    "day": "вчера",
+    "week": "прошлая неделя (пн–вс)",
+    "month": "прошлый месяц",
+}
+
+
+# === РАСПИСАНИЕ В ФОРМАТЕ CRON ===
+class CronSchedule:
+    """
+    Выражение cron из пяти полей: минута, час, день месяца, месяц, день недели (0 и 7 — воскресенье).
+    Поддерживаются *, числа, списки (1,15), диапазоны (1-5) и шаг (*/15, 0-30/10).
+    Как в vixie cron, если и день месяца, и день недели заданы не через «*», подходит любой
+    из них; поле, которое начинается с «*» (в том числе */2), ограничивает дни вместе с другим.
+    """
+
+    FIELDS = (("минута", 0, 59), ("час", 0, 23), ("день месяца", 1, 31), ("месяц", 1, 12), ("день недели", 0, 7))
+
+    def __init__(self, expression):
+        self.expression = CRON_MACROS.get(expression.strip().lower(), expression.strip())
+        parts = self.expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"В расписании должно быть 5 полей (минута час день месяц день_недели), получено {len(parts)}: `{expression}`")
+        fields = [self._parse_field(part, *field) for part, field in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = (values for values, _ in fields)
+        # 7 — тоже воскресенье
+        self.weekdays = {day % 7 for day in weekdays}
+        # Если заданы (не через «*») и день месяца, и день недели, подходит любой из них
+        self.any_day = not fields[2][1] and not fields[4][1]
+        self.minutes = sorted(self.minutes)
+        self.hours = sorted(self.hours)
+
+    @staticmethod
+    def _parse_field(text, name, low, high):
+        """(множество значений, начинается ли поле с «*»)"""
+        result = set()
+        for item in text.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                if not step_text.isdigit() or int(step_text) < 1:
+                    raise ValueError(f"Неверный шаг в поле «{name}»: `{text}`")
+                step = int(step_text)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start_text, end_text = item.split("-", 1)
+                if not (start_text.isdigit() and end_text.isdigit()):
+                    raise ValueError(f"Неверный диапазон в поле «{name}»: `{text}`")
+                start, end = int(start_text), int(end_text)
+            elif item.isdigit():
+                start = int(item)
+                end = high if step > 1 else start
+            else:
+                raise ValueError(f"Неверное значение в поле «{name}»: `{text}`")
+            if start < low or end > high or start > end:
+                raise ValueError(f"Поле «{name}» должно быть от {low} до {high}: `{text}`")
+            result.update(range(start, end + 1, step))
+        return result, text.startswith("*")
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        in_month = day.day in self.days
+        # weekday(): понедельник — 0, в cron понедельник — 1, воскресенье — 0
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        return (in_month or in_week) if self.any_day else (in_month and in_week)
+
+    def next_after(self, moment):
+        """Первый запуск строго после moment (datetime с часовым поясом, время считается в его поясе)"""
+        moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = moment.date()
+        for _ in range(CRON_SEARCH_DAYS):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.datetime(day.year, day.month, day.day, hour, minute, tzinfo=moment.tzinfo)
+                        if candidate >= moment:
+                            return candidate
+            day += datetime.timedelta(days=1)
+        return None
+
+
+def period_dates(period, moment):
+    """(первый день, последний день) периода для запуска в moment (даты в часовом поясе moment)"""
+    today = moment.date()
+    if period == "day":
+        start = end = today - datetime.timedelta(days=1)
+    elif period == "week":
+        end = today - datetime.timedelta(days=today.weekday() + 1)
+        start = end - datetime.timedelta(days=6)
+    elif period == "month":
+        end = today.replace(day=1) - datetime.timedelta(days=1)
+        start = end.replace(day=1)
+    else:
+        raise ValueError(f"Неизвестный период `{period}`. Доступные: {', '.join(PERIODS)}")
+    return start, end
+
+
+# === ПЛАНОВЫЙ ОТЧЁТ ===
+class ScheduledReport:
+    """Плановый отчёт: что считать, за какой период, куда отправить и когда"""
+
+    FIELDS = ("name", "guild_id", "post_channel_id", "target", "cron", "period", "reports", "created_by", "last_run")
+
+    def __init__(self, name, guild_id, post_channel_id, target, cron, period, reports, created_by=None, last_run=None):
+        self.name = name
+        self.guild_id = guild_id
+        self.post_channel_id = post_channel_id
+        self.target = target  # id канала или имя группы из PREDEFINED_GROUPS
+        self.cron = cron
+        self.period = period
+        self.reports = list(reports)
+        self.created_by = created_by
+        # Время последнего запуска (секунды UTC); без запусков — время создания
+        self.last_run = last_run
+        self.schedule = CronSchedule(cron)
+        if period not in PERIODS:
+            raise ValueError(f"Неизвестный период `{period}`. Доступные: {', '.join(PERIODS)}")
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def next_run(self, tz):
+        """Следующий запуск после последнего (может быть в прошлом, если бот был выключен)"""
+        last = datetime.datetime.fromtimestamp(self.last_run, datetime.timezone.utc).astimezone(tz)
+        return self.schedule.next_after(last)
+
+
+# === ПЛАНИРОВЩИК ===
+class ReportScheduler:
+    """
+    Расписание плановых отчётов в JSON-файле и фоновая задача, которая их запускает.
+
+    Время запуска считается в часовом поясе tz. Время последнего запуска сохраняется в файл
+    до выполнения отчёта, поэтому после перезапуска бота отчёт не повторяется, а пропущенный
+    за время простоя запуск выполняется один раз сразу после старта.
+    """
+
+    def __init__(self, path, tz, run_report):
+        self.path = path
+        self.tz = tz
+        self.run_report = run_report  # async run_report(ScheduledReport, момент запуска)
+        self.entries = {}  # {(guild_id, имя): ScheduledReport}
+        self._changed = asyncio.Event()
+        self._task = None
+        self._running = set()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f).get("schedules", [])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось прочитать расписание {self.path}: {e}")
+            return
+        for item in raw:
+            try:
+                entry = ScheduledReport(**item)
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Пропущен плановый отчёт {item.get('name')!r}: {e}")
+                continue
+            self.entries[(entry.guild_id, entry.name)] = entry
+        if self.entries:
+            print(f"🗓️ Плановых отчётов: {len(self.entries)} (часовой пояс {self.tz})")
+
+    def save(self):
+        """Записывает расписание атомарно (через временный файл)"""
+        data = {"schedules": [entry.to_dict() for entry in self.entries.values()]}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def for_guild(self, guild_id):
+        return [entry for (entry_guild, _), entry in self.entries.items() if entry_guild == guild_id]
+
+    def get(self, guild_id, name):
+        return self.entries.get((guild_id, name.lower()))
+
+    def add(self, entry):
+        entry.name = entry.name.lower()
+        if entry.last_run is None:
+            entry.last_run = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        self.entries[(entry.guild_id, entry.name)] = entry
+        self.save()
+        self._changed.set()
+
+    def remove(self, guild_id, name):
+        entry = self.entries.pop((guild_id, name.lower()), None)
+        if entry is not None:
+            self.save()
+            self._changed.set()
+        return entry
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="report-scheduler")
+
+    def trigger(self, entry, moment=None):
+        """Запускает отчёт в фоне (по расписанию или вручную)"""
+        moment = moment or datetime.datetime.now(self.tz)
+        task = asyncio.create_task(self._run_entry(entry, moment), name=f"schedule-{entry.name}")
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
+
+    async def _run_entry(self, entry, moment):
+        try:
+            await self.run_report(entry, moment)
+        except Exception as e:
+            print(f"🔥 ОШИБКА ПЛАНОВОГО ОТЧЁТА {entry.name}: {e}")
+
+    async def _run(self):
+        while True:
+            # Сбрасываем до просмотра расписания, чтобы не пропустить изменение во время него
+            self._changed.clear()
+            now = datetime.datetime.now(self.tz)
+            wake_at = now + datetime.timedelta(seconds=MAX_SLEEP)
+            due = []
+            for entry in list(self.entries.values()):
+                next_run = entry.next_run(self.tz)
+                if next_run is None:
+                    continue
+                if next_run <= now:
+                    due.append((entry, next_run))
+                else:
+                    wake_at = min(wake_at, next_run)
+            if due:
+                # Отмечаем запуск до выполнения: перезапуск бота не повторит отчёт
+                for entry, next_run in due:
+                    entry.last_run = now.timestamp()
+                self.save()
+                for entry, next_run in due:
+                    print(f"🗓️ Плановый отчёт {entry.name} (по расписанию на {next_run:%d-%m-%Y %H:%M})")
+                    self.trigger(entry, now)
+                continue
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=(wake_at - now).total_seconds())
+            except asyncio.TimeoutError:
+                pass
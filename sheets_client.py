@@ -0,0 +1,368 @@
+import bisect
+import random
+import socket
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+try:
+    import google_auth_httplib2
+except ImportError:  # устанавливается вместе с google-api-python-client
+    google_auth_httplib2 = None
+
+# Квота Sheets API: 60 запросов в минуту на пользователя (сервисный аккаунт) в проекте
+REQUESTS_PER_MINUTE = 60
+# Сколько запросов можно отправить подряд без ожидания
+BURST = 10
+# Повторы при 429 и 5xx: усечённая экспоненциальная задержка со случайным разбросом
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Таймаут одного HTTP-запроса (секунды)
+HTTP_TIMEOUT = 60
+# Границы корзин гистограммы задержек (секунды)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# === ОГРАНИЧЕНИЕ ЧАСТОТЫ ЗАПРОСОВ ===
+class TokenBucket:
+    """Потокобезопасное «ведро токенов»: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Забирает токен, при необходимости ожидая. Возвращает время ожидания (секунды)"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами (совместима с форматом Prometheus)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self):
+        """{"buckets": [(граница, накопленное количество)], "sum": ..., "count": ...}"""
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": self.total, "count": self.count}
+
+
+def is_retryable(error):
+    """Можно ли повторить запрос после этой ошибки"""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRY_STATUSES
+    return isinstance(error, (socket.timeout, ConnectionError, TimeoutError, httplib2.HttpLib2Error))
+
+
+def is_throttled(error):
+    """429: Google отклонил запрос по квоте, не выполнив его"""
+    return isinstance(error, HttpError) and error.resp.status == 429
+
+
+def retry_after(error):
+    """Задержка из заголовка Retry-After, если Google её прислал"""
+    if not isinstance(error, HttpError):
+        return None
+    try:
+        return float(error.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# === ТРАНСПОРТ GOOGLE SHEETS ===
+class SheetsTransport:
+    """
+    Выполнение запросов Sheets API.
+
+    У каждого потока своё HTTP-соединение (httplib2 не потокобезопасен), запросы проходят
+    через ведро токенов по квоте Sheets, а ответы 429/5xx и сетевые ошибки повторяются
+    с экспоненциальной задержкой и случайным разбросом. Счётчики повторов, ожиданий
+    и гистограммы задержек доступны через metrics().
+
+    api_endpoint позволяет направить запросы на локальный тестовый сервер
+    (тогда credentials можно не передавать).
+    """
+
+    def __init__(self, credentials=None, requests_per_minute=REQUESTS_PER_MINUTE, burst=BURST,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 api_endpoint=None, timeout=HTTP_TIMEOUT, sleep=time.sleep):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._sleep = sleep
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttle_wait = 0.0
+        self.backoff_wait = 0.0
+        self.bytes_sent = 0
+        self.latency = {}
+        # Импорт discovery занимает заметное время, поэтому он выполняется только при создании
+        # транспорта (в фоне после запуска бота). Документ API берётся из пакета, без запроса к Google
+        from googleapiclient.discovery import build
+        client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        self.service = build("sheets", "v4", http=self.http(), client_options=client_options,
+                             cache_discovery=False, static_discovery=True)
+
+    def http(self):
+        """HTTP-соединение текущего потока"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(timeout=self.timeout)
+            if self.credentials is not None:
+                http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=http)
+            self._local.http = http
+        return http
+
+    def spreadsheets(self):
+        return self.service.spreadsheets()
+
+    def execute(self, request, operation="request", idempotent=True):
+        """
+        Выполняет запрос googleapiclient с ограничением частоты и повторами.
+
+        idempotent=False (values.append): повторяется только ответ 429. После таймаута или 5xx
+        запрос мог дойти до Google, и повтор записал бы строки второй раз, поэтому ошибка
+        передаётся вызывающему (SheetsWriter повторит строки из спула, сверив ключи записи).
+        """
+        attempt = 0
+        size = len(request.body) if request.body else 0
+        while True:
+            waited = self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = request.execute(http=self.http())
+            except Exception as e:
+                self._observe(operation, time.perf_counter() - started, waited, size)
+                if attempt >= self.max_retries or not is_retryable(e) or not (idempotent or is_throttled(e)):
+                    with self._metrics_lock:
+                        self.failures += 1
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                with self._metrics_lock:
+                    self.retries += 1
+                    self.backoff_wait += delay
+                status = e.resp.status if isinstance(e, HttpError) else type(e).__name__
+                print(f"🔁 Google Sheets {operation}: {status}, повтор {attempt}/{self.max_retries} через {delay:.1f} сек")
+                self._sleep(delay)
+                continue
+            self._observe(operation, time.perf_counter() - started, waited, size)
+            return response
+
+    def _backoff_delay(self, attempt, error):
+        """Усечённая экспонента со случайным разбросом (full jitter), но не меньше Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        hinted = retry_after(error)
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.backoff_max))
+        return delay
+
+    def _observe(self, operation, seconds, waited, size):
+        with self._metrics_lock:
+            self.requests += 1
+            self.throttle_wait += waited
+            self.bytes_sent += size
+            histogram = self.latency.get(operation)
+            if histogram is None:
+                histogram = self.latency[operation] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def metrics(self):
+        """Счётчики транспорта для диагностики"""
+        with self._metrics_lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttle_wait_seconds": self.throttle_wait,
+                "backoff_wait_seconds": self.backoff_wait,
+                "bytes_sent": self.bytes_sent,
+                "latency": {operation: histogram.snapshot() for operation, histogram in self.latency.items()},
+            }
+
+
+# === КЭШ ЛИСТОВ ТАБЛИЦЫ ===
+class SheetRegistry:
+    """
+    Названия и sheetId листов таблицы.
+
+    Метаданные запрашиваются один раз и кэшируются; недостающие листы вместе с заголовками
+    создаются одним batchUpdate. Кэш сбрасывается только когда запись не нашла лист
+    (repair), поэтому команды не обращаются к spreadsheets().get при каждой записи.
+    """
+
+    def __init__(self, transport, spreadsheet_id, required_sheets):
+        self.transport = transport
+        self.spreadsheet_id = spreadsheet_id
+        # {название листа: строка заголовков}
+        self.required_sheets = required_sheets
+        self._sheets = None  # {название: sheetId}
+        self._lock = threading.Lock()
+
+    def sheets(self):
+        """{название листа: sheetId}, из кэша или из API"""
+        with self._lock:
+            return dict(self._load())
+
+    def _load(self):
+        if self._sheets is None:
+            spreadsheet = self.transport.execute(
+                self.transport.spreadsheets().get(
+                    spreadsheetId=self.spreadsheet_id,
+                    fields="sheets.properties(sheetId,title)"
+                ),
+                "spreadsheets.get"
+            )
+            self._sheets = {
+                sheet["properties"]["title"]: sheet["properties"]["sheetId"]
+                for sheet in spreadsheet.get("sheets", [])
+            }
+        return self._sheets
+
+    def invalidate(self):
+        with self._lock:
+            self._sheets = None
+
+    def ensure(self):
+        """Создаёт недостающие листы с заголовками. Возвращает список созданных листов"""
+        with self._lock:
+            try:
+                return self._create_missing()
+            except HttpError as e:
+                # Лист мог создать кто-то другой: перечитываем метаданные и пробуем ещё раз
+                if e.resp.status != 400 or "already exists" not in str(e):
+                    raise
+                self._sheets = None
+                return self._create_missing()
+
+    def repair(self):
+        """Запись не нашла лист: сбрасываем кэш и создаём недостающие листы"""
+        self.invalidate()
+        return self.ensure()
+
+    def fill_headers(self):
+        """
+        Дописывает недостающие заголовки в уже существующие листы (например, «Ключ записи»
+        в столбце J у листов, созданных до его появления). Заполняются только пустые ячейки
+        первой строки, одним batchUpdate. Возвращает список листов, где добавлены заголовки
+        """
+        with self._lock:
+            sheets = self._load()
+            titles = [title for title in self.required_sheets if title in sheets]
+            if not titles:
+                return []
+            response = self.transport.execute(
+                self.transport.spreadsheets().values().batchGet(
+                    spreadsheetId=self.spreadsheet_id,
+                    ranges=[f"{title}!1:1" for title in titles]
+                ),
+                "values.batchGet"
+            )
+            requests = []
+            updated = []
+            for title, value_range in zip(titles, response.get("valueRanges", [])):
+                row = (value_range.get("values") or [[]])[0]
+                for column, header in enumerate(self.required_sheets[title]):
+                    if column < len(row) and str(row[column]).strip():
+                        continue
+                    requests.append({
+                        "updateCells": {
+                            "start": {"sheetId": sheets[title], "rowIndex": 0, "columnIndex": column},
+                            "rows": [{"values": [{"userEnteredValue": {"stringValue": header}}]}],
+                            "fields": "userEnteredValue"
+                        }
+                    })
+                    if title not in updated:
+                        updated.append(title)
+            if requests:
+                self.transport.execute(
+                    self.transport.spreadsheets().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id,
+                        body={"requests": requests}
+                    ),
+                    "spreadsheets.batchUpdate"
+                )
+            return updated
+
+    def _create_missing(self):
+        sheets = self._load()
+        missing = [title for title in self.required_sheets if title not in sheets]
+        if not missing:
+            return []
+
+        used_ids = set(sheets.values())
+        requests = []
+        new_ids = {}
+        for title in missing:
+            sheet_id = random.randint(1, 2 ** 31 - 1)
+            while sheet_id in used_ids:
+                sheet_id = random.randint(1, 2 ** 31 - 1)
+            used_ids.add(sheet_id)
+            new_ids[title] = sheet_id
+            headers = self.required_sheets[title]
+            requests.append({
+                "addSheet": {
+                    "properties": {
+                        "sheetId": sheet_id,
+                        "title": title,
+                        "gridProperties": {
+                            "rowCount": 1000,
+                            "columnCount": max(10, len(headers))
+                        }
+                    }
+                }
+            })
+            requests.append({
+                "updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": header}} for header in headers]}],
+                    "fields": "userEnteredValue"
+                }
+            })
+
+        self.transport.execute(
+            self.transport.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"requests": requests}
+            ),
+            "spreadsheets.batchUpdate"
+        )
+        sheets.update(new_ids)
+        return missing
@@ -0,0 +1,120 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+-- Строки, которые ещё не записаны в Google Sheets. Последнее значение row_json — ключ записи
+CREATE TABLE IF NOT EXISTS pending_rows (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id     TEXT    NOT NULL,
+    range_name TEXT    NOT NULL,
+    row_key    TEXT    NOT NULL UNIQUE,
+    row_json   TEXT    NOT NULL,
+    created_at REAL    NOT NULL,
+    -- 1, если строку уже пытались отправить: перед повтором проверяется, не записана ли она
+    attempted  INTEGER NOT NULL DEFAULT 0,
+    -- Ошибка, из-за которой Google отклонил строку (такие строки больше не отправляются)
+    error      TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_pending_rows_error
+    ON pending_rows (error, id);
+"""
+
+
+# === СТРОКА ИЗ СПУЛА ===
+class SpooledRow:
+    """Строка, ожидающая записи в Google Sheets"""
+    __slots__ = ("id", "job_id", "range_name", "key", "values", "attempted")
+
+    def __init__(self, row_id, job_id, range_name, key, values, attempted):
+        self.id = row_id
+        self.job_id = job_id
+        self.range_name = range_name
+        self.key = key
+        self.values = values
+        self.attempted = attempted
+
+
+# === ЛОКАЛЬНЫЙ СПУЛ ЗАПИСИ В GOOGLE SHEETS ===
+class SheetsSpool:
+    """
+    Журнал строк для Google Sheets на SQLite.
+
+    Каждая строка сначала сохраняется на диск (коммит с fsync), и только потом отправляется,
+    поэтому ни ошибка API, ни перезапуск бота не теряют отчёты. К строке добавляется
+    ключ записи: по нему повтор отличает уже записанные строки от незаписанных.
+    Все методы синхронные: из корутин их вызывают через asyncio.to_thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: коммит не подтверждается, пока журнал не записан на диск
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, range_name, rows):
+        """Сохраняет строки одного задания. Возвращает идентификатор задания"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        params = []
+        for position, row in enumerate(rows):
+            key = f"{job_id}-{position}"
+            params.append((job_id, range_name, key, json.dumps(list(row) + [key], ensure_ascii=False), now))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO pending_rows (job_id, range_name, row_key, row_json, created_at) VALUES (?, ?, ?, ?, ?)",
+                    params
+                )
+        return job_id
+
+    def pending(self, limit):
+        """Первые limit строк, ожидающих записи (в порядке добавления)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, job_id, range_name, row_key, row_json, attempted FROM pending_rows "
+                "WHERE error IS NULL ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            SpooledRow(row_id, job_id, range_name, key, json.loads(row_json), bool(attempted))
+            for row_id, job_id, range_name, key, row_json, attempted in rows
+        ]
+
+    def mark_attempted(self, ids):
+        """Отмечает строки перед отправкой: если ответ не дойдёт, повтор сначала проверит таблицу"""
+        self._update("UPDATE pending_rows SET attempted = 1 WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def remove(self, ids):
+        """Удаляет записанные строки"""
+        self._update("DELETE FROM pending_rows WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def mark_failed(self, ids, error):
+        """Откладывает строки, которые Google отклонил: они остаются в файле, но не отправляются"""
+        self._update("UPDATE pending_rows SET error = ? WHERE id = ?", [(error, row_id) for row_id in ids])
+
+    def _update(self, sql, params):
+        if not params:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(sql, params)
+
+    def counts(self):
+        """{"pending": строк ожидает записи, "failed": строк отклонено}"""
+        with self._lock:
+            pending, failed = self._conn.execute(
+                "SELECT COUNT(*) - COUNT(error), COUNT(error) FROM pending_rows"
+            ).fetchone()
+        return {"pending": pending, "failed": failed}
@@ -0,0 +1,367 @@
+import asyncio
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+from googleapiclient.errors import HttpError
+
+import perf
+
+# Максимальное количество строк в одном запросе append
+APPEND_BATCH_SIZE = 1000
+
+# Окно накопления: сколько ждать новых заданий и сколько строк собирать перед записью
+FLUSH_INTERVAL = 2.0
+MAX_FLUSH_ROWS = 5000
+# Сколько строк отправлять одним объединённым запросом append
+MAX_ROWS_PER_REQUEST = 5000
+# Столбец с ключом записи: строки отчётов занимают A:I, ключ добавляется последним значением
+KEY_COLUMN = "J"
+# Пауза перед повторной отправкой строк из спула после ошибки (удваивается до максимума)
+RETRY_INTERVAL = 30.0
+RETRY_INTERVAL_MAX = 600.0
+
+
+def is_rejected(error):
+    """Google отклонил сами данные (400): повтор тех же строк не поможет"""
+    return isinstance(error, HttpError) and error.resp.status == 400 and "Unable to parse range" not in str(error)
+
+
+# === ЗАДАНИЕ НА ЗАПИСЬ В GOOGLE SHEETS ===
+class SheetsWriteJob:
+    """Строки одной команды в спуле и канал, куда сообщить о результате"""
+    __slots__ = ("job_id", "rows_left", "destination", "success_message", "sheets_recreated", "error_reported")
+
+    def __init__(self, job_id, rows_left, destination=None, success_message=None):
+        self.job_id = job_id
+        self.rows_left = rows_left
+        self.destination = destination
+        self.success_message = success_message
+        self.sheets_recreated = False
+        self.error_reported = False
+
+
+# === ФОНОВАЯ ЗАПИСЬ В GOOGLE SHEETS ===
+class SheetsWriter:
+    """
+    Очередь записи в Google Sheets.
+
+    Команды сохраняют строки в локальный спул (SheetsSpool) и сразу продолжают работу.
+    Один воркер забирает строки из спула и выполняет HTTP-запросы в пуле потоков,
+    поэтому цикл событий Discord не блокируется. Запросы идут через SheetsTransport
+    (квота, повторы при 429/5xx; append транспорт повторяет только при 429); в пуле
+    один поток, чтобы строки писались по порядку.
+
+    Строки, накопленные за короткое окно (по времени или по числу строк), объединяются:
+    строки каждого листа уходят одним большим append в порядке постановки в очередь.
+    Из спула строка удаляется только после успешной записи, поэтому при ошибке API или
+    перезапуске бота она будет отправлена позже. Ключ записи в столбце J не даёт повтору
+    записать строку дважды, если прошлый запрос всё-таки дошёл до Google.
+
+    Транспорт может появиться позже (attach): пока Google Sheets не подключён,
+    строки копятся в спуле и записываются после подключения.
+    """
+
+    def __init__(self, transport, spreadsheet_id, spool, ensure_sheets=None,
+                 flush_interval=FLUSH_INTERVAL, max_flush_rows=MAX_FLUSH_ROWS,
+                 retry_interval=RETRY_INTERVAL, retry_interval_max=RETRY_INTERVAL_MAX):
+        self.transport = transport
+        self.spreadsheet_id = spreadsheet_id
+        self.spool = spool
+        self.ensure_sheets = ensure_sheets
+        # Таблица не настроена: строки не сохраняются даже в спул
+        self.enabled = True
+        # Причина, по которой Google Sheets недоступен (для сообщений пользователям)
+        self.unavailable_reason = "подключение к Google Sheets ещё не завершено"
+        self.flush_interval = flush_interval
+        self.max_flush_rows = max_flush_rows
+        self.retry_interval = retry_interval
+        self.retry_interval_max = retry_interval_max
+        # Задания текущего запуска, ещё не записанные полностью: {job_id: SheetsWriteJob}
+        self._jobs = {}
+        self._queued_rows = 0
+        self._wakeup = None
+        self._idle = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-writer")
+        # Статистика объединения запросов и повторов
+        self.jobs_written = 0
+        self.rows_written = 0
+        self.api_requests = 0
+        self.requests_saved = 0
+        self.rows_deduplicated = 0
+
+    @property
+    def available(self):
+        return self.transport is not None
+
+    def attach(self, transport, ensure_sheets=None):
+        """Подключает транспорт после фоновой инициализации Google Sheets"""
+        self.transport = transport
+        if ensure_sheets is not None:
+            self.ensure_sheets = ensure_sheets
+        # Отправляем всё, что накопилось в спуле, пока таблица была недоступна
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def disable(self, reason):
+        """Таблица не настроена: команды работают только с Discord"""
+        self.enabled = False
+        self.unavailable_reason = reason
+
+    def start(self):
+        """Запускает воркер (вызывается внутри работающего цикла событий)"""
+        if self._task is None or self._task.done():
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+                self._idle = asyncio.Event()
+                self._idle.set()
+            # Строки, оставшиеся в спуле с прошлого запуска, отправляются сразу после подключения
+            self._wakeup.set()
+            self._task = asyncio.create_task(self._run(), name="sheets-writer")
+            backlog = self.spool.counts()
+            print(f"📤 Очередь записи в Google Sheets запущена (спул {self.spool.path}, окно {self.flush_interval} сек)")
+            if backlog["pending"]:
+                print(f"📥 В спуле {backlog['pending']} строк с прошлого запуска: будут записаны после подключения к таблице")
+
+    async def enqueue(self, range_name, values, destination=None, success_message=None):
+        """
+        Сохраняет строки в спул и ставит их на запись.
+        Возвращает False, если таблица не настроена и строки не будут записаны.
+        """
+        if not values:
+            return True
+        if not self.enabled:
+            await self._notify(destination, f"⚠️ Google Sheets недоступен ({self.unavailable_reason}): отчёт не сохранён в таблицу")
+            return False
+        if self._task is None:
+            self.start()
+        job_id = await asyncio.to_thread(self.spool.add, range_name, values)
+        self._jobs[job_id] = SheetsWriteJob(job_id, len(values), destination, success_message)
+        self._queued_rows += len(values)
+        self._idle.clear()
+        self._wakeup.set()
+        # Команда сообщает о недоступности один раз — с последним заданием (у него есть success_message)
+        if not self.available and success_message:
+            await self._notify(destination, f"⏳ Google Sheets недоступен ({self.unavailable_reason}): строки сохранены локально и будут записаны в таблицу после подключения")
+        return True
+
+    async def join(self):
+        """Ожидает, пока все задания текущего запуска будут записаны"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    def stats(self):
+        """Счётчики записи для диагностики"""
+        spooled = self.spool.counts()
+        return {
+            "jobs_written": self.jobs_written,
+            "rows_written": self.rows_written,
+            "api_requests": self.api_requests,
+            "requests_saved": self.requests_saved,
+            "rows_deduplicated": self.rows_deduplicated,
+            "queued": spooled["pending"],
+            "rejected": spooled["failed"],
+            "transport": self.transport.metrics() if self.available else None,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        delay = self.retry_interval
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self.available:
+                continue
+            # Собираем задания, пока не истекло окно или не набралось достаточно строк
+            deadline = loop.time() + self.flush_interval
+            while self._queued_rows < self.max_flush_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+            self._queued_rows = 0
+            try:
+                written = await self._drain()
+            except Exception as e:
+                print(f"\n🔥 ОШИБКА ОТПРАВКИ СПУЛА GOOGLE SHEETS: {e}")
+                written = False
+            if written:
+                delay = self.retry_interval
+                if not self._jobs:
+                    self._idle.set()
+                continue
+            # Строки остались в спуле: повторяем позже с растущей паузой
+            print(f"📥 Строки остаются в спуле, повтор записи в Google Sheets через {delay:.0f} сек")
+            loop.call_later(delay, self._wakeup.set)
+            delay = min(delay * 2, self.retry_interval_max)
+
+    async def _drain(self):
+        """Отправляет строки из спула пачками. Возвращает False, если запись прервалась ошибкой"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await asyncio.to_thread(self.spool.pending, self.max_flush_rows)
+            if not batch:
+                return True
+
+            # Группируем строки по листам, сохраняя порядок заданий
+            grouped = {}
+            for row in batch:
+                grouped.setdefault(row.range_name, []).append(row)
+
+            results = await loop.run_in_executor(self._executor, self._write_grouped, grouped)
+
+            jobs_in_batch = Counter(row.job_id for row in batch)
+            naive_requests = sum(-(-count // APPEND_BATCH_SIZE) for count in jobs_in_batch.values())
+            requests_made = sum(result[2] for result in results.values())
+            self.requests_saved += max(0, naive_requests - requests_made)
+            if len(jobs_in_batch) > 1:
+                print(f"📤 Google Sheets: {len(jobs_in_batch)} заданий, {len(batch)} строк → {requests_made} запросов (сэкономлено {max(0, naive_requests - requests_made)})")
+
+            failed = False
+            for range_name, rows in grouped.items():
+                error, sheets_recreated, _ = results[range_name]
+                if error is not None:
+                    failed = failed or not is_rejected(error)
+                    await self._report_error(range_name, rows, error)
+                    continue
+                self.rows_written += len(rows)
+                for job_id, count in Counter(row.job_id for row in rows).items():
+                    await self._rows_written(job_id, count, sheets_recreated)
+            if failed:
+                return False
+
+    async def _rows_written(self, job_id, count, sheets_recreated):
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Строки из спула прошлого запуска: сообщать некому
+            return
+        job.rows_left -= count
+        job.sheets_recreated = job.sheets_recreated or sheets_recreated
+        if job.rows_left > 0:
+            return
+        del self._jobs[job_id]
+        self.jobs_written += 1
+        if job.sheets_recreated:
+            await self._notify(job.destination, "❌ Ошибка записи в таблицу: отсутствуют необходимые листы. Листы созданы автоматически.")
+        if job.success_message:
+            await self._notify(job.destination, job.success_message)
+
+    def _write_grouped(self, grouped):
+        """Синхронная запись сгруппированных строк (выполняется в пуле потоков)"""
+        results = {}
+        for range_name, rows in grouped.items():
+            requests_before = self.api_requests
+            try:
+                with perf.span("sheets_write"):
+                    sheets_recreated = self._write_spooled(range_name, rows)
+                perf.count("sheets_rows", len(rows))
+                results[range_name] = (None, sheets_recreated, self.api_requests - requests_before)
+            except Exception as e:
+                if is_rejected(e):
+                    self.spool.mark_failed([row.id for row in rows], str(e))
+                results[range_name] = (e, False, self.api_requests - requests_before)
+        return results
+
+    def _write_spooled(self, range_name, rows):
+        """Записывает строки спула одного листа и удаляет их из спула"""
+        to_send = rows
+        if any(row.attempted for row in rows):
+            # Прошлая попытка могла дойти до Google: пропускаем строки, ключи которых уже в таблице
+            existing = self._existing_keys(range_name)
+            to_send = [row for row in rows if row.key not in existing]
+            self.rows_deduplicated += len(rows) - len(to_send)
+        self.spool.mark_attempted([row.id for row in to_send if not row.attempted])
+        sheets_recreated = self._write_rows(range_name, [row.values for row in to_send])
+        self.spool.remove([row.id for row in rows])
+        return sheets_recreated
+
+    def _existing_keys(self, range_name):
+        """Ключи записи, которые уже есть на листе"""
+        sheet = range_name.split("!", 1)[0]
+        self.api_requests += 1
+        try:
+            response = self.transport.execute(
+                self.transport.spreadsheets().values().get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{sheet}!{KEY_COLUMN}:{KEY_COLUMN}",
+                    majorDimension="COLUMNS"
+                ),
+                "values.get"
+            )
+        except HttpError as e:
+            # Листа нет — значит, и строк на нём нет
+            if "Unable to parse range" not in str(e):
+                raise
+            return set()
+        columns = response.get("values") or [[]]
+        return set(columns[0])
+
+    def _write_rows(self, range_name, values):
+        sheets_recreated = False
+        for i in range(0, len(values), MAX_ROWS_PER_REQUEST):
+            batch = values[i:i + MAX_ROWS_PER_REQUEST]
+            try:
+                self._append(range_name, batch)
+            except HttpError as e:
+                if "Unable to parse range" not in str(e) or self.ensure_sheets is None:
+                    raise
+                # Кэш листов устарел: ensure_sheets пересоздаёт недостающие листы
+                if self.ensure_sheets():
+                    sheets_recreated = True
+                self._append(range_name, batch)
+        return sheets_recreated
+
+    def _append(self, range_name, values):
+        self.api_requests += 1
+        self.transport.execute(
+            self.transport.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=range_name,
+                valueInputOption="USER_ENTERED",
+                body={"values": values}
+            ),
+            "values.append",
+            idempotent=False
+        )
+
+    async def _report_error(self, range_name, rows, error):
+        rejected = is_rejected(error)
+        if isinstance(error, HttpError):
+            try:
+                error_content = json.loads(error.content.decode('utf-8'))
+            except (AttributeError, ValueError):
+                error_content = str(error)
+            print(f"Google Sheets API error: {error_content}")
+            print(f"Request details: {error.uri}")
+        else:
+            print(f"\n🔥 ОШИБКА ЗАПИСИ В GOOGLE SHEETS ({range_name}): {error}")
+        if rejected:
+            print(f"⚠️ Google отклонил {len(rows)} строк ({range_name}): они отложены в спуле {self.spool.path} и больше не отправляются")
+            text = f"⚠️ Ошибка при сохранении в Google Sheets: `{str(error)}`"
+        else:
+            text = f"⚠️ Ошибка при сохранении в Google Sheets: `{str(error)}`. Строки сохранены локально, запись будет повторена автоматически."
+
+        for job_id in dict.fromkeys(row.job_id for row in rows):
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            if rejected:
+                del self._jobs[job_id]
+            elif job.error_reported:
+                continue
+            job.error_reported = True
+            await self._notify(job.destination, text)
+
+    async def _notify(self, destination, text):
+        if destination is None:
+            return
+        try:
+            await destination.send(text)
+        except discord.HTTPException as e:
+            print(f"⚠️ Не удалось отправить уведомление о записи в Google Sheets: {e}")
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import time
+
+# Файл словарей по умолчанию лежит рядом с ботом
+DEFAULT_STAFF_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "staff_keywords.json")
+
+# Как часто проверять, изменился ли файл словарей (секунды)
+RELOAD_CHECK_INTERVAL = 5.0
+
+# Сколько разных слов запоминать в кэше разбора слов
+TOKEN_CACHE_SIZE = 50_000
+
+WORD_RE = re.compile(r"\w+")
+
+# === СЛОВАРИ ===
+# Термин с «*» на конце — основа: совпадает с любой формой слова, начинающейся с неё.
+# Термин с «!» в начале — исключение: слово, совпавшее с более длинной основой-исключением, не учитывается.
+# Термин из нескольких слов — фраза: слова должны идти подряд.
+CATEGORY_FIELDS = ("label", "title", "top_title", "empty", "terms")
+
+
+def load_categories(path):
+    """Читает категории из JSON-файла словарей и проверяет, что у каждой есть все поля"""
+    with open(path, encoding="utf-8") as f:
+        categories = json.load(f)["categories"]
+    for name, category in categories.items():
+        for field in CATEGORY_FIELDS:
+            if field not in category:
+                raise ValueError(f"в категории '{name}' нет поля '{field}'")
+    return categories
+
+
+# Словари по умолчанию — файл, который поставляется вместе с ботом
+DEFAULT_STAFF_KEYWORDS = load_categories(DEFAULT_STAFF_KEYWORDS_PATH)
+
+
+def normalize(text):
+    """Приводит текст к нижнему регистру и заменяет «ё» на «е»"""
+    return text.lower().replace("ё", "е")
+
+
+# === КЛАССИФИКАТОР СООБЩЕНИЙ ПО КЛЮЧЕВЫМ СЛОВАМ ===
+class KeywordClassifier:
+    """
+    Определяет все категории сообщения за один проход.
+
+    Слова терминов собираются в префиксное дерево по буквам: для каждого слова сообщения
+    дерево проходится один раз, и находятся все основы и точные слова, которые ему подходят
+    (побеждает самая длинная основа, поэтому исключения перекрывают более короткие основы).
+    Фразы собираются во второе дерево по словам. Время разбора зависит от длины сообщения,
+    а не от размера словарей, а результаты разбора слов кэшируются.
+    """
+
+    def __init__(self, categories):
+        self.categories = tuple(categories)
+        self._word_ids = {}
+        self._char_trie = {}
+        self._phrase_trie = {}
+        self._token_cache = {}
+        for name, terms in categories.items():
+            for term in terms:
+                self._add_term(name, term)
+
+    def _word_id(self, word):
+        """Регистрирует слово термина в дереве букв и возвращает его номер"""
+        is_prefix = word.endswith("*")
+        stem = word.rstrip("*")
+        key = (stem, is_prefix)
+        if key not in self._word_ids:
+            word_id = len(self._word_ids)
+            self._word_ids[key] = word_id
+            node = self._char_trie
+            for char in stem:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append((word_id, is_prefix))
+        return self._word_ids[key]
+
+    def _add_term(self, category, term):
+        term = normalize(term.strip())
+        if not term:
+            return
+        if term.startswith("!"):
+            # Исключение: отмечаем основу, ни к какой категории она не относится
+            stem = term[1:].rstrip("*")
+            node = self._char_trie
+            for char in stem:
+                node = node.setdefault(char, {})
+            node["!"] = True
+            return
+        node = self._phrase_trie
+        for word in term.split():
+            node = node.setdefault(self._word_id(word), {})
+        node.setdefault(None, set()).add(category)
+
+    def _token_ids(self, token):
+        """Номера слов словаря, которым подходит слово сообщения"""
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+        matches = []
+        node = self._char_trie
+        length = len(token)
+        for depth in range(length + 1):
+            if "!" in node:
+                # Более длинная основа-исключение отменяет более короткие совпадения
+                matches = []
+            for word_id, is_prefix in node.get(None, ()):
+                if is_prefix or depth == length:
+                    matches.append(word_id)
+            if depth == length:
+                break
+            node = node.get(token[depth])
+            if node is None:
+                break
+        ids = tuple(matches)
+        if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+            self._token_cache.clear()
+        self._token_cache[token] = ids
+        return ids
+
+    def classify(self, text):
+        """Возвращает множество категорий, термины которых есть в тексте"""
+        found = set()
+        active = ()
+        root = self._phrase_trie
+        cache = self._token_cache
+        for token in WORD_RE.findall(normalize(text)):
+            # Большинство слов уже в кэше: обходимся без вызова метода
+            ids = cache.get(token)
+            if ids is None:
+                ids = self._token_ids(token)
+            if not ids:
+                active = ()
+                continue
+            next_active = []
+            for node in (root, *active) if active else (root,):
+                for word_id in ids:
+                    child = node.get(word_id)
+                    if child is None:
+                        continue
+                    categories = child.get(None)
+                    if categories:
+                        found.update(categories)
+                    next_active.append(child)
+            if len(found) == len(self.categories):
+                break
+            active = next_active
+        return found
+
+
+# === СЛОВАРИ С ГОРЯЧЕЙ ПЕРЕЗАГРУЗКОЙ ===
+class StaffKeywordDictionary:
+    """
+    Категории кадровых сообщений из JSON-файла.
+
+    Скомпилированный классификатор кэшируется и пересобирается только когда файл изменился
+    (проверка не чаще раза в RELOAD_CHECK_INTERVAL секунд), поэтому словари можно править
+    без перезапуска бота. Если файл некорректен, продолжает работать предыдущая версия.
+    """
+
+    def __init__(self, path=DEFAULT_STAFF_KEYWORDS_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.categories = DEFAULT_STAFF_KEYWORDS
+        self.classifier = KeywordClassifier(self._terms(DEFAULT_STAFF_KEYWORDS))
+        self._signature = None
+        self._last_check = 0.0
+        self.reload(force=True)
+
+    @staticmethod
+    def _terms(categories):
+        return {name: category["terms"] for name, category in categories.items()}
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force=False):
+        """Перечитывает файл, если он изменился. Возвращает True при перезагрузке"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        if signature is None:
+            print(f"⚠️ Файл словарей {self.path} не найден, используются словари по умолчанию")
+            self.categories = DEFAULT_STAFF_KEYWORDS
+            self.classifier = KeywordClassifier(self._terms(DEFAULT_STAFF_KEYWORDS))
+            return True
+
+        try:
+            categories = load_categories(self.path)
+            classifier = KeywordClassifier(self._terms(categories))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Ошибка в файле словарей {self.path}: {e}. Продолжаю работу с предыдущей версией")
+            return False
+
+        self.categories = categories
+        self.classifier = classifier
+        terms = sum(len(category["terms"]) for category in categories.values())
+        print(f"📚 Словари кадровых сообщений загружены: {len(categories)} категорий, {terms} терминов")
+        return True
+
+    def get(self):
+        """Возвращает (категории, классификатор), при необходимости перезагрузив файл"""
+        self.reload()
+        return self.categories, self.classifier
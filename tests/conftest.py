@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# === ЛОКАЛЬНЫЙ ФЕЙКОВЫЙ SHEETS API ===
+class FakeSheetsServer:
+    """
+    HTTP-сервер, отвечающий на запросы Sheets API v4 (values.append и values.get).
+
+    Строки append сохраняются в rows; append_delay задерживает ответ на append;
+    в scripted можно положить ответы (статус, заголовки), которые отдаются первыми.
+    Если lose_append_responses > 0, столько append записываются, но отвечают 503
+    (запрос дошёл до Google, а ответ потерян).
+    Листы таблицы — в sheets ({название: sheetId}), их первые строки — в header_rows;
+    тела запросов batchUpdate сохраняются в batch_updates.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.sheets = {}
+        self.header_rows = {}
+        self.batch_updates = []
+        self.requests = []  # [(метод, путь, время начала, время конца)]
+        self.append_delay = 0.0
+        self.scripted = []
+        self.lose_append_responses = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def appends(self):
+        return [request for request in self.requests if request[0] == "POST" and request[1].endswith(":append")]
+
+    def _handle(self, handler, method):
+        started = time.monotonic()
+        path = unquote(urlparse(handler.path).path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = json.loads(handler.rfile.read(length) or b"{}") if length else {}
+        with self._lock:
+            scripted = self.scripted.pop(0) if self.scripted else None
+        if scripted is not None:
+            status, headers = scripted
+            payload = {"error": {"code": status, "message": "scripted", "status": "UNAVAILABLE"}}
+        elif method == "POST" and path.endswith(":append"):
+            time.sleep(self.append_delay)
+            with self._lock:
+                self.rows.extend(body.get("values", []))
+                lost = self.lose_append_responses > 0
+                self.lose_append_responses -= lost
+            status, headers = (503, {}) if lost else (200, {})
+            payload = {"updates": {"updatedRows": len(body.get("values", []))}}
+        elif method == "GET" and path.endswith("/values:batchGet"):
+            ranges = parse_qs(urlparse(handler.path).query).get("ranges", [])
+            status, headers = 200, {}
+            payload = {"valueRanges": [
+                {"range": cell_range, "values": [self.header_rows[cell_range.split("!")[0]]]}
+                if self.header_rows.get(cell_range.split("!")[0]) else {"range": cell_range}
+                for cell_range in ranges
+            ]}
+        elif method == "POST" and path.endswith(":batchUpdate"):
+            with self._lock:
+                self.batch_updates.append(body)
+            status, headers = 200, {}
+            payload = {}
+        elif method == "GET" and "/values/" in path:
+            # Столбец ключей записи (majorDimension=COLUMNS): последнее значение каждой строки
+            with self._lock:
+                keys = [row[-1] for row in self.rows]
+            status, headers = 200, {}
+            payload = {"values": [keys]} if keys else {}
+        elif method == "GET":
+            status, headers = 200, {}
+            payload = {"sheets": [{"properties": {"sheetId": sheet_id, "title": title}} for title, sheet_id in self.sheets.items()]}
+        else:
+            status, headers = 200, {}
+            payload = {}
+        # Запрос учитывается до ответа: клиент может проверить requests сразу после execute
+        with self._lock:
+            self.requests.append((method, path, started, time.monotonic()))
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_sheets():
+    server = FakeSheetsServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+# === МОДУЛЬ БОТА С БАЗАМИ ВО ВРЕМЕННОМ КАТАЛОГЕ ===
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    """bot.py импортируется один раз за запуск: индекс, спул, config.json и расписание — во временном каталоге"""
+    tmp = tmp_path_factory.mktemp("bot")
+    os.environ.update({
+        "MESSAGE_STORE_PATH": str(tmp / "messages.db"),
+        "SHEETS_SPOOL_PATH": str(tmp / "spool.db"),
+        "CONFIG_PATH": str(tmp / "config.json"),
+        "SCHEDULE_PATH": str(tmp / "schedules.json"),
+    })
+    os.environ.pop("METRICS_PORT", None)
+    import bot
+    return bot
@@ -0,0 +1,34 @@
+"""Общие данные для проверки словарей кадровых сообщений (тесты и bench.py keywords)"""
+import re
+
+
+def classify_per_keyword(text, categories):
+    """Прежний способ: отдельный re.search для каждого ключевого слова"""
+    content_lower = text.lower()
+    return {
+        name for name, keywords in categories.items()
+        if any(re.search(rf'\b{re.escape(keyword)}\b', content_lower) for keyword in keywords)
+    }
+
+
+# Списки, которые раньше были зашиты в staff_analysis (все формы слов перечислены вручную)
+LEGACY_STAFF_KEYWORDS = {
+    "hired": ["принят", "принята", "принято", "приняты", "оформлен", "оформлена", "трудоустроен", "трудоустроена", "принял контракт", "заключил контракт"],
+    "fired": ["уволен", "уволена", "уволено", "уволены", "увольнение", "уволен по собственному", "уволен за нарушение", "расторг контракт", "прекратил контракт"],
+    "promoted": ["повышен", "повышение", "получил звание", "награжден званием", "присвоено звание", "повышен в звании", "предоставлено звание", "награжден повышением", "присвоено очередное звание", "награжден званием"],
+}
+
+# Фразы, которые словари по умолчанию должны (или не должны) относить к категориям
+STAFF_REGRESSION_CASES = [
+    ("Иванов принят на должность водителя", {"hired"}),
+    ("Петрова принята в отдел кадров", {"hired"}),
+    ("Сидоров оформлен по контракту", {"hired"}),
+    ("Принятые меры доложены руководству", set()),
+    ("Принятое решение обжалованию не подлежит", set()),
+    ("Принятие присяги в субботу", set()),
+    ("Оформленные документы переданы в архив", set()),
+    ("Оформление пропусков до пятницы", set()),
+    ("Сидоров уволен по собственному желанию", {"fired"}),
+    ("Повышенная нагрузка на смене", set()),
+    ("Иванову присвоено очередное звание", {"promoted"}),
+]
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+
+class FakeContext:
+    """Контекст команды без Discord: запоминает отправленные сообщения"""
+
+    def __init__(self, content):
+        self.message = SimpleNamespace(content=content, clean_content=content)
+        self.guild = SimpleNamespace(id=1, name="сервер")
+        self.author = SimpleNamespace(display_name="офицер")
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+        return SimpleNamespace(edit=self._edit)
+
+    async def _edit(self, content=None, **kwargs):
+        pass
+
+
+def parse_arguments(bot_module, command, content):
+    """Разбирает аргументы команды так же, как discord.py при вызове"""
+    message = SimpleNamespace(
+        content=content, guild=None, author=None, channel=None, attachments=[],
+        mentions=[], channel_mentions=[], role_mentions=[], _state=None
+    )
+    view = StringView(content)
+    view.skip_string(bot_module.COMMAND_PREFIX)
+    view.get_word()
+    ctx = commands.Context(message=message, bot=bot_module.bot, view=view, prefix=bot_module.COMMAND_PREFIX, command=command)
+
+    async def parse():
+        await command._parse_arguments(ctx)
+        return ctx.args[1:]
+
+    return asyncio.run(parse())
+
+
+def run_images(bot_module, monkeypatch, content):
+    """Вызывает !images до поиска канала (канал не найден) и возвращает ответы бота"""
+    def resolve_channels(guild, channel):
+        raise LookupError("канал не найден")
+
+    monkeypatch.setattr(bot_module, "resolve_channels", resolve_channels)
+    ctx = FakeContext(content)
+    args = parse_arguments(bot_module, bot_module.images, content)
+    asyncio.run(bot_module.images.callback(ctx, *args))
+    return ctx.sent
+
+
+def test_images_accepts_legacy_limit_with_notice(bot_module, monkeypatch):
+    """`!images #канал 01-01-2026 07-01-2026 100` по-прежнему разбирается, limit игнорируется с пояснением"""
+    sent = run_images(bot_module, monkeypatch, "!images media 01-01-2026 07-01-2026 100")
+    assert "limit" in sent[0] and "`100`" in sent[0]
+    assert sent[-1] == "❌ канал не найден"
+
+
+@pytest.mark.parametrize("content", [
+    "!images media 01-01-2026 07-01-2026",
+    "!images media 01-01-2026 07-01-2026 --fresh",
+    "!images media 01-01-2026 --fresh",
+])
+def test_images_without_limit_has_no_notice(bot_module, monkeypatch, content):
+    sent = run_images(bot_module, monkeypatch, content)
+    assert sent == ["❌ канал не найден"]
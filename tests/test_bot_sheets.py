@@ -0,0 +1,31 @@
+import asyncio
+
+from sheets_spool import SheetsSpool
+from sheets_writer import SheetsWriter
+
+
+class FakeDestination:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+def test_invalid_credentials_disable_the_writer(bot_module, monkeypatch, tmp_path):
+    """С ошибкой в GOOGLE_CREDENTIALS_JSON строки не копятся в спуле, а пользователь видит причину"""
+    writer = SheetsWriter(None, "sheet", SheetsSpool(str(tmp_path / "spool.db")))
+    monkeypatch.setattr(bot_module, "sheets_writer", writer)
+    monkeypatch.setattr(bot_module, "SHEET_ID", "sheet")
+    monkeypatch.setattr(bot_module, "GOOGLE_CREDENTIALS_JSON", "{not json")
+    destination = FakeDestination()
+
+    async def scenario():
+        await bot_module.init_google_sheets()
+        return await writer.enqueue("Activity!A:J", [["a"]], destination=destination, success_message="ok")
+
+    assert asyncio.run(scenario()) is False
+    assert not writer.enabled
+    assert writer.spool.counts()["pending"] == 0
+    assert "ошибка в GOOGLE_CREDENTIALS_JSON" in destination.sent[0]
+    writer.spool.close()
@@ -0,0 +1,42 @@
+import logging
+
+import pytest
+
+from history import AdaptiveConcurrency, RateLimitListener
+
+# Так discord.http пишет в лог про 429
+RETRY_FORMAT = "We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds."
+API = "https://discord.com/api/v10"
+
+
+@pytest.fixture
+def listener():
+    concurrency = AdaptiveConcurrency(8)
+    handler = RateLimitListener(concurrency)
+    logger = logging.getLogger("discord.http")
+    logger.addHandler(handler)
+    yield concurrency
+    logger.removeHandler(handler)
+
+
+@pytest.mark.parametrize("url", [
+    f"{API}/channels/123/messages?limit=100&after=456",
+    f"{API}/channels/123/messages",
+])
+def test_history_429_halves_concurrency(listener, url):
+    logging.getLogger("discord.http").warning(RETRY_FORMAT, "GET", url, 1.5)
+    assert listener.limit == 4
+    assert listener.rate_limited == 1
+
+
+@pytest.mark.parametrize("method, url", [
+    ("POST", f"{API}/channels/123/messages"),
+    ("PUT", f"{API}/channels/123/messages/456/reactions/%F0%9F%91%8D/@me"),
+    ("GET", f"{API}/channels/123/messages/456"),
+    ("PATCH", f"{API}/channels/123/messages/456"),
+    ("GET", f"{API}/guilds/123/members?limit=1000"),
+])
+def test_other_routes_are_ignored(listener, method, url):
+    logging.getLogger("discord.http").warning(RETRY_FORMAT, method, url, 1.5)
+    assert listener.limit == 8
+    assert listener.rate_limited == 0
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import JobManager, QUEUED, RUNNING
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.contents = [content]
+
+    async def edit(self, content=None, **kwargs):
+        self.contents.append(content)
+
+
+class FakeContext:
+    """Канал сервера guild_id: запоминает отправленные сообщения о ходе задач"""
+
+    def __init__(self, guild_id=1):
+        self.guild = SimpleNamespace(id=guild_id)
+        self.author = SimpleNamespace(display_name="офицер")
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+
+async def hold(manager, ctx, release, started=None):
+    """Задача отчёта, которая выполняется до события release"""
+    async with manager.run(ctx, "отчёт") as job:
+        if started is not None:
+            started.append(job)
+        await release.wait()
+
+
+def test_jobs_over_the_guild_limit_wait_in_order():
+    async def scenario():
+        manager = JobManager(per_guild=1, progress_interval=60)
+        ctx, other_guild = FakeContext(1), FakeContext(2)
+        release = asyncio.Event()
+        started = []
+        tasks = [asyncio.create_task(hold(manager, ctx, release, started)) for _ in range(2)]
+        tasks.append(asyncio.create_task(hold(manager, other_guild, release, started)))
+        await asyncio.sleep(0.01)
+
+        # Второй отчёт сервера 1 ждёт, отчёт сервера 2 выполняется сразу
+        assert [job.guild_id for job in started] == [1, 2]
+        assert [job.state for job in manager.for_guild(1)] == [RUNNING, QUEUED]
+        assert len(ctx.sent) == 1 and "в очереди" in ctx.sent[0].contents[0]
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert [job.guild_id for job in started] == [1, 2, 1]
+        assert manager.jobs == {}
+        # Сообщение ожидавшей задачи в конце заменено итогом
+        assert "завершена" in ctx.sent[0].contents[-1]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_cancel_running_and_queued_jobs(queued):
+    async def scenario():
+        manager = JobManager(per_guild=1, progress_interval=60)
+        ctx = FakeContext()
+        release = asyncio.Event()
+        blocker = asyncio.create_task(hold(manager, ctx, release)) if queued else None
+        await asyncio.sleep(0)
+        task = asyncio.create_task(hold(manager, ctx, release))
+        await asyncio.sleep(0.01)
+
+        job = manager.for_guild(1)[-1]
+        assert job.state == (QUEUED if queued else RUNNING)
+        assert manager.get(2, job.id) is None  # задачи другого сервера не видны
+        manager.get(1, job.id).cancel(ctx.author)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert job.id not in manager.jobs
+        if queued:
+            assert "отменена (офицер)" in ctx.sent[0].contents[-1]
+            release.set()
+            await blocker
+
+    asyncio.run(scenario())
+
+
+def test_progress_is_edited_at_most_once_per_interval_and_only_on_change():
+    async def scenario():
+        manager = JobManager(per_guild=1, progress_interval=0.05)
+        ctx = FakeContext()
+        async with manager.run(ctx, "отчёт") as job:
+            # Текст не меняется: сообщение отправляется один раз и не правится
+            await asyncio.sleep(0.3)
+            assert len(ctx.sent) == 1 and len(ctx.sent[0].contents) == 1
+            # Ход меняется чаще интервала: правок не больше, чем прошло интервалов
+            started = time.monotonic()
+            for _ in range(20):
+                job.advance("scan", 0, scanned=10)
+                await asyncio.sleep(0.01)
+            intervals = (time.monotonic() - started) / manager.progress_interval
+            edits = len(ctx.sent[0].contents) - 1
+            assert 1 <= edits <= intervals + 1
+        assert "просмотрено 200 сообщ." in ctx.sent[0].contents[-1]
+
+    asyncio.run(scenario())
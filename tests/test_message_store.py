@@ -0,0 +1,125 @@
+import random
+import sqlite3
+
+from message_store import MessageStore, DAY_SECONDS, STORE_VERSION
+
+GUILD = 10
+CHANNELS = (1, 2)
+START = 20000 * DAY_SECONDS
+
+
+def make_row(channel_id, message_id, author_id, created_at, content, images=0, others=0, is_bot=0, guild_id=GUILD, name=None):
+    row = (channel_id, message_id, guild_id, author_id, name or f"user{author_id}", is_bot, created_at, content)
+    types = ["image/png"] * images + ["application/pdf"] * others
+    attachments = [
+        (channel_id, message_id, position, f"https://cdn/{message_id}/{position}", content_type)
+        for position, content_type in enumerate(types)
+    ]
+    return row, attachments
+
+
+def rollups(store):
+    """Сводки без пустых строк (полный пересчёт оставляет строки с нулём за дни без сообщений)"""
+    days = store._conn.execute(
+        "SELECT channel_id, day, messages, images, links FROM daily_rollups WHERE messages > 0 ORDER BY 1, 2"
+    ).fetchall()
+    users = store._conn.execute(
+        "SELECT channel_id, day, author_id, messages, images FROM daily_user_rollups ORDER BY 1, 2, 3"
+    ).fetchall()
+    return days, users
+
+
+def rebuilt(store):
+    """Сводки, посчитанные заново из сообщений"""
+    days = store._conn.execute(
+        f"SELECT DISTINCT channel_id, CAST(created_at / {DAY_SECONDS} AS INTEGER) FROM messages"
+    ).fetchall()
+    with store._conn:
+        store._conn.execute("DELETE FROM daily_rollups")
+        store._conn.execute("DELETE FROM daily_user_rollups")
+        store._rebuild_rollups(days)
+    return rollups(store)
+
+
+def test_incremental_rollups_match_full_recompute(tmp_path):
+    store = MessageStore(str(tmp_path / "messages.db"))
+    rng = random.Random(4)
+    known = []
+
+    def random_message(message_id):
+        return make_row(
+            rng.choice(CHANNELS), message_id, rng.randrange(5), START + rng.uniform(0, 3 * DAY_SECONDS),
+            rng.choice(["текст", "см. https://example.com", "http://x"]),
+            images=rng.choice([0, 0, 1, 3]), others=rng.choice([0, 1]), is_bot=int(rng.random() < 0.1)
+        )
+
+    # История: пачки новых сообщений и повторная загрузка уже сохранённых
+    for batch_start in range(0, 300, 50):
+        batch = [random_message(message_id) for message_id in range(batch_start, batch_start + 50)]
+        known.extend(batch)
+        store.save_messages(batch)
+    store.save_messages(rng.sample(known, 40) + [known[0], known[0]])
+
+    # Живые события: новые сообщения, правки текста и вложений, удаления (в том числе уже удалённых)
+    for round_start in range(1000, 1100, 20):
+        rows = [random_message(message_id) for message_id in range(round_start, round_start + 20)]
+        known.extend(rows)
+        edits = []
+        for row, _ in rng.sample(known, 15):
+            attachments = rng.choice([None, [], [("https://cdn/a", "image/jpeg"), ("https://cdn/b", "IMAGE/PNG")]])
+            content = rng.choice([None, "без ссылок", "https://example.com"])
+            edits.append((row[0], row[1], content, attachments))
+        deletes = [(row[0], row[1]) for row, _ in rng.sample(known, 10)]
+        store.apply_live_batch(rows, edits, deletes)
+
+    incremental = rollups(store)
+    assert incremental[0]
+    assert incremental == rebuilt(store)
+    store.close()
+
+
+def test_deleted_author_leaves_user_rollups(tmp_path):
+    store = MessageStore(str(tmp_path / "messages.db"))
+    store.save_messages([make_row(1, 1, 7, START, "https://a", images=2), make_row(1, 2, 8, START + 60, "текст")])
+    store.apply_live_batch([], [], [(1, 1)])
+
+    days, users = rollups(store)
+    assert days == [(1, START // DAY_SECONDS, 1, 0, 0)]
+    assert users == [(1, START // DAY_SECONDS, 8, 1, 0)]
+    store.close()
+
+
+def test_author_names_are_kept_per_guild(tmp_path):
+    """Ник автора на одном сервере не подменяет его ник на другом"""
+    store = MessageStore(str(tmp_path / "messages.db"))
+    store.save_messages([make_row(1, 1, 7, START, "текст", guild_id=100, name="Иван")])
+    store.save_messages([make_row(2, 2, 7, START, "текст", guild_id=200, name="Ivan")])
+
+    day = START // DAY_SECONDS
+    assert store.activity_summary(100, 1, day, day + 1)[1] == [(7, "Иван", 1, 0)]
+    assert store.activity_summary(200, 2, day, day + 1)[1] == [(7, "Ivan", 1, 0)]
+    store.close()
+
+
+def test_migrates_global_author_names(tmp_path):
+    """База прошлой версии: таблица authors без сервера пересобирается из сообщений"""
+    path = str(tmp_path / "messages.db")
+    store = MessageStore(path)
+    store.save_messages([
+        make_row(1, 1, 7, START, "текст", guild_id=100, name="Иван"),
+        make_row(2, 2, 7, START + 60, "текст", guild_id=200, name="Ivan"),
+    ])
+    store.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DROP TABLE authors")
+        conn.execute("CREATE TABLE authors (author_id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("INSERT INTO authors VALUES (7, 'Ivan')")
+        conn.execute("PRAGMA user_version = 2")
+    conn.close()
+
+    store = MessageStore(path)
+    day = START // DAY_SECONDS
+    assert store.activity_summary(100, 1, day, day + 1)[1] == [(7, "Иван", 1, 0)]
+    assert store._conn.execute("PRAGMA user_version").fetchone()[0] == STORE_VERSION
+    store.close()
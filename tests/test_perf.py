@@ -0,0 +1,37 @@
+import asyncio
+import socket
+import threading
+import urllib.request
+
+import perf
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_scrape_reads_the_spool_off_the_event_loop(bot_module, monkeypatch):
+    """/metrics читает счётчики спула в потоке: цикл событий бота не блокируется"""
+    threads = []
+    real_stats = bot_module.sheets_writer.stats
+
+    def stats():
+        threads.append(threading.current_thread())
+        return real_stats()
+
+    monkeypatch.setattr(bot_module.sheets_writer, "stats", stats)
+    port = free_port()
+
+    async def scenario():
+        runner = await perf.start_metrics_server("127.0.0.1", port, bot_module.render_metrics)
+        try:
+            url = f"http://127.0.0.1:{port}/metrics"
+            return await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=5).read().decode("utf-8"))
+        finally:
+            await runner.cleanup()
+
+    text = asyncio.run(scenario())
+    assert "discord_bot_sheets_queued_rows" in text
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
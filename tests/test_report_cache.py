@@ -0,0 +1,175 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import report_cache
+from report_cache import ReportCache
+from reports import ActivityStats
+
+
+class Result:
+    """Накопитель с заданным весом"""
+
+    def __init__(self, weight=1):
+        self._weight = weight
+
+    def weight(self):
+        return self._weight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(report_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_is_evicted():
+    cache = ReportCache(max_entries=2)
+    cache.put("a", Result(), open_range=False)
+    cache.put("b", Result(), open_range=False)
+    assert cache.get("a") is not None  # «a» запрошен позже «b»
+    cache.put("c", Result(), open_range=False)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_eviction_by_total_weight():
+    """Большой результат вытесняет несколько маленьких, результат тяжелее лимита не сохраняется"""
+    cache = ReportCache(max_entries=10, max_weight=100)
+    for key in "abc":
+        cache.put(key, Result(30), open_range=False)
+    assert cache.weight == 90
+
+    cache.put("big", Result(60), open_range=False)
+    assert [key for key in "abc" if cache.get(key) is not None] == ["c"]
+    assert cache.weight == 90 and cache.evictions == 2
+
+    cache.put("huge", Result(101), open_range=False)
+    assert cache.get("huge") is None
+    assert cache.too_heavy == 1
+    stats = cache.stats()
+    assert stats["weight"] == 90 and stats["max_weight"] == 100
+
+
+def test_replacing_an_entry_keeps_weight_exact():
+    cache = ReportCache(max_weight=100)
+    cache.put("a", Result(40), open_range=False)
+    cache.put("a", Result(10), open_range=False)
+    assert cache.weight == 10 and len(cache) == 1
+
+
+def test_closed_and_open_ranges_expire_separately(clock):
+    cache = ReportCache(ttl_closed=3600, ttl_open=60)
+    cache.put("closed", Result(5), open_range=False)
+    cache.put("open", Result(5), open_range=True)
+
+    clock[0] += 61
+    assert cache.get("open") is None
+    assert cache.get("closed") is not None
+    clock[0] += 3600
+    assert cache.get("closed") is None
+    assert cache.expired == 2 and cache.weight == 0
+
+
+def test_hit_and_miss_counters():
+    cache = ReportCache()
+    assert cache.get("a") is None
+    cache.put("a", Result(), open_range=False)
+    assert cache.get("a") is not None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_in_flight_future_is_shared_and_cleared():
+    async def scenario():
+        cache = ReportCache()
+        future = cache.begin("a")
+        assert cache.in_flight("a") is future
+        waiter = asyncio.ensure_future(cache.in_flight("a"))
+        result = Result()
+        cache.finish("a", future, result)
+        assert await waiter is result
+        assert cache.in_flight("a") is None
+
+        # Подсчёт с --fresh начат, пока шёл первый: завершение первого не снимает его отметку
+        first = cache.begin("b")
+        fresh = cache.begin("b")
+        cache.finish("b", first)
+        assert cache.in_flight("b") is fresh
+        cache.finish("b", fresh)
+        assert cache.in_flight("b") is None
+
+    asyncio.run(scenario())
+
+
+# === КЭШ В scan_reports ===
+class FakeContext:
+    def __init__(self, text=""):
+        self.message = SimpleNamespace(content=text)
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+@pytest.fixture
+def scans(bot_module, monkeypatch):
+    """Подменяет просмотр каналов: каждый просмотр записывается в calls и ждёт события release[0]"""
+    monkeypatch.setattr(bot_module, "report_cache", ReportCache())
+    calls = []
+    release = [None]
+
+    async def fake_scan_channels(channels, collect):
+        calls.append(channels)
+        await release[0].wait()
+        return [{"activity": ActivityStats()}], []
+
+    monkeypatch.setattr(bot_module, "scan_channels", fake_scan_channels)
+    return calls, release
+
+
+def run_scans(bot_module, release, *requests):
+    """Запускает scan_reports одновременно для каждого (ctx, fresh) и возвращает результаты"""
+    channels = [SimpleNamespace(id=1, guild=SimpleNamespace(id=1))]
+    start, end = bot_module.parse_date("01-01-2026"), bot_module.parse_date("02-01-2026")
+
+    async def scenario():
+        release[0] = asyncio.Event()
+        tasks = [
+            asyncio.create_task(bot_module.scan_reports(ctx, channels, start, end, ["activity"], fresh=fresh))
+            for ctx, fresh in requests
+        ]
+        await asyncio.sleep(0)
+        release[0].set()
+        return [result["activity"] for result in await asyncio.gather(*tasks)]
+
+    return asyncio.run(scenario())
+
+
+def test_repeated_report_comes_from_cache_and_fresh_bypasses_it(bot_module, scans):
+    calls, release = scans
+    first, = run_scans(bot_module, release, (FakeContext(), False))
+    ctx = FakeContext()
+    second, = run_scans(bot_module, release, (ctx, False))
+    assert second is first and len(calls) == 1
+    assert any("из кэша" in text for text in ctx.sent)
+
+    fresh_ctx = FakeContext("!activity #general 01-01-2026 01-01-2026 --fresh")
+    assert bot_module.wants_fresh(fresh_ctx)
+    third, = run_scans(bot_module, release, (fresh_ctx, bot_module.wants_fresh(fresh_ctx)))
+    assert third is not first and len(calls) == 2
+    # Пересчитанный результат заменил прежний в кэше
+    fourth, = run_scans(bot_module, release, (FakeContext(), False))
+    assert fourth is third and len(calls) == 2
+
+
+def test_identical_reports_in_flight_share_one_scan(bot_module, scans):
+    calls, release = scans
+    one, two = run_scans(bot_module, release, (FakeContext(), False), (FakeContext(), False))
+    assert one is two and len(calls) == 1
+    assert bot_module.report_cache.shared == 1
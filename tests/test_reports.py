@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import reports
+from reports import ImageStats, ReportPipeline
+
+
+def make_channel(channel_id):
+    return SimpleNamespace(id=channel_id, name=f"channel{channel_id}", guild=SimpleNamespace(id=1))
+
+
+def make_message(message_id, images):
+    attachments = [SimpleNamespace(content_type="image/png", url=f"https://cdn/{message_id}/{i}") for i in range(images)]
+    return SimpleNamespace(
+        id=message_id, author_id=7, author_name="Иван", is_bot=False, content="", created_ts=message_id, attachments=attachments
+    )
+
+
+def scan(channel, messages):
+    stats = ImageStats()
+    pipeline = ReportPipeline([stats])
+    for message_id, images in messages:
+        pipeline.add(make_message(message_id, images), channel)
+    return stats
+
+
+def test_images_keep_only_shown_records(monkeypatch):
+    """В памяти остаются первые IMAGES_SHOWN сообщений, в Sheets уходят все — порциями со сквозной нумерацией"""
+    monkeypatch.setattr(reports, "IMAGES_SHOWN", 3)
+    first = scan(make_channel(1), [(1, 2), (2, 0), (3, 1)])
+    second = scan(make_channel(2), [(message_id, 1) for message_id in range(10, 15)])
+    stats = first.merge(second)
+
+    assert stats.total_messages == 7 and stats.total_images == 8
+    assert [record.message_id for record in stats.shown] == [1, 3, 10]
+    assert [numbers for _, _, _, numbers, _, _ in stats.numbered()] == [range(1, 3), range(3, 4), range(4, 5)]
+
+    chunks = list(stats.sheet_chunks("guild", "group", "01-01-2026", "02-01-2026", str, chunk_rows=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    rows = [row for chunk in chunks for row in chunk]
+    assert [row[1] for row in rows] == ["channel1"] * 2 + ["channel2"] * 5
+    assert [row[6] for row in rows] == ["1, 2", "3", "4", "5", "6", "7", "8"]
+    assert rows[0][5] == "https://cdn/1/0 | https://cdn/1/1"
+
+
+def test_cached_images_can_be_read_by_two_commands():
+    """Два чтения одного результата из кэша не сбивают друг другу позицию в файле строк"""
+    stats = scan(make_channel(1), [(message_id, 1) for message_id in range(5)])
+    one = stats.sheet_chunks("guild", "channel1", "a", "b", str, chunk_rows=2)
+    two = stats.sheet_chunks("guild", "channel1", "a", "b", str, chunk_rows=2)
+    links = {0: [], 1: []}
+    for pair in zip(one, two):
+        for reader, chunk in enumerate(pair):
+            links[reader].extend(row[4] for row in chunk)
+    assert links[0] == links[1] and len(links[0]) == 5
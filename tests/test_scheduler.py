@@ -0,0 +1,84 @@
+import datetime
+import zoneinfo
+
+import pytest
+
+from scheduler import CronSchedule, period_dates
+
+UTC = datetime.timezone.utc
+
+
+def at(*args):
+    return datetime.datetime(*args, tzinfo=UTC)
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", at(2026, 1, 1, 10, 7), at(2026, 1, 1, 10, 15)),
+    ("0 9 * * 1-5", at(2026, 1, 2, 9, 0), at(2026, 1, 5, 9, 0)),  # пятница 9:00 → понедельник
+    ("0-30/10 8 * * *", at(2026, 1, 1, 8, 25), at(2026, 1, 1, 8, 30)),
+    ("30 6 1,15 * *", at(2026, 1, 2, 0, 0), at(2026, 1, 15, 6, 30)),
+    ("0 0 * * 7", at(2026, 1, 1, 0, 0), at(2026, 1, 4, 0, 0)),  # 7 — воскресенье
+    ("@monthly", at(2026, 1, 31, 23, 59), at(2026, 2, 1, 0, 0)),
+    ("0 0 29 2 *", at(2026, 1, 1, 0, 0), at(2028, 2, 29, 0, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_next_after_is_strictly_later():
+    schedule = CronSchedule("0 9 * * *")
+    assert schedule.next_after(at(2026, 1, 1, 9, 0)) == at(2026, 1, 2, 9, 0)
+    assert schedule.next_after(at(2026, 1, 1, 8, 59, 30)) == at(2026, 1, 1, 9, 0)
+
+
+def test_restricted_day_of_month_and_week_match_either():
+    """Как в cron: «1-го числа или в понедельник»"""
+    schedule = CronSchedule("0 0 1 * 1")
+    assert schedule.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 5, 0, 0)
+    assert schedule.next_after(at(2026, 1, 26, 0, 0)) == at(2026, 2, 1, 0, 0)
+
+
+def test_starred_step_field_does_not_widen_days():
+    """*/2 в дне месяца не делает правило «или»: нечётные числа, которые являются понедельниками"""
+    schedule = CronSchedule("0 0 */2 * 1")
+    assert not schedule.any_day
+    assert schedule.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 5, 0, 0)
+    assert schedule.next_after(at(2026, 1, 5, 0, 0)) == at(2026, 1, 19, 0, 0)
+    assert CronSchedule("0 0 1 * */2").next_after(at(2026, 1, 1, 0, 0)) == at(2026, 2, 1, 0, 0)
+
+
+def test_impossible_date_never_runs():
+    assert CronSchedule("0 0 30 2 *").next_after(at(2026, 1, 1, 0, 0)) is None
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "* * * * 8",
+    "*/0 * * * *", "5-1 * * * *", "a * * * *", "1-x * * * *",
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+@pytest.mark.parametrize("period, today, expected", [
+    ("day", datetime.date(2026, 3, 1), (datetime.date(2026, 2, 28), datetime.date(2026, 2, 28))),
+    ("week", datetime.date(2026, 1, 7), (datetime.date(2025, 12, 29), datetime.date(2026, 1, 4))),
+    ("month", datetime.date(2026, 1, 15), (datetime.date(2025, 12, 1), datetime.date(2025, 12, 31))),
+])
+def test_period_dates(period, today, expected):
+    moment = datetime.datetime.combine(today, datetime.time(0, 5), UTC)
+    assert period_dates(period, moment) == expected
+
+
+def test_scheduled_period_uses_the_configured_zone(bot_module, monkeypatch):
+    """Запуск в 00:05 по Москве (21:05 UTC) считает отчёт за вчерашние московские сутки"""
+    moscow = zoneinfo.ZoneInfo("Europe/Moscow")
+    monkeypatch.setattr(bot_module, "TIMEZONE", moscow)
+    moment = at(2026, 1, 14, 21, 5).astimezone(moscow)
+
+    first_day, last_day = period_dates("day", moment)
+    assert (first_day, last_day) == (datetime.date(2026, 1, 14), datetime.date(2026, 1, 14))
+    start_dt = bot_module.parse_date(first_day.strftime("%d-%m-%Y"))
+    end_dt = bot_module.parse_date(last_day.strftime("%d-%m-%Y")) + datetime.timedelta(days=1)
+    assert start_dt.astimezone(UTC) == at(2026, 1, 13, 21, 0)
+    assert end_dt.astimezone(UTC) == at(2026, 1, 14, 21, 0)
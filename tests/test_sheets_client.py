@@ -0,0 +1,105 @@
+import time
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from sheets_client import SheetRegistry, SheetsTransport
+
+
+def values_get(transport):
+    return transport.spreadsheets().values().get(spreadsheetId="test-sheet", range="Activity!J:J")
+
+
+def values_append(transport):
+    return transport.spreadsheets().values().append(
+        spreadsheetId="test-sheet", range="Activity!A:I", valueInputOption="USER_ENTERED", body={"values": [["a"]]}
+    )
+
+
+def test_429_is_retried_after_retry_after(fake_sheets):
+    """429 с Retry-After: повтор не раньше указанной паузы, затем успешный ответ"""
+    sleeps = []
+    transport = SheetsTransport(api_endpoint=fake_sheets.url, sleep=sleeps.append, backoff_base=0.01)
+    fake_sheets.scripted = [(429, {"Retry-After": "3"}), (429, {"Retry-After": "3"})]
+
+    transport.execute(values_get(transport), "values.get")
+
+    assert len(fake_sheets.requests) == 3
+    assert len(sleeps) == 2 and all(delay >= 3 for delay in sleeps)
+    metrics = transport.metrics()
+    assert metrics["retries"] == 2
+    assert metrics["failures"] == 0
+    assert metrics["backoff_wait_seconds"] >= 6
+
+
+def test_retries_stop_after_max_retries(fake_sheets):
+    sleeps = []
+    transport = SheetsTransport(api_endpoint=fake_sheets.url, sleep=sleeps.append, max_retries=2, backoff_base=0.01)
+    fake_sheets.scripted = [(503, {})] * 5
+
+    with pytest.raises(HttpError):
+        transport.execute(values_get(transport), "values.get")
+
+    assert len(fake_sheets.requests) == 3
+    assert len(sleeps) == 2
+    assert transport.metrics()["failures"] == 1
+
+
+def test_append_is_retried_only_on_429(fake_sheets):
+    """append повторяется после 429 (запрос не выполнен), но не после 5xx (мог дойти до Google)"""
+    transport = SheetsTransport(api_endpoint=fake_sheets.url, sleep=lambda delay: None, backoff_base=0.01)
+
+    fake_sheets.scripted = [(429, {})]
+    transport.execute(values_append(transport), "values.append", idempotent=False)
+    assert len(fake_sheets.appends()) == 2
+
+    fake_sheets.scripted = [(503, {})]
+    with pytest.raises(HttpError):
+        transport.execute(values_append(transport), "values.append", idempotent=False)
+    assert len(fake_sheets.appends()) == 3
+
+
+def test_token_bucket_limits_request_rate(fake_sheets):
+    """После burst запросов подряд остальные идут не чаще requests_per_minute"""
+    transport = SheetsTransport(api_endpoint=fake_sheets.url, requests_per_minute=600, burst=2)
+
+    started = time.monotonic()
+    for _ in range(6):
+        transport.execute(values_get(transport), "values.get")
+    elapsed = time.monotonic() - started
+
+    # 2 запроса сразу, ещё 4 — по одному в 0.1 с
+    assert elapsed >= 0.35
+    starts = sorted(request[2] for request in fake_sheets.requests)
+    gaps = [later - earlier for earlier, later in zip(starts[2:], starts[3:])]
+    assert min(gaps) >= 0.08
+    assert transport.metrics()["throttle_wait_seconds"] > 0
+
+
+def test_fill_headers_adds_key_column_to_existing_sheets(fake_sheets):
+    """В листах без «Ключ записи» заголовок дописывается в J1, заполненные листы не трогаются"""
+    transport = SheetsTransport(api_endpoint=fake_sheets.url)
+    required = {
+        "Activity": ["Сервер", "Канал", "Ключ записи"],
+        "Images": ["Сервер", "Ссылка", "Ключ записи"],
+        "StaffAnalysis": ["Сервер", "Тип", "Ключ записи"],
+    }
+    fake_sheets.sheets = {"Activity": 11, "Images": 22}
+    fake_sheets.header_rows = {"Activity": ["Сервер", "Канал"], "Images": ["Сервер", "Ссылка", "Ключ записи"]}
+    registry = SheetRegistry(transport, "test-sheet", required)
+
+    assert registry.fill_headers() == ["Activity"]
+
+    assert len(fake_sheets.batch_updates) == 1
+    assert fake_sheets.batch_updates[0]["requests"] == [{
+        "updateCells": {
+            "start": {"sheetId": 11, "rowIndex": 0, "columnIndex": 2},
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": "Ключ записи"}}]}],
+            "fields": "userEnteredValue"
+        }
+    }]
+
+    # Заголовки на месте: повторный запуск ничего не пишет
+    fake_sheets.header_rows["Activity"].append("Ключ записи")
+    assert registry.fill_headers() == []
+    assert len(fake_sheets.batch_updates) == 1
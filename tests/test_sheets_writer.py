@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from sheets_client import SheetsTransport
+from sheets_spool import SheetsSpool
+from sheets_writer import SheetsWriter
+
+RANGE = "Activity!A:I"
+TICK = 0.01
+
+
+def make_writer(tmp_path, fake_sheets, **kwargs):
+    transport = SheetsTransport(api_endpoint=fake_sheets.url, requests_per_minute=6000, burst=100)
+    spool = SheetsSpool(str(tmp_path / "spool.db"))
+    return SheetsWriter(transport, "test-sheet", spool, flush_interval=0, **kwargs)
+
+
+def test_event_loop_stays_responsive_during_slow_append(tmp_path, fake_sheets):
+    """Пока append к медленному Sheets в пути, цикл событий продолжает работать"""
+    fake_sheets.append_delay = 0.5
+    writer = make_writer(tmp_path, fake_sheets)
+
+    async def scenario():
+        ticks = []  # (время, задержка сверх TICK)
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                started = time.monotonic()
+                await asyncio.sleep(TICK)
+                finished = time.monotonic()
+                ticks.append((finished, finished - started - TICK))
+
+        task = asyncio.create_task(ticker())
+        writer.start()
+        await writer.enqueue(RANGE, [["guild", "channel", 1]])
+        await asyncio.wait_for(writer.join(), 10)
+        stop.set()
+        await task
+        return ticks
+
+    ticks = asyncio.run(scenario())
+    writer.spool.close()
+
+    appends = fake_sheets.appends()
+    assert len(appends) == 1
+    assert fake_sheets.rows[0][:3] == ["guild", "channel", 1]
+    _, _, append_started, append_finished = appends[0]
+    during_append = [lag for moment, lag in ticks if append_started + TICK <= moment <= append_finished]
+    # За 0.5 с ожидания ответа тикер успевает сработать много раз, и ни один тик не задержан надолго
+    assert len(during_append) >= 20
+    assert max(during_append) < 0.1
+
+
+def test_lost_append_response_is_not_written_twice(tmp_path, fake_sheets):
+    """Append дошёл до Google, но ответ потерян: повтор из спула не дублирует строки"""
+    fake_sheets.lose_append_responses = 1
+    writer = make_writer(tmp_path, fake_sheets, retry_interval=0.05)
+
+    async def scenario():
+        writer.start()
+        await writer.enqueue(RANGE, [["a", 1], ["b", 2]])
+        await asyncio.wait_for(writer.join(), 10)
+
+    asyncio.run(scenario())
+    assert writer.spool.counts() == {"pending": 0, "failed": 0}
+    writer.spool.close()
+
+    # Транспорт не повторяет append сам; повтор из спула проверил ключи и ничего не отправил
+    assert len(fake_sheets.appends()) == 1
+    assert [row[:2] for row in fake_sheets.rows] == [["a", 1], ["b", 2]]
+    assert writer.rows_deduplicated == 2
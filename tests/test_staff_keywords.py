@@ -0,0 +1,22 @@
+import pytest
+
+from staff_fixtures import LEGACY_STAFF_KEYWORDS, STAFF_REGRESSION_CASES, classify_per_keyword
+from staff_keywords import KeywordClassifier, DEFAULT_STAFF_KEYWORDS
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return KeywordClassifier({name: category["terms"] for name, category in DEFAULT_STAFF_KEYWORDS.items()})
+
+
+@pytest.mark.parametrize("keyword", [keyword for keywords in LEGACY_STAFF_KEYWORDS.values() for keyword in keywords])
+def test_defaults_find_every_legacy_keyword(classifier, keyword):
+    """Всё, что находили прежние списки, находят и словари по умолчанию"""
+    text = f"Сегодня {keyword} по приказу"
+    assert classifier.classify(text) == classify_per_keyword(text, LEGACY_STAFF_KEYWORDS)
+
+
+@pytest.mark.parametrize("text, expected", STAFF_REGRESSION_CASES)
+def test_regression_phrases(classifier, text, expected):
+    """«Принятые меры» и подобные фразы не считаются кадровыми сообщениями"""
+    assert classifier.classify(text) == expected